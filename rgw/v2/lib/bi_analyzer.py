@@ -0,0 +1,371 @@
+"""
+bi_analyzer - streaming bucket index (bi list) analytics
+
+`radosgw-admin bi list` output is parsed one entry at a time, for the whole
+bucket or shard by shard with the shards listed in parallel, and reports
+
+    entry type histogram (plain, instance, olh)
+    entries per shard and the shard skew
+    duplicate index keys and index ordering violations within a shard
+    orphaned instance entries, versions without an olh entry
+    olh entries with a pending log, pending removal or delete marker
+
+The key sets used for the duplicate and orphan checks are kept in memory,
+or in a SQLite file when a spill directory is given, for buckets with
+millions of entries. The raw output can be spilled there as well.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import json
+import logging
+import sqlite3
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import v2.utils.utils as utils
+from v2.lib.exceptions import TestExecError
+from v2.utils.ssh_pool import ssh_pool
+
+log = logging.getLogger()
+
+ENTRY_TYPES = ["plain", "instance", "olh"]
+MAX_EXAMPLES = 10
+DEFAULT_WORKERS = 8
+
+
+def entry_name(entry):
+    """
+    This function returns the object name of a bi list entry, olh entries keep it under key
+    """
+    body = entry.get("entry") or {}
+    if "key" in body:
+        return body["key"].get("name")
+    return body.get("name")
+
+
+class _KeySet(object):
+    """
+    set of strings, in memory or in a SQLite table
+    """
+
+    def __init__(self, db=None, name=None):
+        self.db = db
+        self.name = name
+        self.items = set() if db is None else None
+        if db is not None:
+            db.execute(f"CREATE TABLE {name} (k TEXT PRIMARY KEY)")
+
+    def add(self, key):
+        """
+        returns False if the key was already in the set
+        """
+        if self.db is None:
+            if key in self.items:
+                return False
+            self.items.add(key)
+            return True
+        cursor = self.db.execute(
+            f"INSERT OR IGNORE INTO {self.name} VALUES (?)", (key,)
+        )
+        return cursor.rowcount == 1
+
+    def __contains__(self, key):
+        if self.db is None:
+            return key in self.items
+        return (
+            self.db.execute(f"SELECT 1 FROM {self.name} WHERE k = ?", (key,)).fetchone()
+            is not None
+        )
+
+    def __iter__(self):
+        if self.db is None:
+            return iter(self.items)
+        return (row[0] for row in self.db.execute(f"SELECT k FROM {self.name}"))
+
+
+def _new_report():
+    return {
+        "entries": 0,
+        "types": {name: 0 for name in ENTRY_TYPES},
+        "duplicates": 0,
+        "olh_duplicate_names": 0,
+        "ordering_violations": 0,
+        "orphaned_instances": 0,
+        "olh": {"pending_log": 0, "pending_removal": 0, "delete_marker": 0},
+        "examples": {},
+    }
+
+
+def _example(report, kind, value):
+    examples = report["examples"].setdefault(kind, [])
+    if len(examples) < MAX_EXAMPLES:
+        examples.append(value)
+
+
+def analyze_entries(entries, spill_db=None, table_prefix="s", check_order=True):
+    """
+    This function analyzes a stream of bi list entries of one shard, or of a whole bucket
+
+    Parameters:
+        entries: iterable of bi list entries
+        spill_db(char): SQLite file keeping the key sets, None to keep them in memory
+        table_prefix(char): prefix of the SQLite tables, unique per stream
+        check_order(bool): count idx going backwards within an entry type, only meaningful within a shard
+
+    Returns:
+        report(dict): entries, types, duplicates, olh_duplicate_names,
+                      ordering_violations, orphaned_instances, olh and examples
+    """
+    report = _new_report()
+    if spill_db and os.path.exists(spill_db):
+        # left over by a previous run
+        os.remove(spill_db)
+    db = sqlite3.connect(spill_db) if spill_db else None
+    try:
+        seen = _KeySet(db, f"{table_prefix}_seen")
+        olh_names = _KeySet(db, f"{table_prefix}_olh")
+        instance_names = _KeySet(db, f"{table_prefix}_instance")
+        # plain, instance and olh entries are listed one namespace after the
+        # other, each in key order
+        previous_idx = {}
+        for entry in entries:
+            entry_type = entry.get("type", "other")
+            idx = entry.get("idx", "")
+            name = entry_name(entry)
+            report["entries"] += 1
+            report["types"][entry_type] = report["types"].get(entry_type, 0) + 1
+            if not seen.add(f"{entry_type}\0{idx}"):
+                report["duplicates"] += 1
+                _example(report, "duplicates", {"type": entry_type, "idx": idx})
+            previous = previous_idx.get(entry_type)
+            if check_order and previous is not None and idx < previous:
+                report["ordering_violations"] += 1
+                _example(
+                    report, "ordering_violations", {"previous": previous, "idx": idx}
+                )
+            previous_idx[entry_type] = idx
+            if entry_type == "olh":
+                body = entry.get("entry") or {}
+                if not olh_names.add(name):
+                    report["olh_duplicate_names"] += 1
+                    _example(report, "olh_duplicate_names", name)
+                if body.get("pending_log"):
+                    report["olh"]["pending_log"] += 1
+                    _example(report, "olh_pending_log", name)
+                if body.get("pending_removal"):
+                    report["olh"]["pending_removal"] += 1
+                if body.get("delete_marker"):
+                    report["olh"]["delete_marker"] += 1
+            elif entry_type == "instance":
+                instance_names.add(name)
+        # an object name always maps to the same shard, so are its olh and instances
+        for name in instance_names:
+            if name not in olh_names:
+                report["orphaned_instances"] += 1
+                _example(report, "orphaned_instances", name)
+        if db is not None:
+            db.commit()
+    finally:
+        if db is not None:
+            db.close()
+    if not check_order:
+        report["ordering_violations"] = None
+    return report
+
+
+def _merge(total, part):
+    for name in ("entries", "duplicates", "olh_duplicate_names", "orphaned_instances"):
+        total[name] += part[name]
+    if part["ordering_violations"] is None or total["ordering_violations"] is None:
+        total["ordering_violations"] = None
+    else:
+        total["ordering_violations"] += part["ordering_violations"]
+    for name, count in part["types"].items():
+        total["types"][name] = total["types"].get(name, 0) + count
+    for name, count in part["olh"].items():
+        total["olh"][name] += count
+    for kind, examples in part["examples"].items():
+        kept = total["examples"].setdefault(kind, [])
+        kept.extend(examples[: MAX_EXAMPLES - len(kept)])
+
+
+def shard_skew(counts):
+    """
+    This function summarizes how evenly entries are spread over the shards
+
+    Returns:
+        skew(dict): min, max, mean, stddev, max_over_mean and empty shards
+    """
+    values = list(counts.values())
+    if not values:
+        return {}
+    mean = statistics.mean(values)
+    return {
+        "min": min(values),
+        "max": max(values),
+        "mean": mean,
+        "stddev": statistics.pstdev(values),
+        "max_over_mean": max(values) / mean if mean else 0.0,
+        "empty_shards": sum(1 for value in values if value == 0),
+    }
+
+
+class BiListAnalyzer(object):
+    """
+    Streams and analyzes the bucket index of a bucket
+
+    The functions here are
+    1. analyze(): analyze the whole index, per shard when asked for
+    2. analyze_shard(): analyze one shard
+    """
+
+    def __init__(
+        self,
+        bucket_name,
+        per_shard=False,
+        num_shards=None,
+        workers=DEFAULT_WORKERS,
+        spill_dir=None,
+        ssh_con=None,
+        sudo=False,
+        extra_args="",
+    ):
+        """
+        Parameters:
+            bucket_name(char): name of the bucket, tenant/bucket for tenanted buckets
+            per_shard(bool): list each shard with --shard-id, in parallel
+            num_shards(int): shards of the bucket, read from bucket stats by default
+            workers(int): shards listed at the same time
+            spill_dir(char): directory for the raw output and the key sets, None keeps the sets in memory
+            ssh_con: ssh connection to run radosgw-admin on, None for the local node
+            sudo(bool): run radosgw-admin with sudo
+            extra_args(char): appended to the bi list command, e.g --bucket-id=<id>
+        """
+        self.bucket_name = bucket_name
+        self.per_shard = per_shard
+        self.num_shards = num_shards
+        self.workers = max(1, int(workers))
+        self.spill_dir = spill_dir
+        self.ssh_con = ssh_con
+        self.sudo = sudo
+        self.extra_args = extra_args
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _cmd(self, shard_id=None):
+        cmd = f"radosgw-admin bi list --bucket {self.bucket_name}"
+        if shard_id is not None:
+            cmd += f" --shard-id {shard_id}"
+        if self.extra_args:
+            cmd += f" {self.extra_args}"
+        return f"sudo {cmd}" if self.sudo else cmd
+
+    def _spill_path(self, suffix):
+        if not self.spill_dir:
+            return None
+        name = self.bucket_name.replace("/", "_")
+        return os.path.join(self.spill_dir, f"bi_list.{name}.{suffix}")
+
+    def _entries(self, shard_id=None):
+        cmd = self._cmd(shard_id)
+        spill_file = self._spill_path(f"{'all' if shard_id is None else shard_id}.json")
+        if self.ssh_con is None:
+            return utils.stream_json_array(cmd, log_limit=0, spill_file=spill_file)
+        log.info(f"executing cmd on remote node: {cmd}")
+        lines = (line + "\n" for line in ssh_pool.stream(None, cmd, ssh=self.ssh_con))
+        return utils.iter_json_array(lines)
+
+    def _get_num_shards(self):
+        cmd = f"radosgw-admin bucket stats --bucket {self.bucket_name}"
+        cmd = f"sudo {cmd}" if self.sudo else cmd
+        if self.ssh_con is None:
+            out = utils.exec_shell_cmd(cmd)
+        else:
+            out = ssh_pool.run(None, cmd, ssh=self.ssh_con)["stdout"]
+        try:
+            return int(json.loads(out)["num_shards"]) or 1
+        except (TypeError, ValueError, KeyError) as e:
+            raise TestExecError(f"failed to get num_shards of {self.bucket_name}: {e}")
+
+    def analyze_shard(self, shard_id):
+        """
+        This function analyzes one shard of the index
+
+        Returns:
+            report(dict): see analyze_entries()
+        """
+        return analyze_entries(
+            self._entries(shard_id),
+            self._spill_path(f"{shard_id}.sqlite"),
+            table_prefix="s",
+        )
+
+    def analyze(self):
+        """
+        This function analyzes the bucket index
+
+        Returns:
+            report(dict): bucket, entries, types, duplicates, olh_duplicate_names,
+                          ordering_violations (None when not listed per shard),
+                          orphaned_instances, olh, examples, elapsed and, per shard,
+                          shards (shard id -> entries) and skew
+        """
+        start = time.time()
+        if not self.per_shard:
+            report = analyze_entries(
+                self._entries(),
+                self._spill_path("all.sqlite"),
+                table_prefix="s",
+                check_order=False,
+            )
+        else:
+            num_shards = self.num_shards or self._get_num_shards()
+            log.info(
+                f"analyzing bi list of {self.bucket_name}, {num_shards} shards, {self.workers} workers"
+            )
+            report = _new_report()
+            report["shards"] = {}
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for shard_id, part in zip(
+                    range(num_shards),
+                    executor.map(self.analyze_shard, range(num_shards)),
+                ):
+                    report["shards"][shard_id] = part["entries"]
+                    _merge(report, part)
+            report["skew"] = shard_skew(report["shards"])
+        report["bucket"] = self.bucket_name
+        report["elapsed"] = time.time() - start
+        self.log_report(report)
+        return report
+
+    @staticmethod
+    def log_report(report):
+        log.info(
+            f"bi list of {report['bucket']}: {report['entries']} entries in {report['elapsed']:.1f}s, "
+            f"types: {report['types']}, olh: {report['olh']}"
+        )
+        log.info(
+            f"  duplicates: {report['duplicates']}, olh duplicate names: {report['olh_duplicate_names']}, "
+            f"ordering violations: {report['ordering_violations']}, "
+            f"orphaned instances: {report['orphaned_instances']}"
+        )
+        if report.get("skew"):
+            log.info(f"  shard skew: {report['skew']}")
+        for kind, examples in report["examples"].items():
+            log.info(f"  {kind} examples: {examples}")
+
+
+def count_bi_entries(bucket_name, ssh_con=None, sudo=False):
+    """
+    This function counts the bucket index entries of a bucket without holding the bi list in memory
+    """
+    cmd = f"radosgw-admin bi list --bucket {bucket_name}"
+    cmd = f"sudo {cmd}" if sudo else cmd
+    if ssh_con is None:
+        return utils.count_json_array(cmd, log_limit=0)
+    lines = (line + "\n" for line in ssh_pool.stream(None, cmd, ssh=ssh_con))
+    return sum(1 for _ in utils.iter_json_array(lines))
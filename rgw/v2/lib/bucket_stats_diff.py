@@ -0,0 +1,284 @@
+"""
+bucket_stats_diff - batched two-site bucket stats comparison for sync verification
+
+Instead of one `radosgw-admin bucket stats --bucket` per bucket and site,
+one `radosgw-admin bucket stats` covering all the buckets is run on each
+site concurrently, the results are indexed by bucket and num_objects and
+size_actual are diffed per usage category. Only the buckets that still
+differ are polled again, and a per-bucket convergence timeline is logged.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import v2.utils.utils as utils
+from v2.lib.exceptions import TestExecError
+from v2.utils.ssh_pool import ssh_pool
+
+log = logging.getLogger()
+
+DEFAULT_CATEGORIES = ("rgw.main",)
+DEFAULT_FIELDS = ("num_objects", "size_actual")
+# up to this many pending buckets are polled with one command per bucket,
+# more than this are polled with a single command covering all the buckets
+PER_BUCKET_POLL_LIMIT = 16
+# tenant the tests create tenanted buckets in, tried when the plain name is not found
+FALLBACK_TENANT = "tenant0"
+
+
+def _load_json(output):
+    """
+    parses the json in the command output, skipping any leading warnings
+    """
+    output = (output or "").strip()
+    starts = [i for i in (output.find("["), output.find("{")) if i != -1]
+    if not starts:
+        return None
+    try:
+        return json.loads(output[min(starts) :])
+    except ValueError:
+        return None
+
+
+def _run(cmd, ssh_con=None):
+    if ssh_con is None:
+        return utils.exec_shell_cmd(cmd)
+    # the remote site is reached as cephuser
+    result = ssh_pool.run(None, f"sudo {cmd}", ssh=ssh_con)
+    if result["exit_code"] != 0:
+        log.debug(f"'{cmd}' failed: {result['stderr']}")
+    return result["stdout"]
+
+
+def _index(stats_list):
+    index = {}
+    for stats in stats_list:
+        if not isinstance(stats, dict) or "bucket" not in stats:
+            continue
+        tenant = stats.get("tenant")
+        name = f"{tenant}/{stats['bucket']}" if tenant else stats["bucket"]
+        index[name] = stats
+    return index
+
+
+def lookup(index, bucket_name):
+    """
+    This function returns the stats of a bucket, matching tenanted names on the bucket part
+
+    Returns:
+        stats(dict) or None if the bucket is not in the index
+    """
+    if bucket_name in index:
+        return index[bucket_name]
+    matches = [name for name in index if name.split("/")[-1] == bucket_name]
+    return index[matches[0]] if len(matches) == 1 else None
+
+
+def get_bucket_stats(bucket_names=None, ssh_con=None):
+    """
+    This function collects bucket stats on a site
+
+    Parameters:
+        bucket_names(list): buckets to collect, None for all the buckets.
+                            a few buckets are collected one command per bucket,
+                            falling back to the tenant0/<bucket> name,
+                            many with one command covering all the buckets
+        ssh_con: ssh connection to the site, None for the local site
+
+    Returns:
+        stats(dict): bucket name -> bucket stats
+    """
+    if bucket_names is not None and len(bucket_names) <= PER_BUCKET_POLL_LIMIT:
+        index = {}
+        for bucket_name in bucket_names:
+            candidates = [bucket_name]
+            if "/" not in bucket_name:
+                candidates.append(f"{FALLBACK_TENANT}/{bucket_name}")
+            for candidate in candidates:
+                stats = _load_json(
+                    _run(f"radosgw-admin bucket stats --bucket {candidate}", ssh_con)
+                )
+                if isinstance(stats, dict):
+                    index[bucket_name] = stats
+                    break
+        return index
+    stats_list = _load_json(_run("radosgw-admin bucket stats", ssh_con))
+    if not isinstance(stats_list, list):
+        raise TestExecError("failed to collect bucket stats")
+    return _index(stats_list)
+
+
+def get_two_site_bucket_stats(bucket_names=None, remote_ssh_con=None):
+    """
+    This function collects bucket stats on the local and the remote site at the same time
+
+    Returns:
+        (local_stats, remote_stats)
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        local = executor.submit(get_bucket_stats, bucket_names, None)
+        remote = executor.submit(get_bucket_stats, bucket_names, remote_ssh_con)
+        return local.result(), remote.result()
+
+
+def usage_fingerprint(stats, categories=DEFAULT_CATEGORIES, fields=DEFAULT_FIELDS):
+    """
+    This function extracts the compared usage values from bucket stats
+
+    Parameters:
+        categories(list): usage categories to compare, None for all of them
+
+    Returns:
+        fingerprint(dict): category -> {field: value}
+    """
+    usage = stats.get("usage") or {}
+    categories = usage.keys() if categories is None else categories
+    return {
+        category: {field: (usage.get(category) or {}).get(field, 0) for field in fields}
+        for category in categories
+    }
+
+
+def diff_bucket_stats(
+    bucket_names,
+    local_stats,
+    remote_stats,
+    categories=DEFAULT_CATEGORIES,
+    fields=DEFAULT_FIELDS,
+):
+    """
+    This function diffs the usage of buckets across the two sites
+
+    Returns:
+        diff(dict): bucket name -> description of the difference, for the buckets that differ
+    """
+    diff = {}
+    for bucket_name in bucket_names:
+        local = lookup(local_stats, bucket_name)
+        remote = lookup(remote_stats, bucket_name)
+        if local is None or remote is None:
+            diff[bucket_name] = "missing on " + ("local" if local is None else "remote")
+            continue
+        if categories is None:
+            compared = set(local.get("usage") or {}) | set(remote.get("usage") or {})
+        else:
+            compared = categories
+        local_usage = usage_fingerprint(local, compared, fields)
+        remote_usage = usage_fingerprint(remote, compared, fields)
+        mismatches = [
+            f"{category}.{field}: {local_usage[category][field]} != {remote_usage[category][field]}"
+            for category in sorted(compared)
+            for field in fields
+            if local_usage[category][field] != remote_usage[category][field]
+        ]
+        if mismatches:
+            diff[bucket_name] = ", ".join(mismatches)
+    return diff
+
+
+class BucketStatsSyncVerifier(object):
+    """
+    Verifies that buckets converge to the same usage on two sites
+
+    The functions here are
+    1. poll(): collect and diff the pending buckets once
+    2. verify(): poll until all the buckets converge or the timeout expires
+    3. log_timeline(): log when each bucket converged
+    """
+
+    def __init__(
+        self,
+        bucket_names,
+        remote_ssh_con,
+        categories=DEFAULT_CATEGORIES,
+        fields=DEFAULT_FIELDS,
+        timeout=600,
+        min_interval=5,
+        max_interval=30,
+    ):
+        self.bucket_names = list(bucket_names)
+        self.remote_ssh_con = remote_ssh_con
+        self.categories = categories
+        self.fields = fields
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.pending = {bucket_name: None for bucket_name in self.bucket_names}
+        self.converged = {}
+        self.start = None
+        self.polls = 0
+
+    def poll(self):
+        """
+        This function collects and diffs the pending buckets once
+
+        Returns:
+            pending(dict): bucket name -> difference, for the buckets still differing
+        """
+        pending = list(self.pending)
+        local_stats, remote_stats = get_two_site_bucket_stats(
+            pending, self.remote_ssh_con
+        )
+        diff = diff_bucket_stats(
+            pending, local_stats, remote_stats, self.categories, self.fields
+        )
+        self.polls += 1
+        elapsed = time.time() - self.start
+        for bucket_name in pending:
+            if bucket_name not in diff:
+                stats = lookup(local_stats, bucket_name)
+                self.converged[bucket_name] = {
+                    "elapsed": elapsed,
+                    "polls": self.polls,
+                    "usage": usage_fingerprint(stats, self.categories, self.fields),
+                }
+        self.pending = diff
+        log.info(
+            f"poll {self.polls} at {elapsed:.0f}s: {len(self.converged)}/{len(self.bucket_names)} "
+            f"buckets converged, {len(self.pending)} pending"
+        )
+        for bucket_name, reason in list(self.pending.items())[:10]:
+            log.info(f"  {bucket_name}: {reason}")
+        return self.pending
+
+    def verify(self):
+        """
+        This function polls until all the buckets have the same usage on both sites
+
+        Returns:
+            converged(dict): bucket name -> elapsed seconds, polls and usage at convergence
+
+        Raises:
+            TestExecError: if buckets still differ when the timeout expires
+        """
+        log.info(f"verifying bucket stats of {len(self.bucket_names)} buckets")
+        self.start = time.time()
+        interval = self.min_interval
+        while self.poll():
+            elapsed = time.time() - self.start
+            if elapsed >= self.timeout:
+                self.log_timeline()
+                raise TestExecError(
+                    f"{len(self.pending)} buckets did not converge in {self.timeout}s: {self.pending}"
+                )
+            time.sleep(min(interval, self.timeout - elapsed))
+            interval = min(self.max_interval, interval * 1.5)
+        self.log_timeline()
+        return self.converged
+
+    def log_timeline(self):
+        log.info("bucket stats convergence timeline:")
+        for bucket_name, info in sorted(
+            self.converged.items(), key=lambda item: item[1]["elapsed"]
+        ):
+            log.info(
+                f"  {info['elapsed']:8.1f}s  poll {info['polls']:4d}  {bucket_name}  {info['usage']}"
+            )
+        for bucket_name, reason in self.pending.items():
+            log.info(f"  {'pending':>9}  {bucket_name}  {reason}")
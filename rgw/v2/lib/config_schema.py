@@ -0,0 +1,480 @@
+"""
+config_schema - typed schema and cached loader of the test config yamls
+
+Every key of the config section a test can use is listed in CONFIG_SCHEMA
+with its accepted types and default, and the test_ops keys read by
+resource_op.Config in TEST_OPS_SCHEMA. Config() validates the yaml against
+the schema when it is loaded, so an unknown key (usually a typo) or a value
+of the wrong type fails the test before any cluster setup is done.
+
+Parsed yamls are cached keyed by path, mtime and size, in memory and, for
+the lint, in a pickle file, so linting the whole tree again only parses
+the files that changed.
+
+Usage:
+    rgw-config-lint [paths]
+    python v2/lib/config_schema.py [paths]
+
+Without paths every configs directory under v2/tests is checked.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import argparse
+import copy
+import difflib
+import logging
+import pickle
+import tempfile
+import time
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+log = logging.getLogger()
+
+TESTS_DIR = os.path.abspath(os.path.join(__file__, "../../tests"))
+CACHE_FILE_ENV = "RGW_CONFIG_CACHE"
+CACHE_VERSION = 1
+
+# key: (accepted types, default), None is accepted for every key
+CONFIG_SCHEMA = {
+    "shards": ((int,), None),
+    "max_objects_per_shard": ((int,), None),
+    "max_rgw_dynamic_shards": ((int,), 1999),
+    "rgw_reshard_thread_interval": ((int,), 180),
+    "user_max_objects": ((int,), None),
+    "user_max_size": ((int,), None),
+    "s3_copy_obj": ((bool,), False),
+    "bucket_max_objects": ((int,), None),
+    "bucket_max_size": ((int,), None),
+    "user_count": ((int,), None),
+    "test_lc_transition": ((bool,), None),
+    "pool_name": ((str,), None),
+    "storage_class": ((str,), None),
+    "ec_pool_transition": ((bool,), None),
+    "multiple_transitions": ((bool,), None),
+    "second_pool_name": ((str,), None),
+    "second_storage_class": ((str,), None),
+    "two_pool_transition": ((bool,), None),
+    "ec_storage_class": ((str,), None),
+    "ec_pool_name": ((str,), None),
+    "test_with_bucket_index_shards": ((bool,), None),
+    "enable_resharding": ((bool,), None),
+    "log_trimming": ((str,), None),
+    "test_bilog_trim_on_non_existent_bucket": ((bool,), None),
+    "download_object": ((bool,), None),
+    "user_remove": ((bool,), True),
+    "user_type": ((str,), None),
+    "bucket_count": ((int,), None),
+    "encryption_keys": ((str,), None),
+    "objects_count": ((int,), None),
+    "pseudo_dir_count": ((int,), None),
+    "use_aws4": ((bool,), None),
+    "objects_size_range": ((dict,), None),
+    "sharding_type": ((str,), None),
+    # a size string like 100M is accepted as well
+    "split_size": ((int, str), 5),
+    "test_ops": ((dict,), {}),
+    "lifecycle_conf": ((list,), None),
+    "new_lifecycle_conf": ((list,), None),
+    "delete_marker_ops": ((list,), None),
+    "mapped_sizes": ((dict,), None),
+    "bucket_policy_op": ((str,), None),
+    "container_count": ((int,), None),
+    "version_count": ((int,), None),
+    "version_enable": ((bool,), False),
+    "deletelc": ((bool,), False),
+    "bucket_max_list_ops": ((int,), None),
+    "bucket_max_delete_ops": ((int,), None),
+    "user_max_list_ops": ((int,), None),
+    "user_max_delete_ops": ((int,), None),
+    "rgw_ratelimit_interval": ((int,), None),
+    "disable_dynamic_shard": ((bool,), False),
+    "delete_object_current_versions": ((bool,), False),
+    "delete_using_different_user": ((bool,), False),
+    "copy_versioned_obj_to_versioned_bkt": ((bool,), False),
+    "copy_version_object": ((bool,), False),
+    "object_expire": ((bool,), False),
+    "rgw_lc_debug_interval": ((int,), 30),
+    "rgw_enable_lc_threads": ((bool,), True),
+    "rgw_lifecycle_work_time": ((str,), "00:00-06:00"),
+    "rgw_lc_max_worker": ((int,), 10),
+    "rgw_lc_max_wp_worker": ((int,), 10),
+    "parallel_lc": ((bool,), False),
+    "multiple_delete_marker_check": ((bool,), False),
+    "delete_marker_check": ((bool,), False),
+    "invalid_date": ((bool,), False),
+    "rgw_crypt_require_ssl": ((str, bool), "false"),
+    "rgw_crypt_sse_s3_backend": ((str,), "vault"),
+    "rgw_crypt_sse_s3_vault_addr": ((str,), "http://127.0.0.1:8100"),
+    "rgw_crypt_sse_s3_vault_auth": ((str,), "agent"),
+    "rgw_crypt_sse_s3_vault_secret_engine": ((str,), "transit"),
+    "rgw_crypt_sse_s3_vault_prefix": ((str,), "/v1/transit"),
+    "dynamic_resharding": ((bool,), False),
+    "conflict_transition_actions": ((bool,), False),
+    "manual_resharding": ((bool,), False),
+    "reshard_cancel_cmd": ((bool,), False),
+    "sync_disable_and_enable": ((bool,), False),
+    "large_object_upload": ((bool,), False),
+    "test_aync_data_notifications": ((bool,), False),
+    "debug_rgw": ((int, str), None),
+    "bucket_sync_run_with_disable_sync_thread": ((bool,), False),
+    "large_object_download": ((bool,), False),
+    "static_large_object_upload": ((bool,), False),
+    "local_file_delete": ((bool,), False),
+    "sts": ((dict,), None),
+    "ceph_conf": ((dict,), None),
+    "gc_verification": ((bool,), False),
+    "etag_verification": ((bool,), False),
+    "bucket_sync_crash": ((bool,), False),
+    "bucket_sync_status": ((bool,), False),
+    "bucket_sync_run": ((bool,), False),
+    "bucket_stats": ((bool,), False),
+    "abort_multipart": ((bool,), False),
+    "bucket_check_fix": ((bool,), False),
+    "rgw_ops_log": ((bool,), False),
+    "user_reset": ((bool,), False),
+    "rgw_enable_static_website": ((bool,), False),
+    "multisite_global_sync_policy": ((bool,), False),
+    "multisite_sync_policy": ((bool,), False),
+    "header_size": ((bool,), False),
+    "test_datalog_trim_command": ((bool,), False),
+    "rgw_gc_obj_min_wait": ((int, bool), False),
+    "ssl": ((bool,), None),
+    "haproxy": ((bool,), False),
+    "test_sync_consistency_bucket_stats": ((bool,), False),
+    "testlc_with_obect_acl_set": ((bool,), False),
+    "test_sync_0_shards": ((bool,), False),
+    "test_versioning_archive": ((bool,), False),
+    "retain_bucket_pol": ((bool,), False),
+    "frontend": ((str,), None),
+    "io_op_config": ((dict,), None),
+    "dbr_scenario": ((str,), None),
+    "enable_sharding": ((bool,), False),
+    "modify_user": ((bool,), False),
+    "suspend_user": ((bool,), False),
+    "enable_user": ((bool,), False),
+    "delete_user": ((bool,), False),
+    "d3n_feature": ((bool,), False),
+    "datacache_path": ((str,), "/tmp/rgw_datacache/"),
+    "datacache_size": ((int,), 10737418240),
+    "test_bi_purge": ((bool,), False),
+    "full_sync_test": ((bool,), False),
+    "remote_zone": ((str,), None),
+    "local_zone": ((str,), None),
+    "bucket_max_read_ops": ((int,), None),
+    "bucket_max_read_bytes": ((int,), None),
+    "bucket_max_write_ops": ((int,), None),
+    "bucket_max_write_bytes": ((int,), None),
+    "user_max_read_ops": ((int,), None),
+    "user_max_read_bytes": ((int,), None),
+    "user_max_write_ops": ((int,), None),
+    "user_max_write_bytes": ((int,), None),
+    "user_conflict_read_bytes": ((int,), None),
+    "user_conflict_read_ops": ((int,), None),
+    "user_conflict_write_bytes": ((int,), None),
+    "user_conflict_write_ops": ((int,), None),
+    "permutation_count": ((int,), None),
+    "user_names": ((list,), None),
+    "bucket_names": ((list,), None),
+    "rgw_dynamic_resharding_reduction_wait": ((int,), None),
+    "rgw_reshard_debug_interval": ((int,), 120),
+    # see v2.lib.s3.client_factory
+    "client_config": ((dict,), None),
+}
+
+# keys not set as Config attributes, read by the tests from config.doc,
+# by IoInfoConfig or set on the Config object by the tests themselves
+EXTRA_CONFIG_SCHEMA = {
+    "io_info_backend": ((str,), None),
+    "trace": ((bool,), None),
+    "extra_keys_count": ((int,), None),
+    "many_keys_large_count": ((int,), None),
+    "ibm_cloud_cli_path": ((str,), None),
+    "restore_wait_time": ((int,), None),
+    "restore_poll_interval": ((int,), None),
+    "restore_parallel_workers": ((int,), None),
+    "basedir_count": ((int,), None),
+    "subdir_count": ((int,), None),
+    "file_count": ((int,), None),
+    "sync_wait_time": ((int,), None),
+    "large_object": ((bool,), None),
+    "break_at_part_no": ((int,), None),
+    "obj_size": ((str, int), None),
+}
+
+# test_ops keys read by Config, the other test_ops keys are test specific
+TEST_OPS_SCHEMA = {
+    "radoslist_all": ((bool,), False),
+    "change_datalog_backing": ((str, bool), False),
+    "persistent_flag": ((bool,), False),
+    "copy_object": ((bool,), False),
+    "get_topic_info": ((bool,), False),
+    "sse_s3_per_bucket": ((bool,), False),
+    "set_acl": ((bool, str), None),
+    "put_empty_bucket_notification": ((bool,), False),
+}
+
+KNOWN_CONFIG_KEYS = set(CONFIG_SCHEMA) | set(EXTRA_CONFIG_SCHEMA)
+
+
+def _type_names(types):
+    return " or ".join(t.__name__ for t in types)
+
+
+def _check_type(where, value, types):
+    if value is None:
+        return None
+    # bool is an int, but true is never a valid count
+    if isinstance(value, bool) and bool not in types:
+        return f"{where}: expected {_type_names(types)}, got bool {value!r}"
+    if not isinstance(value, types):
+        return (
+            f"{where}: expected {_type_names(types)}, "
+            f"got {type(value).__name__} {value!r}"
+        )
+    return None
+
+
+def validate_config(doc):
+    """
+    This function validates a parsed config yaml against the schema
+
+    Parameters:
+        doc(dict): parsed yaml, with the config section
+
+    Returns:
+        errors(list): error messages, empty if the config is valid
+    """
+    if not isinstance(doc, dict):
+        return [f"expected a mapping, got {type(doc).__name__}"]
+    config = doc.get("config")
+    if not isinstance(config, dict):
+        return ["config: missing or not a mapping"]
+    errors = []
+    for key, value in config.items():
+        option = CONFIG_SCHEMA.get(key) or EXTRA_CONFIG_SCHEMA.get(key)
+        if option is None:
+            error = f"config.{key}: unknown key"
+            close = difflib.get_close_matches(str(key), KNOWN_CONFIG_KEYS, n=1)
+            if close:
+                error += f", did you mean {close[0]}?"
+            errors.append(error)
+            continue
+        error = _check_type(f"config.{key}", value, option[0])
+        if error:
+            errors.append(error)
+    test_ops = config.get("test_ops")
+    if isinstance(test_ops, dict):
+        for key, (types, _) in TEST_OPS_SCHEMA.items():
+            error = _check_type(f"config.test_ops.{key}", test_ops.get(key), types)
+            if error:
+                errors.append(error)
+    return errors
+
+
+def apply_defaults(config):
+    """
+    This function returns the value of every schema key of a config section,
+    the default when the key is not set
+
+    Returns:
+        values(dict): CONFIG_SCHEMA and TEST_OPS_SCHEMA key -> value
+    """
+    values = {}
+    for key, (_, default) in CONFIG_SCHEMA.items():
+        values[key] = config[key] if key in config else copy.deepcopy(default)
+    test_ops = values["test_ops"] or {}
+    for key, (_, default) in TEST_OPS_SCHEMA.items():
+        values[key] = test_ops[key] if key in test_ops else copy.deepcopy(default)
+    return values
+
+
+def _default_cache_file():
+    return os.environ.get(CACHE_FILE_ENV) or os.path.join(
+        tempfile.gettempdir(), f"rgw_config_cache.{os.getuid()}.pickle"
+    )
+
+
+class ConfigCache(object):
+    """
+    Parsed config yamls keyed by path, mtime and size
+
+    The functions here are
+    1. load(): parse a yaml, or return it from the cache if the file did not change
+    2. save(): write the cache to its pickle file
+    """
+
+    def __init__(self, cache_file=None):
+        """
+        Parameters:
+            cache_file(char): pickle file the cache is loaded from and saved to, None to keep it in memory
+        """
+        self.cache_file = cache_file
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.entries = data["entries"]
+            except Exception as e:
+                log.info(f"ignoring config cache {cache_file}: {e}")
+
+    def load(self, path):
+        """
+        This function returns the parsed yaml of a config file
+
+        Returns:
+            doc: parsed yaml, shared with the cache, copy it before changing it
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        with open(path, "r") as f:
+            doc = yaml.load(f, Loader=SafeLoader)
+        self.entries[path] = (key, doc)
+        self.dirty = True
+        return doc
+
+    def save(self):
+        if not self.cache_file or not self.dirty:
+            return
+        # written to a temporary file and renamed, runs in parallel may save it too
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.cache_file) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(
+                    {"version": CACHE_VERSION, "entries": self.entries},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp, self.cache_file)
+            self.dirty = False
+        except OSError as e:
+            log.info(f"failed to save config cache {self.cache_file}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+_cache = ConfigCache()
+
+
+def load_config(path):
+    """
+    This function parses a config yaml, from the in memory cache if it did not change
+
+    Returns:
+        doc: parsed yaml, a copy the caller may change
+    """
+    return copy.deepcopy(_cache.load(path))
+
+
+def find_config_files(paths=None):
+    """
+    This function lists the config yamls of the given files and directories
+
+    Parameters:
+        paths(list): files and directories, by default every configs directory under v2/tests
+
+    Returns:
+        files(list): sorted yaml paths
+    """
+    if not paths:
+        paths = [
+            os.path.join(root, name)
+            for root, dirs, _ in os.walk(TESTS_DIR)
+            for name in dirs
+            if name.endswith("configs")
+        ]
+    files = set()
+    for path in paths:
+        if os.path.isfile(path):
+            files.add(os.path.abspath(path))
+            continue
+        for root, _, names in os.walk(path):
+            files.update(
+                os.path.abspath(os.path.join(root, name))
+                for name in names
+                if name.endswith((".yaml", ".yml"))
+            )
+    return sorted(files)
+
+
+def lint(paths=None, cache=None):
+    """
+    This function validates config yamls in one pass
+
+    Parameters:
+        paths(list): see find_config_files()
+        cache(ConfigCache): parse cache, an in memory one by default
+
+    Returns:
+        (results, skipped): results is path -> errors of the invalid files,
+                            skipped the yamls without a config section,
+                            input of the scripts not using resource_op.Config
+    """
+    cache = cache or ConfigCache()
+    results = {}
+    skipped = []
+    for path in find_config_files(paths):
+        try:
+            doc = cache.load(path)
+        except (OSError, yaml.YAMLError) as e:
+            results[path] = [f"failed to parse: {e}"]
+            continue
+        if isinstance(doc, dict) and "config" not in doc:
+            skipped.append(path)
+            continue
+        errors = validate_config(doc)
+        if errors:
+            results[path] = errors
+    return results, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Validate the RGW test config yamls against the config schema"
+    )
+    parser.add_argument(
+        "paths", nargs="*", help="config files or directories, all by default"
+    )
+    parser.add_argument(
+        "--cache-file",
+        help=f"parse cache, defaults to ${CACHE_FILE_ENV} or a file in the temp dir",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="parse every file")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    cache = ConfigCache(
+        None if args.no_cache else (args.cache_file or _default_cache_file())
+    )
+    files = find_config_files(args.paths)
+    results, skipped = lint(files, cache)
+    cache.save()
+    cwd = os.getcwd()
+    for path, errors in results.items():
+        for error in errors:
+            print(f"{os.path.relpath(path, cwd)}: {error}")
+    print(
+        f"{len(files)} files, {len(results)} invalid, {len(skipped)} without a config section, "
+        f"{cache.hits} cached, {time.perf_counter() - start:.2f}s"
+    )
+    return 1 if results else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
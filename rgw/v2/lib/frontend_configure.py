@@ -5,7 +5,6 @@ sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
 import logging
 import time
 import traceback
-from json import loads
 
 import v2.lib.decorators as decorators
 import v2.utils.utils as utils
@@ -152,8 +151,7 @@ class Frontend_CephAdm:
 
     def __init__(self):
         """Initialize the frontend values."""
-        ceph_config = utils.exec_shell_cmd("sudo ceph config dump --format json")
-        configs = loads(ceph_config)
+        configs = utils.cluster_info.config_dump() or []
 
         for config in configs:
             if config["name"] != "rgw_frontends":
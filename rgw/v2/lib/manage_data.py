@@ -2,13 +2,340 @@ import os
 import sys
 
 sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import base64
+import hashlib
+import io
 import logging
+import random
+from concurrent.futures import ProcessPoolExecutor
 
 import v2.utils.utils as utils
 from v2.lib.exceptions import RGWIOGenException
 
 log = logging.getLogger()
 
+# data is generated in blocks, each seeded with (seed, profile, block index),
+# so any block of an object can be regenerated independently
+BLOCK_SIZE = 1024 * 1024
+# random: incompressible binary data
+# text: base64 text, same alphabet as the former 'base64 /dev/urandom' data
+# zero: all zero bytes
+# sparse: zero bytes, written as a hole in the local file
+# compressible: random data padded with zeros to the configured compress_ratio
+DATA_PROFILES = ["random", "text", "zero", "sparse", "compressible"]
+COMPRESSIBLE_CHUNK_SIZE = 4096
+
+
+def generate_block(seed, index, profile="text", compress_ratio=2, size=BLOCK_SIZE):
+    """
+    Function to generate one block of deterministic data
+
+    Parameters:
+        seed(int): seed of the object
+        index(int): block index in the object
+        profile(char): one of DATA_PROFILES
+        compress_ratio(float): compression ratio for the compressible profile
+        size(int): size of the block, BLOCK_SIZE except for the last block
+
+    Returns:
+        bytes of the block
+    """
+    if profile in ["zero", "sparse"]:
+        return bytes(size)
+    rand = random.Random(f"{seed}:{profile}:{index}")
+    if profile == "random":
+        return rand.randbytes(size)
+    if profile == "text":
+        return base64.b64encode(rand.randbytes((size + 3) // 4 * 3))[:size]
+    if profile == "compressible":
+        random_len = max(1, int(COMPRESSIBLE_CHUNK_SIZE / float(compress_ratio)))
+        padding = bytes(COMPRESSIBLE_CHUNK_SIZE - random_len)
+        chunks = (size + COMPRESSIBLE_CHUNK_SIZE - 1) // COMPRESSIBLE_CHUNK_SIZE
+        block = b"".join(rand.randbytes(random_len) + padding for _ in range(chunks))
+        return block[:size]
+    raise RGWIOGenException(
+        f"unknown data profile {profile}, supported profiles: {DATA_PROFILES}"
+    )
+
+
+def generate_data(seed, size, profile="text", compress_ratio=2, offset=0):
+    """
+    Function to generate deterministic data as a sequence of blocks
+
+    Parameters:
+        seed(int): seed of the object
+        size(int): size of the object
+        profile(char): one of DATA_PROFILES
+        compress_ratio(float): compression ratio for the compressible profile
+        offset(int): byte offset in the object to start generating from
+
+    Returns:
+        generator of bytes
+    """
+    index = offset // BLOCK_SIZE
+    skip = offset % BLOCK_SIZE
+    while index * BLOCK_SIZE < size:
+        block_size = min(BLOCK_SIZE, size - index * BLOCK_SIZE)
+        block = generate_block(seed, index, profile, compress_ratio, block_size)
+        yield block[skip:] if skip else block
+        skip = 0
+        index += 1
+
+
+def generate_file(fname, size, seed=None, profile="text", compress_ratio=2):
+    """
+    Function to write deterministic data to a file
+
+    The md5 and size are computed in the same pass as the write.
+
+    Parameters:
+        fname(char): file name with path
+        size(int): size of the file in bytes
+        seed(int): seed for the data, a random seed is chosen if None
+        profile(char): one of DATA_PROFILES
+        compress_ratio(float): compression ratio for the compressible profile
+
+    Returns:
+        finfo : file information is returned.
+    """
+    size = int(size)
+    if seed is None:
+        seed = random.getrandbits(64)
+    md5 = hashlib.md5()
+    with open(fname, "wb") as fp:
+        for block in generate_data(seed, size, profile, compress_ratio):
+            md5.update(block)
+            if profile == "sparse":
+                fp.seek(len(block), os.SEEK_CUR)
+            else:
+                fp.write(block)
+        fp.truncate(size)
+    return {
+        "name": fname,
+        "size": size,
+        "md5": md5.hexdigest(),
+        "seed": seed,
+        "profile": profile,
+    }
+
+
+class VirtualPayload(io.RawIOBase):
+    """
+    Seekable, read-only file-like object whose content is generated on the fly
+
+    The content is defined by (seed, size, profile, compress_ratio), nothing is
+    written to local disk. An instance can be passed as Body or Fileobj to boto3,
+    and view() returns a sub-range, e.g. a multipart part. Blocks are always
+    generated at their size in the whole object and sliced, generate_block()
+    output of a shorter size is not a prefix of the full block.
+    """
+
+    def __init__(
+        self, seed, size, profile="text", compress_ratio=2, offset=0, total=None
+    ):
+        """
+        Parameters:
+            seed(int): seed of the object
+            size(int): size of the payload in bytes
+            profile(char): one of DATA_PROFILES
+            compress_ratio(float): compression ratio for the compressible profile
+            offset(int): offset of the payload in the object defined by the seed
+            total(int): size of the whole object, offset + size if None
+        """
+        super(VirtualPayload, self).__init__()
+        self.seed = seed
+        self.size = int(size)
+        self.profile = profile
+        self.compress_ratio = compress_ratio
+        self.offset = offset
+        self.total = self.offset + self.size if total is None else int(total)
+        self.pos = 0
+        self.cached_block = (None, None)
+
+    def __len__(self):
+        return self.size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self.pos = pos
+        elif whence == os.SEEK_CUR:
+            self.pos += pos
+        elif whence == os.SEEK_END:
+            self.pos = self.size + pos
+        self.pos = max(0, self.pos)
+        return self.pos
+
+    def _block(self, index):
+        """
+        returns block index of the object, caching the last generated block
+        since boto3 reads the payload in small chunks
+        """
+        if self.cached_block[0] != index:
+            block_size = min(BLOCK_SIZE, self.total - index * BLOCK_SIZE)
+            block = generate_block(
+                self.seed, index, self.profile, self.compress_ratio, block_size
+            )
+            self.cached_block = (index, block)
+        return self.cached_block[1]
+
+    def read_range(self, start, length):
+        """
+        returns length bytes starting at start, without moving the position
+        """
+        end = min(self.size, start + length)
+        chunks = []
+        object_pos = self.offset + start
+        object_end = self.offset + end
+        while object_pos < object_end:
+            index, skip = divmod(object_pos, BLOCK_SIZE)
+            chunk = self._block(index)[skip : skip + object_end - object_pos]
+            chunks.append(chunk)
+            object_pos += len(chunk)
+        return b"".join(chunks)
+
+    def readinto(self, buffer):
+        data = self.read_range(self.pos, len(buffer))
+        buffer[: len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.pos
+        data = self.read_range(self.pos, size)
+        self.pos += len(data)
+        return data
+
+    def view(self, start, length):
+        """
+        returns a new payload for the byte range [start, start + length)
+        """
+        return VirtualPayload(
+            self.seed,
+            max(0, min(length, self.size - start)),
+            self.profile,
+            self.compress_ratio,
+            offset=self.offset + start,
+            total=self.total,
+        )
+
+    def md5(self):
+        """
+        returns the md5 of the payload, computed by streaming the generated data
+        """
+        md5 = hashlib.md5()
+        for start in range(0, self.size, BLOCK_SIZE):
+            md5.update(self.read_range(start, BLOCK_SIZE))
+        return md5.hexdigest()
+
+
+class FileRangeView(io.RawIOBase):
+    """
+    Seekable, read-only view of the byte range [offset, offset + length) of a file
+
+    Used to upload multipart parts straight from the source file instead of
+    splitting it into part files.
+    """
+
+    def __init__(self, fname, offset, length):
+        super(FileRangeView, self).__init__()
+        self.fname = fname
+        self.offset = offset
+        self.size = max(0, min(length, os.stat(fname).st_size - offset))
+        self.pos = 0
+        self.fp = open(fname, "rb")
+
+    def __len__(self):
+        return self.size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self.pos = pos
+        elif whence == os.SEEK_CUR:
+            self.pos += pos
+        elif whence == os.SEEK_END:
+            self.pos = self.size + pos
+        self.pos = max(0, self.pos)
+        return self.pos
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.size - self.pos:
+            size = max(0, self.size - self.pos)
+        self.fp.seek(self.offset + self.pos)
+        data = self.fp.read(size)
+        self.pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def md5(self):
+        """
+        returns the md5 of the range
+        """
+        md5 = hashlib.md5()
+        self.fp.seek(self.offset)
+        remaining = self.size
+        while remaining > 0:
+            chunk = self.fp.read(min(BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            md5.update(chunk)
+            remaining -= len(chunk)
+        return md5.hexdigest()
+
+    def close(self):
+        self.fp.close()
+        super(FileRangeView, self).close()
+
+
+def virtual_io_generator(fname, size, seed=None, profile="text", compress_ratio=2):
+    """
+    Function to generate a virtual (file-less) object payload
+
+    Parameters:
+        fname(char): name recorded for the object, no file is created
+        size(int): size of the payload in bytes
+        seed(int): seed for the data, a random seed is chosen if None
+        profile(char): one of DATA_PROFILES
+        compress_ratio(float): compression ratio for the compressible profile
+
+    Returns:
+        finfo : file information with the payload under 'payload'
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    payload = VirtualPayload(seed, size, profile, compress_ratio)
+    return {
+        "name": fname,
+        "size": payload.size,
+        "md5": payload.md5(),
+        "seed": seed,
+        "profile": profile,
+        "compress_ratio": compress_ratio,
+        "payload": payload,
+    }
+
 
 def io_generator(fname, size, type="txt", op="create", **kwargs):
     """
@@ -29,12 +356,16 @@ def io_generator(fname, size, type="txt", op="create", **kwargs):
         if op == "create":
             log.info("in create")
             if type == "txt":
-                fcreate = "base64 /dev/urandom | head -c %s > %s" % (size, fname)
-                created = utils.exec_shell_cmd(fcreate)
-                finfo["md5"] = utils.get_md5(fname)
-                finfo["size"] = os.stat(fname).st_size
-                if created is False:
-                    raise RGWIOGenException("file %s creation error" % fname)
+                try:
+                    finfo = generate_file(
+                        fname,
+                        size,
+                        seed=kwargs.get("seed"),
+                        profile=kwargs.get("profile", "text"),
+                        compress_ratio=kwargs.get("compress_ratio", 2),
+                    )
+                except (OSError, ValueError) as e:
+                    raise RGWIOGenException("file %s creation error: %s" % (fname, e))
             return finfo
         if op == "append":
             log.info("in modify or append")
@@ -52,6 +383,35 @@ def io_generator(fname, size, type="txt", op="create", **kwargs):
         return False
 
 
+def _io_generator_star(args):
+    fname, size, kwargs = args
+    return io_generator(fname, size, **kwargs)
+
+
+def io_generator_bulk(files, processes=None, **kwargs):
+    """
+    Function to generate many files, spread across a process pool
+
+    Parameters:
+        files(list): list of (fname, size)
+        processes(int): number of worker processes, files are generated serially if not set
+        kwargs: passed to io_generator, e.g. profile, compress_ratio
+
+    Returns:
+        list of finfo in the order of files
+    """
+    log.info(f"generating {len(files)} files with {processes or 1} processes")
+    # seeds are drawn here, forked workers share the random state of the parent
+    args = [
+        (fname, size, dict(kwargs, seed=kwargs.get("seed", random.getrandbits(64))))
+        for fname, size in files
+    ]
+    if not processes or processes <= 1:
+        return [_io_generator_star(each) for each in args]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_io_generator_star, args, chunksize=16))
+
+
 def pseudo_dir_generator(fname, size=0):
     """
     Function to create pseduo directories
@@ -0,0 +1,380 @@
+"""
+perf_baseline - persistent performance results store and regression gate
+
+Test scripts record metrics with record_metrics(), each run is keyed by
+test name, config hash, ceph version and cluster label and kept in a
+SQLite database (RGW_PERF_DB, defaults to ~/rgw_perf_baseline.sqlite).
+
+The command line compares a candidate run with a baseline and exits 1 when
+a metric regressed beyond the threshold:
+
+    python perf_baseline.py list --test test_bucket_listing
+    python perf_baseline.py compare --test test_bucket_listing \
+        --baseline-version 18.2.0-100 --candidate-version 18.2.0-131 --threshold 10
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import argparse
+import hashlib
+import json
+import logging
+import sqlite3
+import statistics
+import threading
+import time
+
+log = logging.getLogger()
+
+DEFAULT_DB = os.path.expanduser("~/rgw_perf_baseline.sqlite")
+DEFAULT_THRESHOLD = 10.0
+# metrics named with any of these are better when lower, the others when higher
+LOWER_IS_BETTER = (
+    "latency",
+    "time",
+    "elapsed",
+    "duration",
+    "secs",
+    "seconds",
+    "lat_",
+    "_ms",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_name TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    ceph_version TEXT NOT NULL,
+    cluster_label TEXT NOT NULL,
+    created REAL NOT NULL,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    unit TEXT,
+    lower_is_better INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_key
+    ON runs (test_name, config_hash, ceph_version, cluster_label);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run_id);
+"""
+
+
+def config_hash(config):
+    """
+    This function hashes a test config, a resource_op.Config or a dict
+
+    Returns:
+        hash(char): first 12 hex digits of the sha1 of the config as sorted json
+    """
+    doc = getattr(config, "doc", config) or {}
+    return hashlib.sha1(
+        json.dumps(doc, sort_keys=True, default=str).encode()
+    ).hexdigest()[:12]
+
+
+def is_lower_better(name):
+    name = name.lower()
+    return any(token in name for token in LOWER_IS_BETTER)
+
+
+class PerfBaselineStore(object):
+    """
+    SQLite store of performance runs and their metrics
+
+    The functions here are
+    1. record(): add a run and its metrics
+    2. runs(): list runs matching a key
+    3. run_metrics(): metrics of runs
+    4. compare(): compare candidate runs with baseline runs
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get("RGW_PERF_DB", DEFAULT_DB)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def record(
+        self,
+        test_name,
+        metrics,
+        config=None,
+        ceph_version="",
+        cluster_label="",
+        units=None,
+    ):
+        """
+        This function records a run
+
+        Parameters:
+            test_name(char): name of the test or workload
+            metrics(dict): metric name -> numeric value
+            config: test config the run used, hashed into the run key
+            ceph_version(char): ceph version id of the cluster
+            cluster_label(char): label of the cluster
+            units(dict): metric name -> unit
+
+        Returns:
+            run_id(int)
+        """
+        units = units or {}
+        doc = getattr(config, "doc", config)
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (test_name, config_hash, ceph_version, cluster_label, created, config)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    test_name,
+                    config_hash(config),
+                    ceph_version or "",
+                    cluster_label or "",
+                    time.time(),
+                    json.dumps(doc, sort_keys=True, default=str) if doc else None,
+                ),
+            )
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO metrics (run_id, name, value, unit, lower_is_better) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (run_id, name, float(value), units.get(name), is_lower_better(name))
+                    for name, value in metrics.items()
+                    if isinstance(value, (int, float)) and not isinstance(value, bool)
+                ],
+            )
+        return run_id
+
+    def runs(
+        self, test_name=None, config_hash=None, ceph_version=None, cluster_label=None
+    ):
+        """
+        This function lists the runs matching the given key fields, newest first
+        """
+        query, args = "SELECT * FROM runs WHERE 1=1", []
+        for column, value in (
+            ("test_name", test_name),
+            ("config_hash", config_hash),
+            ("ceph_version", ceph_version),
+            ("cluster_label", cluster_label),
+        ):
+            if value is not None:
+                query += f" AND {column} = ?"
+                args.append(value)
+        with self.lock:
+            return [
+                dict(row)
+                for row in self.conn.execute(query + " ORDER BY id DESC", args)
+            ]
+
+    def run_metrics(self, run_ids):
+        """
+        This function returns the metrics of runs
+
+        Returns:
+            metrics(dict): name -> {"values": [...], "unit": unit, "lower_is_better": bool}
+        """
+        metrics = {}
+        if not run_ids:
+            return metrics
+        placeholders = ",".join("?" * len(run_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM metrics WHERE run_id IN ({placeholders})", list(run_ids)
+            ).fetchall()
+        for row in rows:
+            metric = metrics.setdefault(
+                row["name"],
+                {
+                    "values": [],
+                    "unit": row["unit"],
+                    "lower_is_better": bool(row["lower_is_better"]),
+                },
+            )
+            metric["values"].append(row["value"])
+        return metrics
+
+    def compare(self, baseline_run_ids, candidate_run_ids, threshold=DEFAULT_THRESHOLD):
+        """
+        This function compares the median of each metric of candidate runs with the baseline runs
+
+        Parameters:
+            threshold(float): allowed change in percent in the bad direction
+
+        Returns:
+            results(list): per metric dicts with baseline, candidate, change_pct and regressed
+        """
+        baseline = self.run_metrics(baseline_run_ids)
+        candidate = self.run_metrics(candidate_run_ids)
+        results = []
+        for name in sorted(set(baseline) & set(candidate)):
+            base_value = statistics.median(baseline[name]["values"])
+            cand_value = statistics.median(candidate[name]["values"])
+            if base_value:
+                change_pct = (cand_value - base_value) / abs(base_value) * 100
+            else:
+                change_pct = 0.0 if not cand_value else float("inf")
+            lower_is_better = candidate[name]["lower_is_better"]
+            worse_pct = change_pct if lower_is_better else -change_pct
+            results.append(
+                {
+                    "metric": name,
+                    "unit": candidate[name]["unit"],
+                    "baseline": base_value,
+                    "candidate": cand_value,
+                    "change_pct": change_pct,
+                    "lower_is_better": lower_is_better,
+                    "regressed": worse_pct > threshold,
+                }
+            )
+        return results
+
+    def close(self):
+        self.conn.close()
+
+
+def record_metrics(test_name, metrics, config=None, units=None, cluster_label=None):
+    """
+    This function records the metrics of a test run in the baseline store
+
+    The ceph version and the cluster label (RGW_PERF_CLUSTER_LABEL, defaults
+    to the cluster fsid) are looked up from the cluster. Recording errors are
+    logged and never fail the test.
+
+    Parameters:
+        test_name(char): name of the test or workload
+        metrics(dict): metric name -> numeric value
+        config: test config, hashed into the run key
+        units(dict): metric name -> unit
+        cluster_label(char): overrides the cluster label
+
+    Returns:
+        run_id(int) or None if the run could not be recorded
+    """
+    try:
+        import v2.utils.utils as utils
+
+        ceph_version, _ = utils.get_ceph_version()
+        cluster_label = (
+            cluster_label
+            or os.environ.get("RGW_PERF_CLUSTER_LABEL")
+            or utils.get_cluster_fsid()
+        )
+        store = PerfBaselineStore()
+        try:
+            run_id = store.record(
+                test_name, metrics, config, ceph_version, cluster_label, units
+            )
+        finally:
+            store.close()
+        log.info(
+            f"recorded perf run {run_id} of {test_name} in {store.db_path}: {metrics}"
+        )
+        return run_id
+    except Exception as e:
+        log.warning(f"failed to record perf metrics of {test_name}: {e}")
+        return None
+
+
+def _select_runs(store, args, prefix):
+    run_id = getattr(args, f"{prefix}_run")
+    if run_id:
+        return [int(i) for i in run_id.split(",")]
+    runs = store.runs(
+        args.test,
+        args.config_hash,
+        getattr(args, f"{prefix}_version"),
+        args.cluster_label,
+    )
+    return [run["id"] for run in runs]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RGW performance baseline store")
+    parser.add_argument(
+        "--db", help="database, defaults to $RGW_PERF_DB or ~/rgw_perf_baseline.sqlite"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = sub.add_parser("list", help="list recorded runs")
+    list_parser.add_argument("--test")
+    list_parser.add_argument("--config-hash")
+    list_parser.add_argument("--version")
+    list_parser.add_argument("--cluster-label")
+
+    compare_parser = sub.add_parser(
+        "compare", help="compare a candidate with a baseline, exit 1 on regressions"
+    )
+    compare_parser.add_argument("--test", required=True)
+    compare_parser.add_argument("--config-hash")
+    compare_parser.add_argument("--cluster-label")
+    compare_parser.add_argument("--baseline-version")
+    compare_parser.add_argument("--baseline-run", help="comma separated run ids")
+    compare_parser.add_argument(
+        "--candidate-version", help="defaults to the latest run of the test"
+    )
+    compare_parser.add_argument("--candidate-run", help="comma separated run ids")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed regression in percent",
+    )
+    args = parser.parse_args(argv)
+    store = PerfBaselineStore(args.db)
+
+    if args.command == "list":
+        for run in store.runs(
+            args.test, args.config_hash, args.version, args.cluster_label
+        ):
+            print(
+                f"{run['id']:6d}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['created']))}  "
+                f"{run['test_name']}  config={run['config_hash']}  "
+                f"version={run['ceph_version']}  cluster={run['cluster_label']}"
+            )
+        return 0
+
+    if not (args.candidate_run or args.candidate_version):
+        latest = store.runs(args.test, args.config_hash, None, args.cluster_label)
+        if not latest:
+            print(f"no runs of {args.test}")
+            return 2
+        args.candidate_run = str(latest[0]["id"])
+        args.config_hash = args.config_hash or latest[0]["config_hash"]
+        args.cluster_label = args.cluster_label or latest[0]["cluster_label"]
+    candidate = _select_runs(store, args, "candidate")
+    if not (args.baseline_run or args.baseline_version):
+        # default baseline: the runs of the same key before the candidate
+        previous = [
+            run["id"]
+            for run in store.runs(args.test, args.config_hash, None, args.cluster_label)
+            if run["id"] < min(candidate)
+        ]
+        baseline = previous[:1]
+    else:
+        baseline = _select_runs(store, args, "baseline")
+    if not baseline or not candidate:
+        print("no baseline or candidate runs match")
+        return 2
+
+    results = store.compare(baseline, candidate, args.threshold)
+    print(
+        f"baseline runs: {baseline}  candidate runs: {candidate}  threshold: {args.threshold}%"
+    )
+    for result in results:
+        print(
+            f"{'REGRESSED' if result['regressed'] else 'ok':10s} {result['metric']:40s} "
+            f"{result['baseline']:14.4f} -> {result['candidate']:14.4f} "
+            f"{result['change_pct']:+8.2f}% ({'lower' if result['lower_is_better'] else 'higher'} is better)"
+        )
+    return 1 if any(result["regressed"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,18 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
 import argparse
+import hashlib
 import logging
 import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import boto3
 import botocore
+import v2.lib.manage_data as manage_data
 from v2.lib.exceptions import SyncFailedError, TestExecError
+from v2.lib.s3 import client_factory
+from v2.lib.s3.io_info_store import export_io_info
 from v2.utils import utils
 from v2.utils.io_info_config import IoInfoConfig
 from v2.utils.log import configure_logging
@@ -18,6 +24,8 @@ log = logging.getLogger()
 
 
 IO_INFO_FNAME = "io_info.yaml"
+# size of the chunks read from the GET body while hashing
+STREAM_CHUNK_SIZE = 1024 * 1024
 
 
 def check_object_exists(obj, bucket):
@@ -102,26 +110,115 @@ def verify_key_with_version(each_key, bucket):
         )
 
 
+def verify_object_stream(
+    client, bucket_name, key_name, size, md5_local, version_id=None
+):
+    """
+    This function verifies size and md5 of an object by hashing the GET body as it streams
+
+    Parameters:
+        client: boto3 s3 client
+        bucket_name(char): name of the bucket
+        key_name(char): name of the key
+        size(int): expected size from io_info
+        md5_local(char): expected md5 from io_info
+        version_id(char): version to verify, current version if None
+
+    Returns:
+        number of bytes verified
+    """
+    kwargs = {"Bucket": bucket_name, "Key": key_name}
+    if version_id is not None:
+        kwargs["VersionId"] = version_id
+    try:
+        response = client.get_object(**kwargs)
+    except botocore.exceptions.ClientError as ex:
+        if ex.response["Error"]["Code"] == "NoSuchKey":
+            raise SyncFailedError("object not synced! data sync failure")
+        raise
+    if int(size) != int(response["ContentLength"]):
+        raise TestExecError(
+            f"Size not matched for {bucket_name}/{key_name} version_id: {version_id}, "
+            f"size from yaml: {size}, size from s3: {response['ContentLength']}"
+        )
+    md5 = hashlib.md5()
+    received = 0
+    for chunk in response["Body"].iter_chunks(chunk_size=STREAM_CHUNK_SIZE):
+        md5.update(chunk)
+        received += len(chunk)
+    downloaded_md5 = md5.hexdigest()
+    if md5_local != downloaded_md5:
+        raise TestExecError(
+            f"Md5 not matched for {bucket_name}/{key_name} version_id: {version_id}, "
+            f"md5_local: {md5_local}, md5_from_s3: {downloaded_md5}"
+        )
+    return received
+
+
+def verify_object_range(client, bucket_name, key_name, key_info, start, length):
+    """
+    This function verifies a byte range of a generated object against regenerated data
+
+    Objects uploaded from generated data record their seed in io_info, so the
+    expected bytes of any range are regenerated instead of read from a local file.
+
+    Parameters:
+        client: boto3 s3 client
+        bucket_name(char): name of the bucket
+        key_name(char): name of the key
+        key_info(dict): key or version info from io_info with seed, size and profile
+        start(int): first byte of the range
+        length(int): length of the range
+    """
+    if key_info.get("seed") is None:
+        raise TestExecError(f"no seed recorded in io_info for key: {key_name}")
+    payload = manage_data.VirtualPayload(
+        key_info["seed"],
+        key_info["size"],
+        key_info.get("profile", "text"),
+        key_info.get("compress_ratio", 2),
+    )
+    expected = payload.read_range(start, length)
+    kwargs = {
+        "Bucket": bucket_name,
+        "Key": key_name,
+        "Range": f"bytes={start}-{start + len(expected) - 1}",
+    }
+    if key_info.get("version_id") is not None:
+        kwargs["VersionId"] = key_info["version_id"]
+    data = client.get_object(**kwargs)["Body"].read()
+    if data != expected:
+        raise TestExecError(
+            f"data mismatch for {bucket_name}/{key_name} in range {kwargs['Range']}"
+        )
+    log.info(f"range {kwargs['Range']} verified for {bucket_name}/{key_name}")
+
+
 class ReadIOInfo(object):
     def __init__(self, yaml_fname=IO_INFO_FNAME):
         self.yaml_fname = yaml_fname
         self.file_op = FileOps(self.yaml_fname, type="yaml")
 
-    def verify_io(self):
+    def verify_io(self, workers=None):
         """
         This function to verify the data of buckets owned by a user
 
         Data verification happens to all the buckets of a particular user for both versioned and normal buckets
         Parameters:
+            workers(int): if set, object data is verified by a pool of this many workers
 
         Returns:
 
         """
         log.info("***************Starting Verification*****************")
+        # bring the yaml up to date if the journal backend is in use
+        export_io_info(self.yaml_fname)
         data = self.file_op.get_data()
         users = data["users"]
         endpoint_url = utils.get_rgw_endpoint_url()
         is_secure = True if endpoint_url.startswith("https") else False
+        if workers:
+            return self.verify_io_parallel(users, endpoint_url, is_secure, workers)
 
         for each_user in users:
             if each_user["deleted"] is False:
@@ -129,13 +226,14 @@ class ReadIOInfo(object):
                 log.info(f"user_id: {each_user['user_id']}")
                 log.info(f"access_key: {each_user['access_key']}")
                 log.info(f"secret_key: {each_user['secret_key']}")
-                conn = boto3.resource(
+                conn = client_factory.get_resource(
                     "s3",
-                    aws_access_key_id=each_user["access_key"],
-                    aws_secret_access_key=each_user["secret_key"],
-                    endpoint_url=endpoint_url,
+                    each_user["access_key"],
+                    each_user["secret_key"],
+                    endpoint_url,
+                    region_name=None,
+                    addressing_style=None,
                     use_ssl=is_secure,
-                    verify=False,
                 )
 
                 for each_bucket in each_user["bucket"]:
@@ -211,15 +309,147 @@ class ReadIOInfo(object):
                     )
         log.info("verification of data completed")
 
+    def verify_io_parallel(self, users, endpoint_url, is_secure, workers):
+        """
+        This function verifies object data of all users with a bounded pool of workers
+
+        Every object GET is hashed as it streams in, no temp files are written.
+        Deleted users, buckets and keys are verified as in verify_io.
+
+        Parameters:
+            users(list): users from the io_info yaml
+            endpoint_url(char): rgw endpoint url
+            is_secure(bool): use ssl
+            workers(int): number of concurrent verifications
+
+        Returns:
+            summary(dict): objects, bytes, failures and bytes/s of the verification
+        """
+        log.info(f"verifying data with {workers} workers")
+        # boto3 clients are thread safe, one per user with a pool sized for the workers
+        pool_size = max(workers, client_factory.client_config().max_pool_connections)
+        tasks = []
+        for each_user in users:
+            if each_user["deleted"] is not False:
+                self._verify_deleted_user(each_user)
+                continue
+            client = client_factory.get_client(
+                "s3",
+                each_user["access_key"],
+                each_user["secret_key"],
+                endpoint_url,
+                region_name=None,
+                addressing_style=None,
+                use_ssl=is_secure,
+                max_pool_connections=pool_size,
+            )
+            for each_bucket in each_user["bucket"]:
+                if each_bucket["deleted"] is not False:
+                    self._verify_deleted_bucket(client, each_bucket["name"])
+                    continue
+                for each_key in each_bucket["keys"]:
+                    key_name = os.path.basename(each_key["name"])
+                    if each_key["deleted"] is not False:
+                        tasks.append((client, each_bucket["name"], key_name, None))
+                    elif not each_key["versioning_info"]:
+                        tasks.append((client, each_bucket["name"], key_name, each_key))
+                    else:
+                        for each_version in each_key["versioning_info"]:
+                            tasks.append(
+                                (client, each_bucket["name"], key_name, each_version)
+                            )
+        log.info(f"objects to verify: {len(tasks)}")
+        summary = {"objects": 0, "bytes": 0, "failures": []}
+        summary_lock = threading.Lock()
+        start = time.time()
+
+        def verify(client, bucket_name, key_name, info):
+            if info is None:
+                try:
+                    client.head_object(Bucket=bucket_name, Key=key_name)
+                except botocore.exceptions.ClientError:
+                    return 0
+                raise AssertionError(
+                    f"Verification of deleted object '{key_name}' failed"
+                )
+            return verify_object_stream(
+                client,
+                bucket_name,
+                key_name,
+                info["size"],
+                info["md5_local"],
+                info.get("version_id"),
+            )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(verify, *task): task for task in tasks}
+            for future in as_completed(futures):
+                _, bucket_name, key_name, _ = futures[future]
+                try:
+                    verified_bytes = future.result()
+                except Exception as e:
+                    log.error(f"verification failed for {bucket_name}/{key_name}: {e}")
+                    with summary_lock:
+                        summary["failures"].append(f"{bucket_name}/{key_name}: {e}")
+                    continue
+                with summary_lock:
+                    summary["objects"] += 1
+                    summary["bytes"] += verified_bytes
+        elapsed = time.time() - start
+        summary["elapsed"] = elapsed
+        summary["bytes_per_sec"] = summary["bytes"] / elapsed if elapsed else 0
+        log.info(
+            f"verification summary: objects verified: {summary['objects']}, "
+            f"bytes verified: {summary['bytes']}, elapsed: {elapsed:.2f}s, "
+            f"throughput: {summary['bytes_per_sec'] / (1024 * 1024):.2f} MiB/s, "
+            f"failures: {len(summary['failures'])}"
+        )
+        if summary["failures"]:
+            raise TestExecError(
+                f"data verification failed for {len(summary['failures'])} objects: "
+                f"{summary['failures'][:10]}"
+            )
+        log.info("verification of data completed")
+        return summary
+
+    def _verify_deleted_bucket(self, client, bucket_name):
+        log.info(f"Verification of deleted bucket '{bucket_name}' starts")
+        try:
+            client.head_bucket(Bucket=bucket_name)
+            raise AssertionError(
+                f"Verification of deleted bucket '{bucket_name}' failed"
+            )
+        except botocore.exceptions.ClientError as e:
+            if int(e.response["Error"]["Code"]) != 404:
+                raise AssertionError(
+                    f"Verification of deleted bucket '{bucket_name}' failed"
+                )
+        log.info(f"Verification of deleted bucket '{bucket_name}' successful")
+
+    def _verify_deleted_user(self, each_user):
+        user_id = each_user["user_id"]
+        log.info(f"Verification of deleted user '{user_id}' starts")
+        out = utils.exec_shell_cmd("radosgw-admin user list")
+        if user_id in out:
+            raise AssertionError(f"Verification of deleted user '{user_id}' failed")
+        log.info(f"Verification of deleted user '{user_id}' successful")
+
 
 if __name__ == "__main__":
     log_f_name = os.path.basename(os.path.splitext(__file__)[0])
     configure_logging(f_name=log_f_name)
     parser = argparse.ArgumentParser(description="RGW S3 Automation")
     parser.add_argument("-c", dest="config", help="RGW Test yaml configuration")
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="verify objects in parallel with this many workers",
+    )
     args = parser.parse_args()
     yaml_file = args.config
     IO_INFO_FNAME = f"io_info_{os.path.basename(yaml_file)}"
     IoInfoConfig(io_info_fname=IO_INFO_FNAME)
     read_io_info = ReadIOInfo(IO_INFO_FNAME)
-    read_io_info.verify_io()
+    read_io_info.verify_io(workers=args.workers)
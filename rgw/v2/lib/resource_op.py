@@ -12,10 +12,12 @@ import tempfile
 import names
 import v2.lib.s3.write_io_info as write_io_info
 import v2.utils.utils as utils
-import yaml
 from v2.lib.admin import AddUserInfo, BasicIOInfoStructure, TenantInfo, UserMgmt
+from v2.lib.config_schema import apply_defaults, load_config, validate_config
 from v2.lib.exceptions import ConfigError
 from v2.lib.frontend_configure import Frontend, Frontend_CephAdm
+from v2.lib.s3 import client_factory
+from v2.lib.s3.tracing import enable_from_config, trace_resource_op
 from v2.utils.io_info_config import IoInfoConfig
 
 log = logging.getLogger()
@@ -85,6 +87,7 @@ def get_writable_user_details_file():
 
 
 @write_io_info.logioinfo
+@trace_resource_op
 def resource_op(exec_info):
     """
     This function is for resource
@@ -279,12 +282,17 @@ class Config(object):
         self.doc = None
         if not os.path.exists(conf_file):
             raise ConfigError("config file not given")
-        with open(conf_file, "r") as f:
-            self.doc = yaml.safe_load(f)
+        self.doc = load_config(conf_file)
+        errors = validate_config(self.doc)
+        if errors:
+            raise ConfigError(f"invalid config {conf_file}:\n  " + "\n  ".join(errors))
+        enable_from_config(conf_file, self.doc["config"].get("trace", False))
         io_info_config = IoInfoConfig(
-            io_info_fname=f"io_info_{os.path.basename(conf_file)}"
+            io_info_fname=f"io_info_{os.path.basename(conf_file)}",
+            io_info_backend=(self.doc.get("config") or {}).get("io_info_backend"),
         )
         log.info(f"io info fname is: {io_info_config.io_info_fname}")
+        log.info(f"io info backend is: {io_info_config.io_info_backend}")
         log.info("got config: \n%s" % self.doc)
 
     def read(self, ssh_con=None):
@@ -293,232 +301,11 @@ class Config(object):
         """
         if self.doc is None:
             raise ConfigError("config file not given")
-        self.shards = self.doc["config"].get("shards")
-        # todo: better suited to be added under ceph_conf
-        self.max_objects_per_shard = self.doc["config"].get("max_objects_per_shard")
-        self.max_rgw_dynamic_shards = self.doc["config"].get(
-            "max_rgw_dynamic_shards", 1999
-        )
-        self.rgw_reshard_thread_interval = self.doc["config"].get(
-            "rgw_reshard_thread_interval", 180
-        )
+        # every CONFIG_SCHEMA and TEST_OPS_SCHEMA key becomes an attribute
+        for key, value in apply_defaults(self.doc["config"]).items():
+            setattr(self, key, value)
         self.max_objects = None
-        self.user_max_objects = self.doc["config"].get("user_max_objects")
-        self.user_max_size = self.doc["config"].get("user_max_size")
-        self.s3_copy_obj = self.doc["config"].get("s3_copy_obj", False)
-        self.bucket_max_objects = self.doc["config"].get("bucket_max_objects")
-        self.bucket_max_size = self.doc["config"].get("bucket_max_size")
-        self.user_count = self.doc["config"].get("user_count")
-        self.test_lc_transition = self.doc["config"].get("test_lc_transition")
-        self.pool_name = self.doc["config"].get("pool_name")
-        self.storage_class = self.doc["config"].get("storage_class")
-        self.ec_pool_transition = self.doc["config"].get("ec_pool_transition")
-        self.multiple_transitions = self.doc["config"].get("multiple_transitions")
-        self.second_pool_name = self.doc["config"].get("second_pool_name")
-        self.second_storage_class = self.doc["config"].get("second_storage_class")
-        self.two_pool_transition = self.doc["config"].get("two_pool_transition")
-        self.ec_storage_class = self.doc["config"].get("ec_storage_class")
-        self.ec_pool_name = self.doc["config"].get("ec_pool_name")
-        self.test_with_bucket_index_shards = self.doc["config"].get(
-            "test_with_bucket_index_shards"
-        )
-        self.enable_resharding = self.doc["config"].get("enable_resharding")
-        self.log_trimming = self.doc["config"].get("log_trimming")
-        self.test_bilog_trim_on_non_existent_bucket = self.doc["config"].get(
-            "test_bilog_trim_on_non_existent_bucket"
-        )
-        self.download_object = self.doc["config"].get("download_object")
-        self.user_remove = self.doc["config"].get("user_remove", True)
-        self.user_type = self.doc["config"].get("user_type")
-        self.bucket_count = self.doc["config"].get("bucket_count")
-        self.encryption_keys = self.doc["config"].get("encryption_keys")
-        self.objects_count = self.doc["config"].get("objects_count")
-        self.pseudo_dir_count = self.doc["config"].get("pseudo_dir_count")
-        self.use_aws4 = self.doc["config"].get("use_aws4", None)
-        self.objects_size_range = self.doc["config"].get("objects_size_range")
-        self.sharding_type = self.doc["config"].get("sharding_type")
-        self.split_size = self.doc["config"].get("split_size", 5)
-        self.test_ops = self.doc["config"].get("test_ops", {})
-        self.lifecycle_conf = self.doc["config"].get("lifecycle_conf")
-        self.new_lifecycle_conf = self.doc["config"].get("new_lifecycle_conf")
-        self.delete_marker_ops = self.doc["config"].get("delete_marker_ops")
-        self.mapped_sizes = self.doc["config"].get("mapped_sizes")
-        self.bucket_policy_op = self.doc["config"].get("bucket_policy_op")
-        self.container_count = self.doc["config"].get("container_count")
-        self.version_count = self.doc["config"].get("version_count")
-        self.version_enable = self.doc["config"].get("version_enable", False)
-        self.deletelc = self.doc["config"].get("deletelc", False)
-        self.bucket_max_list_ops = self.doc["config"].get("bucket_max_list_ops")
-        self.bucket_max_delete_ops = self.doc["config"].get("bucket_max_delete_ops")
-        self.user_max_list_ops = self.doc["config"].get("user_max_list_ops")
-        self.user_max_delete_ops = self.doc["config"].get("user_max_delete_ops")
-        self.rgw_ratelimit_interval = self.doc["config"].get("rgw_ratelimit_interval")
-        self.disable_dynamic_shard = self.doc["config"].get(
-            "disable_dynamic_shard", False
-        )
-        self.delete_object_current_versions = self.doc["config"].get(
-            "delete_object_current_versions", False
-        )
-        self.delete_using_different_user = self.doc["config"].get(
-            "delete_using_different_user", False
-        )
-        self.copy_versioned_obj_to_versioned_bkt = self.doc["config"].get(
-            "copy_versioned_obj_to_versioned_bkt", False
-        )
-        self.copy_version_object = self.doc["config"].get("copy_version_object", False)
-        self.object_expire = self.doc["config"].get("object_expire", False)
-        self.rgw_lc_debug_interval = self.doc["config"].get("rgw_lc_debug_interval", 30)
-        self.rgw_enable_lc_threads = self.doc["config"].get(
-            "rgw_enable_lc_threads", True
-        )
-        self.rgw_lifecycle_work_time = self.doc["config"].get(
-            "rgw_lifecycle_work_time", "00:00-06:00"
-        )
-        self.rgw_lc_max_worker = self.doc["config"].get("rgw_lc_max_worker", 10)
-        self.rgw_lc_max_wp_worker = self.doc["config"].get("rgw_lc_max_wp_worker", 10)
-        self.parallel_lc = self.doc["config"].get("parallel_lc", False)
-        self.multiple_delete_marker_check = self.doc["config"].get(
-            "multiple_delete_marker_check", False
-        )
-        self.delete_marker_check = self.doc["config"].get("delete_marker_check", False)
-        self.invalid_date = self.doc["config"].get("invalid_date", False)
-        self.rgw_crypt_require_ssl = self.doc["config"].get(
-            "rgw_crypt_require_ssl", "false"
-        )
-        self.rgw_crypt_sse_s3_backend = self.doc["config"].get(
-            "rgw_crypt_sse_s3_backend", "vault"
-        )
-        self.rgw_crypt_sse_s3_vault_addr = self.doc["config"].get(
-            "rgw_crypt_sse_s3_vault_addr", "http://127.0.0.1:8100"
-        )
-        self.rgw_crypt_sse_s3_vault_auth = self.doc["config"].get(
-            "rgw_crypt_sse_s3_vault_auth", "agent"
-        )
-        self.rgw_crypt_sse_s3_vault_secret_engine = self.doc["config"].get(
-            "rgw_crypt_sse_s3_vault_secret_engine", "transit"
-        )
-        self.rgw_crypt_sse_s3_vault_prefix = self.doc["config"].get(
-            "rgw_crypt_sse_s3_vault_prefix", "/v1/transit"
-        )
-        self.dynamic_resharding = self.doc["config"].get("dynamic_resharding", False)
-        self.conflict_transition_actions = self.doc["config"].get(
-            "conflict_transition_actions", False
-        )
-        self.manual_resharding = self.doc["config"].get("manual_resharding", False)
-        self.reshard_cancel_cmd = self.doc["config"].get("reshard_cancel_cmd", False)
-        self.sync_disable_and_enable = self.doc["config"].get(
-            "sync_disable_and_enable", False
-        )
-        self.large_object_upload = self.doc["config"].get("large_object_upload", False)
-        self.test_aync_data_notifications = self.doc["config"].get(
-            "test_aync_data_notifications", False
-        )
-        self.debug_rgw = self.doc["config"].get("debug_rgw")
-        self.bucket_sync_run_with_disable_sync_thread = self.doc["config"].get(
-            "bucket_sync_run_with_disable_sync_thread", False
-        )
-        self.large_object_download = self.doc["config"].get(
-            "large_object_download", False
-        )
-        self.static_large_object_upload = self.doc["config"].get(
-            "static_large_object_upload", False
-        )
-        self.local_file_delete = self.doc["config"].get("local_file_delete", False)
-        self.sts = self.doc["config"].get("sts")
-        self.ceph_conf = self.doc["config"].get("ceph_conf")
-        self.gc_verification = self.doc["config"].get("gc_verification", False)
-        self.etag_verification = self.doc["config"].get("etag_verification", False)
-        self.bucket_sync_crash = self.doc["config"].get("bucket_sync_crash", False)
-        self.bucket_sync_status = self.doc["config"].get("bucket_sync_status", False)
-        self.bucket_sync_run = self.doc["config"].get("bucket_sync_run", False)
-        self.bucket_stats = self.doc["config"].get("bucket_stats", False)
-        self.abort_multipart = self.doc["config"].get("abort_multipart", False)
-        self.bucket_check_fix = self.doc["config"].get("bucket_check_fix", False)
-        self.rgw_ops_log = self.doc["config"].get("rgw_ops_log", False)
-        self.user_reset = self.doc["config"].get("user_reset", False)
-        self.rgw_enable_static_website = self.doc["config"].get(
-            "rgw_enable_static_website", False
-        )
-        self.multisite_global_sync_policy = self.doc["config"].get(
-            "multisite_global_sync_policy", False
-        )
-        self.multisite_sync_policy = self.doc["config"].get(
-            "multisite_sync_policy", False
-        )
-        self.header_size = self.doc["config"].get("header_size", False)
-        self.test_datalog_trim_command = self.doc["config"].get(
-            "test_datalog_trim_command", False
-        )
-        self.rgw_gc_obj_min_wait = self.doc["config"].get("rgw_gc_obj_min_wait", False)
-        self.ssl = self.doc["config"].get(
-            "ssl",
-        )
-        self.haproxy = self.doc["config"].get("haproxy", False)
-        self.test_sync_consistency_bucket_stats = self.doc["config"].get(
-            "test_sync_consistency_bucket_stats", False
-        )
-        self.testlc_with_obect_acl_set = self.doc["config"].get(
-            "testlc_with_obect_acl_set", False
-        )
-        self.test_sync_0_shards = self.doc["config"].get("test_sync_0_shards", False)
-        self.test_versioning_archive = self.doc["config"].get(
-            "test_versioning_archive", False
-        )
-        self.retain_bucket_pol = self.doc["config"].get("retain_bucket_pol", False)
-        self.frontend = self.doc["config"].get("frontend")
-        self.io_op_config = self.doc.get("config").get("io_op_config")
-        self.radoslist_all = self.test_ops.get("radoslist_all", False)
-        self.dbr_scenario = self.doc["config"].get("dbr_scenario", None)
-        self.enable_sharding = self.doc["config"].get("enable_sharding", False)
-        self.change_datalog_backing = self.test_ops.get("change_datalog_backing", False)
-        self.modify_user = self.doc["config"].get("modify_user", False)
-        self.suspend_user = self.doc["config"].get("suspend_user", False)
-        self.enable_user = self.doc["config"].get("enable_user", False)
-        self.delete_user = self.doc["config"].get("delete_user", False)
-
-        self.d3n_feature = self.doc["config"].get("d3n_feature", False)
-        self.datacache_path = self.doc["config"].get(
-            "datacache_path", "/tmp/rgw_datacache/"
-        )
-        self.datacache_size = self.doc["config"].get("datacache_size", 10737418240)
-
-        self.persistent_flag = self.test_ops.get("persistent_flag", False)
-        self.copy_object = self.test_ops.get("copy_object", False)
-        self.get_topic_info = self.test_ops.get("get_topic_info", False)
-        self.sse_s3_per_bucket = self.test_ops.get("sse_s3_per_bucket", False)
-        self.test_bi_purge = self.doc["config"].get("test_bi_purge", False)
-        self.set_acl = self.test_ops.get("set_acl", None)
-        self.put_empty_bucket_notification = self.test_ops.get(
-            "put_empty_bucket_notification", False
-        )
-        self.full_sync_test = self.doc["config"].get("full_sync_test", False)
-        self.remote_zone = self.doc["config"].get("remote_zone")
-        self.local_zone = self.doc["config"].get("local_zone")
-        self.bucket_max_read_ops = self.doc["config"].get("bucket_max_read_ops")
-        self.bucket_max_read_bytes = self.doc["config"].get("bucket_max_read_bytes")
-        self.bucket_max_write_ops = self.doc["config"].get("bucket_max_write_ops")
-        self.bucket_max_write_bytes = self.doc["config"].get("bucket_max_write_bytes")
-        self.user_max_read_ops = self.doc["config"].get("user_max_read_ops")
-        self.user_max_read_bytes = self.doc["config"].get("user_max_read_bytes")
-        self.user_max_write_ops = self.doc["config"].get("user_max_write_ops")
-        self.user_max_write_bytes = self.doc["config"].get("user_max_write_bytes")
-        self.user_conflict_read_bytes = self.doc["config"].get(
-            "user_conflict_read_bytes"
-        )
-        self.user_conflict_read_ops = self.doc["config"].get("user_conflict_read_ops")
-        self.user_conflict_write_bytes = self.doc["config"].get(
-            "user_conflict_write_bytes"
-        )
-        self.user_conflict_write_ops = self.doc["config"].get("user_conflict_write_ops")
-        self.permutation_count = self.doc["config"].get("permutation_count")
-        self.user_names = self.doc["config"].get("user_names")
-        self.bucket_names = self.doc["config"].get("bucket_names")
-        self.rgw_dynamic_resharding_reduction_wait = self.doc["config"].get(
-            "rgw_dynamic_resharding_reduction_wait"
-        )
-        self.rgw_reshard_debug_interval = self.doc["config"].get(
-            "rgw_reshard_debug_interval", 120
-        )
+        client_factory.configure(self.client_config)
         ceph_version_id, ceph_version_name = utils.get_ceph_version()
         # todo: improve Frontend class
         if ceph_version_name in ["luminous", "nautilus"]:
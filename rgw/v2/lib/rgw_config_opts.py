@@ -137,6 +137,7 @@ class CephConfFileOP(FileOps, ConfigParse):
             self.add_data(cfg, ssh_con)
         else:
             self.add_data(cfg)
+        utils.cluster_info.invalidate("config_dump")
 
 
 class CephConfigSet:
@@ -0,0 +1,263 @@
+"""
+access_log - streaming parser and analyzer for bucket logging (server access log) records
+
+Log objects are read line by line from the get_object response body and
+each record is split by a compiled regex tokenizer: a [timestamp], a
+"quoted string" or a run of non blank characters is one field, quotes are
+stripped. Both formats are handled:
+
+    Standard: bucket_owner bucket [time] remote_ip requester request_id
+              operation key "request_uri" http_status error_code bytes_sent
+              object_size total_time turnaround_time "referer" "user_agent"
+              version_id host_id signature_version cipher_suite
+              authentication_type host_header tls_version access_point_arn
+              acl_required
+    Journal:  bucket_owner bucket [time] operation key object_size
+              version_id etag
+
+AccessLogAnalyzer aggregates the records in constant memory per distinct
+key and requester: per operation counts, per key and per requester counts
+and bytes, HTTP status counts, byte totals and turnaround time percentiles.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import heapq
+import logging
+import re
+
+from v2.lib.s3.async_load import LatencyHistogram
+
+log = logging.getLogger()
+
+STANDARD_FIELDS = (
+    "bucket_owner",
+    "bucket",
+    "time",
+    "remote_ip",
+    "requester",
+    "request_id",
+    "operation",
+    "key",
+    "request_uri",
+    "http_status",
+    "error_code",
+    "bytes_sent",
+    "object_size",
+    "total_time",
+    "turnaround_time",
+    "referer",
+    "user_agent",
+    "version_id",
+    "host_id",
+    "signature_version",
+    "cipher_suite",
+    "authentication_type",
+    "host_header",
+    "tls_version",
+    "access_point_arn",
+    "acl_required",
+)
+JOURNAL_FIELDS = (
+    "bucket_owner",
+    "bucket",
+    "time",
+    "operation",
+    "key",
+    "object_size",
+    "version_id",
+    "etag",
+)
+LOG_FORMATS = {"Standard": STANDARD_FIELDS, "Journal": JOURNAL_FIELDS}
+
+TOKEN_REGEX = re.compile(r'\[[^\]]*\]|"[^"]*"|\S+')
+TIMESTAMP_REGEX = re.compile(r"\[\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [-+]\d{4}\]")
+READ_CHUNK_SIZE = 1024 * 1024
+MAX_EXAMPLES = 10
+
+
+def tokenize(line):
+    """
+    This function splits a log record into its fields
+
+    Returns:
+        fields(list): the [timestamp] is one field, quotes are stripped
+    """
+    return [
+        token[1:-1] if token[0] == '"' else token for token in TOKEN_REGEX.findall(line)
+    ]
+
+
+def iter_log_records(rgw_s3_client, bucket_name, key):
+    """
+    This function yields the records of a log object, streamed from the get_object response body
+
+    Blank lines are skipped.
+    """
+    response = rgw_s3_client.get_object(Bucket=bucket_name, Key=key)
+    body = response["Body"]
+    try:
+        for line in body.iter_lines(chunk_size=READ_CHUNK_SIZE):
+            if line.strip():
+                yield line.decode("utf-8")
+    finally:
+        body.close()
+
+
+def _int(value):
+    return int(value) if value.isdigit() else 0
+
+
+class AccessLogAnalyzer(object):
+    """
+    Aggregates a stream of log records of one format
+
+    The functions here are
+    1. add(): aggregate one record
+    2. add_records(): aggregate an iterable of records
+    3. add_log_object(): aggregate the records of a log object
+    4. report(): the aggregates as a dict
+    5. log_report(): log the report
+    """
+
+    def __init__(self, log_format="Standard"):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(
+                f"unknown log format {log_format}, expected one of {list(LOG_FORMATS)}"
+            )
+        self.log_format = log_format
+        names = LOG_FORMATS[log_format]
+        self.min_fields = len(names)
+        self.idx = {name: index for index, name in enumerate(names)}
+        self.records = 0
+        self.malformed = 0
+        self.examples = []
+        self.operations = {}
+        self.http_status = {}
+        # key -> [count, bytes], requester -> [count, bytes]
+        self.keys = {}
+        self.requesters = {}
+        self.bytes_sent = 0
+        self.object_bytes = 0
+        self.turnaround = LatencyHistogram()
+
+    def add(self, line):
+        """
+        This function aggregates one record
+
+        Returns:
+            fields(list): the record fields, None if it is malformed
+        """
+        fields = tokenize(line)
+        if len(fields) < self.min_fields:
+            self.malformed += 1
+            if len(self.examples) < MAX_EXAMPLES:
+                self.examples.append(line)
+            return None
+        idx = self.idx
+        self.records += 1
+        op = fields[idx["operation"]]
+        self.operations[op] = self.operations.get(op, 0) + 1
+        size = _int(fields[idx["object_size"]])
+        self.object_bytes += size
+        key = fields[idx["key"]]
+        if key != "-":
+            stats = self.keys.get(key)
+            if stats is None:
+                self.keys[key] = [1, size]
+            else:
+                stats[0] += 1
+                stats[1] += size
+        if self.log_format == "Standard":
+            status = fields[idx["http_status"]]
+            self.http_status[status] = self.http_status.get(status, 0) + 1
+            sent = _int(fields[idx["bytes_sent"]])
+            self.bytes_sent += sent
+            requester = fields[idx["requester"]]
+            stats = self.requesters.get(requester)
+            if stats is None:
+                self.requesters[requester] = [1, sent]
+            else:
+                stats[0] += 1
+                stats[1] += sent
+            turnaround = fields[idx["turnaround_time"]]
+            if turnaround.isdigit():
+                # milliseconds
+                self.turnaround.record(int(turnaround) / 1000.0)
+        return fields
+
+    def add_records(self, lines):
+        """
+        This function aggregates an iterable of records, blank lines are skipped
+        """
+        for line in lines:
+            if line.strip():
+                self.add(line)
+        return self
+
+    def add_log_object(self, rgw_s3_client, bucket_name, key):
+        """
+        This function aggregates the records of a log object, streamed from its body
+        """
+        return self.add_records(iter_log_records(rgw_s3_client, bucket_name, key))
+
+    def report(self, top=10):
+        """
+        This function returns the aggregates
+
+        Parameters:
+            top(int): number of busiest keys and requesters reported
+
+        Returns:
+            report(dict): records, malformed, operations, http_status,
+                          bytes_sent, object_bytes, distinct_keys, top_keys,
+                          requesters, top_requesters, turnaround_ms, examples
+        """
+
+        def busiest(stats):
+            return [
+                {"name": name, "count": count, "bytes": size}
+                for name, (count, size) in heapq.nlargest(
+                    top, stats.items(), key=lambda item: item[1][0]
+                )
+            ]
+
+        turnaround = {"count": self.turnaround.count}
+        if self.turnaround.count:
+            for pct in (50, 90, 99):
+                turnaround[f"p{pct}"] = self.turnaround.percentile(pct) / 1000.0
+            turnaround["max"] = self.turnaround.max / 1000.0
+        return {
+            "log_format": self.log_format,
+            "records": self.records,
+            "malformed": self.malformed,
+            "operations": dict(sorted(self.operations.items())),
+            "http_status": dict(sorted(self.http_status.items())),
+            "bytes_sent": self.bytes_sent,
+            "object_bytes": self.object_bytes,
+            "distinct_keys": len(self.keys),
+            "top_keys": busiest(self.keys),
+            "requesters": len(self.requesters),
+            "top_requesters": busiest(self.requesters),
+            "turnaround_ms": turnaround,
+            "examples": list(self.examples),
+        }
+
+    def log_report(self, top=10):
+        report = self.report(top)
+        log.info(
+            f"{report['records']} {self.log_format} log records, {report['malformed']} malformed, "
+            f"{report['distinct_keys']} keys, {report['requesters']} requesters, "
+            f"{report['bytes_sent']} bytes sent, {report['object_bytes']} object bytes"
+        )
+        for op, count in report["operations"].items():
+            log.info(f"  {op}: {count}")
+        if report["http_status"]:
+            log.info(f"http status: {report['http_status']}")
+        if report["turnaround_ms"]["count"]:
+            log.info(f"turnaround time ms: {report['turnaround_ms']}")
+        if report["examples"]:
+            log.warning(f"malformed records: {report['examples']}")
+        return report
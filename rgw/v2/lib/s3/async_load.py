@@ -0,0 +1,547 @@
+"""
+async_load - asyncio S3 load generator
+
+A single process load generator built on asyncio streams and botocore's
+SigV4 signer, so no external binary or extra dependency is needed. It
+takes its credentials and endpoint from v2.lib.s3.auth.Auth, mixes PUT,
+GET, HEAD, LIST and DELETE with a weighted object size distribution and
+runs either
+
+    closed loop: 'concurrency' workers issue the next op as soon as the
+                 previous one completes
+    open loop:   ops are started at a fixed 'rate' whatever the response
+                 times are, latency is measured from the intended start
+                 so queueing is not hidden (no coordinated omission)
+
+Latencies are recorded per op in log-linear (HDR style) histograms.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import asyncio
+import logging
+import random
+import re
+import ssl
+import time
+from urllib.parse import quote, urlsplit
+
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.client import Config
+from botocore.credentials import Credentials
+from v2.lib.exceptions import TestExecError
+
+log = logging.getLogger()
+
+OPS = ["put", "get", "head", "list", "delete"]
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+READ_CHUNK_SIZE = 256 * 1024
+LIST_MAX_KEYS = 100
+# payloads are sent as UNSIGNED-PAYLOAD, the signer does not hash the body
+# and X-Amz-Content-SHA256 is part of the signed headers
+SIGNER_CONFIG = Config(s3={"payload_signing_enabled": False})
+
+
+def parse_size(value):
+    """
+    This function converts a size like 4096, '4K', '1.5M' or '1G' to bytes
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r"^\s*([\d.]+)\s*([BKMG]?)I?B?\s*$", str(value).upper())
+    if not match:
+        raise TestExecError(f"invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+class SizeDistribution(object):
+    """
+    Weighted object size distribution
+
+    Built from a size ('4K'), a range ('4K-1M') or a list of
+    {'size': <size or range>, 'weight': <weight>} entries.
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, list):
+            spec = [{"size": spec, "weight": 1}]
+        self.ranges, self.weights = [], []
+        for entry in spec:
+            low, _, high = str(entry["size"]).partition("-")
+            low = parse_size(low)
+            self.ranges.append((low, parse_size(high) if high else low))
+            self.weights.append(float(entry.get("weight", 1)))
+        self.max_size = max(high for _, high in self.ranges)
+
+    def sample(self, rng):
+        low, high = rng.choices(self.ranges, self.weights)[0]
+        return low if low == high else rng.randint(low, high)
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear latency histogram in microseconds
+
+    Values below 2**SUB_BITS are exact, above that each power of two is split
+    in 2**(SUB_BITS-1) linear buckets, i.e a relative error below 1%.
+    """
+
+    SUB_BITS = 8
+    HALF = 1 << (SUB_BITS - 1)
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < (1 << self.SUB_BITS):
+            return value
+        shift = value.bit_length() - self.SUB_BITS
+        return (shift + 1) * self.HALF + ((value >> shift) - self.HALF)
+
+    def _value(self, index):
+        if index < (1 << self.SUB_BITS):
+            return index
+        shift = index // self.HALF - 1
+        mantissa = index - shift * self.HALF
+        return (mantissa << shift) + (1 << shift) // 2
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1000000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for name, pick in (("min", min), ("max", max)):
+            values = [
+                v for v in (getattr(self, name), getattr(other, name)) if v is not None
+            ]
+            setattr(self, name, pick(values) if values else None)
+
+    def percentile(self, pct):
+        """
+        This function returns the latency in microseconds below which pct percent of the values are
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(round(self.count * pct / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Returns:
+            summary(dict): count and min, mean, p50, p90, p99, p99.9, max in milliseconds
+        """
+        if not self.count:
+            return {"count": 0}
+        summary = {"count": self.count, "min_ms": self.min / 1000.0}
+        summary["mean_ms"] = self.total / self.count / 1000.0
+        for pct in (50, 90, 99, 99.9):
+            summary[f"p{pct}_ms"] = self.percentile(pct) / 1000.0
+        summary["max_ms"] = self.max / 1000.0
+        return summary
+
+
+class AsyncS3Connection(object):
+    """
+    Keep-alive HTTP/1.1 connection to the S3 endpoint
+    """
+
+    def __init__(self, host, port, ssl_context=None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, target, headers, body=b""):
+        """
+        This function sends a request and reads the response, discarding the body
+
+        Returns:
+            (status, response headers, first bytes of the body, body length)
+        """
+        for attempt in (0, 1):
+            if self.writer is None:
+                await self._connect()
+            try:
+                head = f"{method} {target} HTTP/1.1\r\n" + "".join(
+                    f"{name}: {value}\r\n" for name, value in headers.items()
+                )
+                self.writer.write(head.encode() + b"\r\n")
+                if body:
+                    self.writer.write(body)
+                await self.writer.drain()
+                return await self._read_response(method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # the server may close an idle keep-alive connection, retry once
+                self.close()
+                if attempt:
+                    raise
+
+    async def _read_response(self, method):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by the server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        prefix, length = b"", 0
+        if method == "HEAD" or status in (204, 304):
+            pass
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                chunk = await self.reader.readexactly(min(remaining, READ_CHUNK_SIZE))
+                prefix = prefix or chunk[:1024]
+                remaining -= len(chunk)
+                length += len(chunk)
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunk = await self.reader.readexactly(size + 2)
+                prefix = prefix or chunk[:1024]
+                length += size
+        else:
+            chunk = await self.reader.read()
+            prefix, length = chunk[:1024], len(chunk)
+            self.close()
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers, prefix, length
+
+
+class AsyncS3LoadGenerator(object):
+    """
+    Generates a mix of S3 operations on a set of buckets
+
+    The functions here are
+    1. from_auth(): build a generator from a v2 Auth object
+    2. prefill(): PUT objects so that reads have something to read
+    3. run(): run the workload, closed or open loop
+    4. run_sync(): run() from synchronous code
+    """
+
+    def __init__(
+        self,
+        endpoint_url,
+        access_key,
+        secret_key,
+        buckets,
+        op_mix=None,
+        object_sizes="4K",
+        concurrency=32,
+        rate=None,
+        duration=60,
+        ops=None,
+        region="default",
+        session_token=None,
+        key_prefix="asyncload/",
+        seed=None,
+    ):
+        """
+        Parameters:
+            endpoint_url(char): http(s)://host:port of the RGW
+            buckets(list): buckets the objects are spread on
+            op_mix(dict): op name -> weight, ops are put, get, head, list and delete
+            object_sizes: size, range or weighted list, see SizeDistribution
+            concurrency(int): connections, i.e workers in closed loop mode
+            rate(float): ops per second, selects the open loop mode
+            duration(float): seconds to run, None to stop after 'ops' operations
+            ops(int): operations to run, None to stop after 'duration'
+        """
+        url = urlsplit(endpoint_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        default_port = {"http": 80, "https": 443}[url.scheme]
+        self.host_header = (
+            self.host if self.port == default_port else f"{self.host}:{self.port}"
+        )
+        self.endpoint_url = f"{url.scheme}://{self.host_header}"
+        self.signer = S3SigV4Auth(
+            Credentials(access_key, secret_key, session_token), "s3", region
+        )
+        self.buckets = list(buckets)
+        self.op_mix = op_mix or {"put": 1}
+        unknown = set(self.op_mix) - set(OPS)
+        if unknown:
+            raise TestExecError(f"unknown ops {unknown}, supported: {OPS}")
+        self.sizes = SizeDistribution(object_sizes)
+        self.concurrency = max(1, int(concurrency))
+        self.rate = float(rate) if rate else None
+        self.duration = duration
+        self.ops = ops
+        if not self.duration and not self.ops:
+            raise TestExecError("either duration or ops is needed")
+        self.key_prefix = key_prefix
+        self.rng = random.Random(seed)
+        self.payload = os.urandom(self.sizes.max_size)
+        self.keys = {bucket: [] for bucket in self.buckets}
+        self.key_counter = 0
+        self.histograms = {op: LatencyHistogram() for op in OPS}
+        self.counters = {
+            op: {"ok": 0, "errors": 0, "bytes": 0, "status": {}} for op in OPS
+        }
+        self.dropped = 0
+
+    @classmethod
+    def from_auth(cls, auth, buckets, region="default", **kwargs):
+        """
+        This function builds a generator with the endpoint and credentials of an Auth object
+        """
+        return cls(
+            auth.endpoint_url,
+            auth.access_key,
+            auth.secret_key,
+            buckets,
+            region=region,
+            session_token=auth.session_token,
+            **kwargs,
+        )
+
+    def _ssl_context(self):
+        if self.scheme != "https":
+            return None
+        context = ssl.create_default_context()
+        # same as the boto3 clients of Auth, verify=False
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def _signed_headers(self, method, path, query="", size=0):
+        headers = {"Host": self.host_header}
+        if method == "PUT":
+            headers["Content-Length"] = str(size)
+        url = self.endpoint_url + path + (f"?{query}" if query else "")
+        request = AWSRequest(method=method, url=url, headers=headers)
+        request.context["client_config"] = SIGNER_CONFIG
+        self.signer.add_auth(request)
+        return dict(request.headers.items())
+
+    def _next_op(self):
+        op = self.rng.choices(list(self.op_mix), list(self.op_mix.values()))[0]
+        bucket = self.rng.choice(self.buckets)
+        if op in ("get", "head", "delete") and not self.keys[bucket]:
+            op = "put"
+        return op, bucket
+
+    async def _execute(self, conn, op, bucket):
+        """
+        returns (status, bytes transferred)
+        """
+        keys = self.keys[bucket]
+        size = 0
+        query = ""
+        if op == "put":
+            self.key_counter += 1
+            key = f"{self.key_prefix}{self.key_counter:012d}"
+            size = self.sizes.sample(self.rng)
+            method = "PUT"
+        elif op == "list":
+            key = ""
+            method = "GET"
+            query = f"list-type=2&max-keys={LIST_MAX_KEYS}&prefix={quote(self.key_prefix, safe='')}"
+        else:
+            index = self.rng.randrange(len(keys))
+            key = keys[index]
+            method = {"get": "GET", "head": "HEAD", "delete": "DELETE"}[op]
+            if op == "delete":
+                # swap-remove, so reads stop picking the key right away
+                keys[index] = keys[-1]
+                keys.pop()
+        path = f"/{bucket}/{quote(key)}" if key else f"/{bucket}"
+        headers = self._signed_headers(method, path, query, size)
+        target = path + (f"?{query}" if query else "")
+        body = memoryview(self.payload)[:size] if size else b""
+        status, _, _, length = await conn.request(method, target, headers, body)
+        if op == "put" and status < 300:
+            keys.append(key)
+        return status, size or length
+
+    def _account(self, op, status, transferred, latency):
+        counters = self.counters[op]
+        counters["status"][status] = counters["status"].get(status, 0) + 1
+        # a read of a key deleted by a concurrent op is not an error
+        if status < 300 or (status == 404 and op in ("get", "head", "delete")):
+            counters["ok"] += 1
+            counters["bytes"] += transferred
+            self.histograms[op].record(latency)
+        else:
+            counters["errors"] += 1
+
+    async def _one(self, pool, op, bucket, intended_start):
+        conn = await pool.get()
+        try:
+            status, transferred = await self._execute(conn, op, bucket)
+        except Exception as e:
+            log.debug(f"{op} on {bucket} failed: {e}")
+            conn.close()
+            status, transferred = 599, 0
+        finally:
+            pool.put_nowait(conn)
+        self._account(op, status, transferred, time.perf_counter() - intended_start)
+
+    def _done(self, started, issued):
+        if self.ops and issued >= self.ops:
+            return True
+        return bool(self.duration) and time.perf_counter() - started >= self.duration
+
+    async def _closed_loop(self, pool, started):
+        issued = 0
+
+        async def worker():
+            nonlocal issued
+            while not self._done(started, issued):
+                issued += 1
+                op, bucket = self._next_op()
+                await self._one(pool, op, bucket, time.perf_counter())
+
+        await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+        return issued
+
+    async def _open_loop(self, pool, started):
+        issued = 0
+        pending = set()
+        # beyond this many outstanding ops the client itself is the bottleneck
+        max_outstanding = self.concurrency * 16
+        interval = 1.0 / self.rate
+        while not self._done(started, issued):
+            intended_start = started + issued * interval
+            delay = intended_start - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            issued += 1
+            if len(pending) >= max_outstanding:
+                self.dropped += 1
+                continue
+            op, bucket = self._next_op()
+            task = asyncio.ensure_future(self._one(pool, op, bucket, intended_start))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        return issued
+
+    async def _with_pool(self, coroutine_factory):
+        pool = asyncio.Queue()
+        ssl_context = self._ssl_context()
+        for _ in range(self.concurrency):
+            pool.put_nowait(AsyncS3Connection(self.host, self.port, ssl_context))
+        try:
+            return await coroutine_factory(pool)
+        finally:
+            while not pool.empty():
+                pool.get_nowait().close()
+
+    async def prefill(self, objects):
+        """
+        This function PUTs objects, spread over the buckets, before the measured run
+        """
+        log.info(f"prefilling {objects} objects")
+        op_mix, ops, duration = self.op_mix, self.ops, self.duration
+        self.op_mix, self.ops, self.duration = {"put": 1}, objects, None
+        try:
+            await self._with_pool(
+                lambda pool: self._closed_loop(pool, time.perf_counter())
+            )
+        finally:
+            self.op_mix, self.ops, self.duration = op_mix, ops, duration
+            self.histograms = {op: LatencyHistogram() for op in OPS}
+            self.counters = {
+                op: {"ok": 0, "errors": 0, "bytes": 0, "status": {}} for op in OPS
+            }
+
+    async def run(self, prefill_objects=0):
+        """
+        This function runs the workload
+
+        Returns:
+            results(dict): mode, elapsed, ops_per_sec, errors, dropped and per op
+                           counts, bytes, status codes and latency summary
+        """
+        if prefill_objects:
+            await self.prefill(prefill_objects)
+        mode = "open" if self.rate else "closed"
+        log.info(
+            f"running {mode} loop load: op_mix={self.op_mix} concurrency={self.concurrency} "
+            f"rate={self.rate} duration={self.duration} ops={self.ops}"
+        )
+        started = time.perf_counter()
+        loop = self._open_loop if self.rate else self._closed_loop
+        issued = await self._with_pool(lambda pool: loop(pool, started))
+        elapsed = time.perf_counter() - started
+        results = {
+            "mode": mode,
+            "elapsed": elapsed,
+            "issued": issued,
+            "dropped": self.dropped,
+            "ops": {},
+        }
+        total = LatencyHistogram()
+        for op in OPS:
+            counters = self.counters[op]
+            if not counters["ok"] and not counters["errors"]:
+                continue
+            total.merge(self.histograms[op])
+            results["ops"][op] = dict(
+                counters,
+                ops_per_sec=counters["ok"] / elapsed,
+                mib_per_sec=counters["bytes"] / elapsed / 1024 ** 2,
+                latency=self.histograms[op].summary(),
+            )
+        results["ops_per_sec"] = total.count / elapsed
+        results["errors"] = sum(c["errors"] for c in self.counters.values())
+        results["latency"] = total.summary()
+        log.info(
+            f"{mode} loop load done: {total.count} ops in {elapsed:.1f}s, "
+            f"{results['ops_per_sec']:.0f} ops/s, errors: {results['errors']}, "
+            f"dropped: {self.dropped}"
+        )
+        for op, op_results in results["ops"].items():
+            log.info(
+                f"  {op:6s} ok={op_results['ok']} errors={op_results['errors']} "
+                f"ops/s={op_results['ops_per_sec']:.0f} MiB/s={op_results['mib_per_sec']:.2f} "
+                f"latency={op_results['latency']}"
+            )
+        return results
+
+    def run_sync(self, prefill_objects=0):
+        return asyncio.run(self.run(prefill_objects))
@@ -1,5 +1,4 @@
 import os
-import socket
 import sys
 
 import boto3
@@ -8,7 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
 import logging
 
 import v2.utils.utils as utils
-from botocore.client import Config
+from v2.lib.s3 import client_factory
 
 log = logging.getLogger()
 
@@ -27,18 +26,13 @@ class Auth(object):
         """
         self.access_key = user_info["access_key"]
         self.secret_key = user_info["secret_key"]
-        if ssh_con is not None:
-            stdin, stdout, stderr = ssh_con.exec_command("hostname")
-            self.hostname = stdout.readline().strip()
-            self.port = utils.get_radosgw_port_no(ssh_con)
-            stdin, stdout, stderr = ssh_con.exec_command(
-                "hostname -I | awk '{print $1}'"
-            )
-            self.ip = stdout.readline().strip()
-        else:
-            self.hostname = socket.gethostname()
-            self.port = utils.get_radosgw_port_no()
-            self.ip = socket.gethostbyname(self.hostname)
+        # resolved once per node, pass refresh_endpoint=True after moving RGW
+        endpoint = utils.cluster_info.rgw_endpoint(
+            ssh_con, refresh=extra_kwargs.get("refresh_endpoint", False)
+        )
+        self.hostname = endpoint["hostname"]
+        self.port = endpoint["port"]
+        self.ip = endpoint["ip"]
         self.ssl = extra_kwargs.get("ssl", False)
         self.haproxy = extra_kwargs.get("haproxy", False)
         if self.haproxy:
@@ -70,26 +64,20 @@ class Auth(object):
             rgw: Connection status
         """
         log.info("performing authentication")
-        additional_config = Config(
-            signature_version=config.get("signature_version", None),
-            s3={"addressing_style": "path"},
-        )
-
         # Use region_name from config if provided, otherwise use 'default' as default
         # In multisite setups, this should be the zonegroup name
         region_name = config.get("region_name", "default")
         log.info(f"Using region_name: {region_name}")
 
-        rgw = boto3.resource(
+        rgw = client_factory.get_resource(
             "s3",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            endpoint_url=self.endpoint_url,
-            use_ssl=self.ssl,
-            verify=False,
-            config=additional_config,
+            self.access_key,
+            self.secret_key,
+            self.endpoint_url,
             region_name=region_name,
-            aws_session_token=self.session_token if self.session_token else None,
+            signature_version=config.get("signature_version", None),
+            session_token=self.session_token,
+            use_ssl=self.ssl,
         )
 
         log.info("connected")
@@ -106,25 +94,19 @@ class Auth(object):
             rgw: Connection status
         """
         log.info("performing authentication using client module")
-        additional_config = Config(
-            signature_version=config.get("signature_version", None),
-            s3={"addressing_style": "path"},
-        )
-
         # Use region_name from config if provided, otherwise use 'default' as default
         # In multisite setups, this should be the zonegroup name
         region_name = config.get("region_name", "default")
         log.info(f"Using region_name: {region_name}")
 
-        rgw = boto3.client(
+        rgw = client_factory.get_client(
             "s3",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            endpoint_url=self.endpoint_url,
-            config=additional_config,
-            verify=False,
+            self.access_key,
+            self.secret_key,
+            self.endpoint_url,
             region_name=region_name,
-            aws_session_token=self.session_token if self.session_token else None,
+            signature_version=config.get("signature_version", None),
+            session_token=self.session_token,
         )
         return rgw
 
@@ -136,21 +118,18 @@ class Auth(object):
         """
 
         log.info("performing authentication using iam client")
-        additional_config = Config(s3={"addressing_style": "path"})
 
         # Use region_name from config if provided, otherwise use 'default' as default
         # In multisite setups, this should be the zonegroup name
         region_name = extra_config.get("region_name", "default")
         log.info(f"Using region_name: {region_name}")
 
-        rgw = boto3.client(
+        rgw = client_factory.get_client(
             "iam",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            endpoint_url=self.endpoint_url,
+            self.access_key,
+            self.secret_key,
+            self.endpoint_url,
             region_name=region_name,
-            config=additional_config,
-            verify=False,
         )
 
         return rgw
@@ -162,21 +141,17 @@ class Auth(object):
         :return: connection object
         """
 
-        additional_config = Config(s3={"addressing_style": "path"})
-
         # Use region_name from config if provided, otherwise use 'default' as default
         # In multisite setups, this should be the zonegroup name
         region_name = config.get("region_name", "default")
         log.info(f"Using region_name: {region_name}")
 
-        sts_client = boto3.client(
+        sts_client = client_factory.get_client(
             "sts",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            endpoint_url=self.endpoint_url,
+            self.access_key,
+            self.secret_key,
+            self.endpoint_url,
             region_name=region_name,
-            config=additional_config,
-            verify=False,
         )
 
         return sts_client
@@ -188,23 +163,18 @@ class Auth(object):
         :return: connection object
         """
 
-        additional_config = Config(
-            signature_version="s3", s3={"addressing_style": "path"}
-        )
-
         # Use region_name from config if provided, otherwise use 'default' as default
         # In multisite setups, this should be the zonegroup name
         region_name = config.get("region_name", "default")
         log.info(f"Using region_name: {region_name}")
 
-        sns_client = boto3.client(
+        sns_client = client_factory.get_client(
             "sns",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            endpoint_url=self.endpoint_url,
+            self.access_key,
+            self.secret_key,
+            self.endpoint_url,
             region_name=region_name,
-            config=additional_config,
-            verify=False,
+            signature_version="s3",
         )
 
         return sns_client
@@ -0,0 +1,300 @@
+"""
+bulk_delete - high throughput S3 bulk delete engine
+
+Keys or object versions are streamed from the bucket listing into
+DeleteObjects batches of up to 1000 entries, deleted by parallel workers.
+Throttling (SlowDown, 503) and 5xx responses are retried with exponential
+backoff, the whole batch or only the entries the response reported as
+failed. Deleted keys are marked in io_info with one update per batch.
+
+Based on the DeleteObjects batcher of
+rgw/standalone/rgw_bulk_delete_versioned_olh.py.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+from v2.lib.exceptions import TestExecError
+from v2.lib.s3.write_io_info import KeyIoInfo
+
+log = logging.getLogger()
+
+MAX_BATCH_SIZE = 1000
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_RETRIES = 8
+MAX_BACKOFF = 60
+RETRIABLE_CODES = ("SlowDown", "Throttling", "RequestTimeout", "ServiceUnavailable")
+
+
+def _retriable(code, status):
+    return code in RETRIABLE_CODES or 500 <= int(status or 0) < 600
+
+
+def _backoff(attempt):
+    return min(MAX_BACKOFF, 0.5 * (2 ** (attempt - 1)))
+
+
+def iter_objects(client, bucket_name, prefix=None):
+    """
+    This function streams the current objects of a bucket
+
+    Yields:
+        object entries of ListObjectsV2, with Key and Size
+    """
+    kwargs = {"Bucket": bucket_name, "MaxKeys": MAX_BATCH_SIZE}
+    if prefix:
+        kwargs["Prefix"] = prefix
+    while True:
+        page = client.list_objects_v2(**kwargs)
+        yield from page.get("Contents", [])
+        if not page.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+def iter_versions(client, bucket_name, prefix=None):
+    """
+    This function streams all the versions and delete markers of a bucket
+
+    Yields:
+        (key, version_id)
+    """
+    kwargs = {"Bucket": bucket_name, "MaxKeys": MAX_BATCH_SIZE}
+    if prefix:
+        kwargs["Prefix"] = prefix
+    while True:
+        page = client.list_object_versions(**kwargs)
+        for entry in page.get("Versions", []) + page.get("DeleteMarkers", []):
+            yield entry["Key"], entry.get("VersionId")
+        if not page.get("IsTruncated"):
+            return
+        kwargs["KeyMarker"] = page["NextKeyMarker"]
+        kwargs["VersionIdMarker"] = page.get("NextVersionIdMarker", "")
+
+
+class BulkDeleteEngine(object):
+    """
+    Deletes keys or object versions with parallel DeleteObjects batches
+
+    The functions here are
+    1. delete(): delete (key, version_id) entries of a bucket
+    2. delete_keys(): delete the current objects of a bucket
+    3. purge_versions(): delete every version and delete marker of a bucket
+    4. empty_bucket(): delete everything in a bucket, versioned or not
+    """
+
+    def __init__(
+        self,
+        client,
+        workers=DEFAULT_WORKERS,
+        batch_size=MAX_BATCH_SIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        update_io_info=True,
+    ):
+        """
+        Parameters:
+            client: boto3 s3 client
+            workers(int): batches deleted at the same time
+            batch_size(int): entries per DeleteObjects request, at most 1000
+            max_retries(int): attempts of a batch on throttling and 5xx errors
+            update_io_info(bool): mark the deleted keys as deleted in io_info
+        """
+        self.client = client
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, min(MAX_BATCH_SIZE, int(batch_size)))
+        self.max_retries = max_retries
+        self.update_io_info = update_io_info
+        self.lock = threading.Lock()
+
+    def delete_batch(self, bucket_name, batch):
+        """
+        This function deletes a batch with DeleteObjects, retrying throttled entries
+
+        Parameters:
+            batch(list): (key, version_id) entries, version_id None for the current object
+
+        Returns:
+            (deleted, errors, retries): deleted entries, [(entry, code, message)] and retries made
+        """
+        pending = list(batch)
+        errors = []
+        retries = 0
+        attempt = 0
+        while pending:
+            attempt += 1
+            last = attempt >= self.max_retries
+            objects = [
+                {"Key": key, "VersionId": version_id} if version_id else {"Key": key}
+                for key, version_id in pending
+            ]
+            try:
+                response = self.client.delete_objects(
+                    Bucket=bucket_name, Delete={"Objects": objects, "Quiet": True}
+                )
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code", "")
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+                if _retriable(code, status) and not last:
+                    retries += 1
+                    log.info(
+                        f"DeleteObjects on {bucket_name} failed with {code} {status}, "
+                        f"retry {attempt} in {_backoff(attempt):.1f}s"
+                    )
+                    time.sleep(_backoff(attempt))
+                    continue
+                errors.extend((entry, code, str(e)) for entry in pending)
+                break
+            except EndpointConnectionError as e:
+                if not last:
+                    retries += 1
+                    time.sleep(_backoff(attempt))
+                    continue
+                errors.extend(
+                    (entry, "EndpointConnectionError", str(e)) for entry in pending
+                )
+                break
+            # in quiet mode only the entries that failed are returned
+            failed = {
+                (error["Key"], error.get("VersionId") or None): error
+                for error in response.get("Errors", [])
+            }
+            retry = []
+            for entry in pending:
+                error = failed.get(entry) or failed.get((entry[0], None))
+                if error is None:
+                    continue
+                if _retriable(error.get("Code"), 0) and not last:
+                    retry.append(entry)
+                else:
+                    errors.append((entry, error.get("Code"), error.get("Message")))
+            if retry:
+                retries += 1
+                log.info(
+                    f"{len(retry)} entries of a DeleteObjects batch on {bucket_name} throttled, "
+                    f"retry {attempt} in {_backoff(attempt):.1f}s"
+                )
+                time.sleep(_backoff(attempt))
+            pending = retry
+        failed_entries = {entry for entry, _, _ in errors}
+        return (
+            [entry for entry in batch if entry not in failed_entries],
+            errors,
+            retries,
+        )
+
+    def _batches(self, entries):
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def delete(self, bucket_name, entries):
+        """
+        This function deletes a stream of entries of a bucket in parallel batches
+
+        Parameters:
+            entries: iterable of (key, version_id), e.g from iter_versions()
+
+        Returns:
+            stats(dict): deleted, errors, batches, retries, elapsed, deleted_per_sec
+                         and error_examples
+        """
+        stats = {
+            "deleted": 0,
+            "errors": 0,
+            "batches": 0,
+            "retries": 0,
+            "error_examples": [],
+        }
+        start = time.time()
+        # bounds the batches listed ahead of the deletes
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        key_io_info = KeyIoInfo() if self.update_io_info else None
+
+        def run(batch):
+            try:
+                deleted, errors, retries = self.delete_batch(bucket_name, batch)
+                if key_io_info is not None and deleted:
+                    key_io_info.set_keys_deleted(
+                        bucket_name, sorted({key for key, _ in deleted})
+                    )
+                with self.lock:
+                    stats["deleted"] += len(deleted)
+                    stats["errors"] += len(errors)
+                    stats["batches"] += 1
+                    stats["retries"] += retries
+                    room = 20 - len(stats["error_examples"])
+                    stats["error_examples"].extend(errors[:room])
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            for batch in self._batches(entries):
+                in_flight.acquire()
+                futures.append(executor.submit(run, batch))
+            for future in futures:
+                future.result()
+        stats["elapsed"] = time.time() - start
+        stats["deleted_per_sec"] = (
+            stats["deleted"] / stats["elapsed"] if stats["elapsed"] else 0.0
+        )
+        log.info(
+            f"deleted {stats['deleted']} entries of {bucket_name} in {stats['elapsed']:.1f}s "
+            f"({stats['deleted_per_sec']:.0f}/s), batches: {stats['batches']}, "
+            f"retries: {stats['retries']}, errors: {stats['errors']}"
+        )
+        for entry, code, message in stats["error_examples"]:
+            log.error(f"  failed to delete {entry}: {code} {message}")
+        return stats
+
+    def delete_keys(self, bucket_name, prefix=None, on_object=None):
+        """
+        This function deletes the current objects of a bucket
+
+        Parameters:
+            on_object: called with each listed object entry before it is deleted
+        """
+
+        def keys():
+            for obj in iter_objects(self.client, bucket_name, prefix):
+                if on_object is not None:
+                    on_object(obj)
+                yield obj["Key"], None
+
+        return self.delete(bucket_name, keys())
+
+    def purge_versions(self, bucket_name, prefix=None):
+        """
+        This function deletes every version and delete marker of a bucket
+        """
+        return self.delete(bucket_name, iter_versions(self.client, bucket_name, prefix))
+
+    def empty_bucket(self, bucket_name, prefix=None, raise_on_error=True):
+        """
+        This function deletes all the objects of a bucket, with their versions if versioning was ever enabled
+
+        Returns:
+            stats(dict): see delete()
+        """
+        status = self.client.get_bucket_versioning(Bucket=bucket_name).get("Status")
+        if status:
+            stats = self.purge_versions(bucket_name, prefix)
+        else:
+            stats = self.delete_keys(bucket_name, prefix)
+        if raise_on_error and stats["errors"]:
+            raise TestExecError(
+                f"failed to delete {stats['errors']} entries of {bucket_name}"
+            )
+        return stats
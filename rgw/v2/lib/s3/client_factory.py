@@ -0,0 +1,249 @@
+"""
+client_factory - shared, tuned boto3 clients and resources
+
+Clients and resources are built with one botocore Config whose connection
+pool size, retry mode, max attempts and timeouts come from the client_config
+section of the test config yaml:
+
+    config:
+      client_config:
+        max_pool_connections: 100
+        retry_mode: adaptive        # legacy, standard or adaptive
+        max_attempts: 5
+        connect_timeout: 10
+        read_timeout: 120
+
+and are cached per (service, credentials, endpoint, region, signature
+version). boto3 clients are thread safe and shared by all the threads,
+resources are not, so they are cached per thread.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import logging
+import threading
+
+import boto3
+from botocore.client import Config
+from v2.lib.exceptions import ConfigError
+from v2.lib.s3.tracing import instrument_client
+
+log = logging.getLogger()
+
+# the botocore default of 10 caps the concurrency of a shared client
+DEFAULT_CLIENT_CONFIG = {
+    "max_pool_connections": 50,
+    "retry_mode": None,
+    "max_attempts": None,
+    "connect_timeout": None,
+    "read_timeout": None,
+}
+RETRY_MODES = ("legacy", "standard", "adaptive")
+
+_client_config = dict(DEFAULT_CLIENT_CONFIG)
+_lock = threading.Lock()
+_clients = {}
+_local = threading.local()
+# bumped when the cache is cleared, drops the resources of every thread
+_generation = 0
+
+
+def configure(options=None):
+    """
+    This function sets the client options, from the client_config section of the test config
+
+    The cached clients and resources are dropped, the ones handed out keep their options.
+
+    Parameters:
+        options(dict): max_pool_connections, retry_mode, max_attempts,
+                       connect_timeout and read_timeout
+    """
+    global _client_config, _generation
+    options = options or {}
+    unknown = set(options) - set(DEFAULT_CLIENT_CONFIG)
+    if unknown:
+        raise ConfigError(f"unknown client_config options: {sorted(unknown)}")
+    if options.get("retry_mode") not in (None,) + RETRY_MODES:
+        raise ConfigError(
+            f"client_config retry_mode must be one of {RETRY_MODES}, got {options['retry_mode']}"
+        )
+    new_config = dict(DEFAULT_CLIENT_CONFIG)
+    new_config.update(
+        {name: value for name, value in options.items() if value is not None}
+    )
+    with _lock:
+        _client_config = new_config
+        _clients.clear()
+        _generation += 1
+    log.info(f"s3 client config: {new_config}")
+
+
+def clear_cache():
+    """
+    This function drops the cached clients and resources
+    """
+    global _generation
+    with _lock:
+        _clients.clear()
+        _generation += 1
+
+
+def client_config(signature_version=None, addressing_style="path", **overrides):
+    """
+    This function builds the botocore Config of the clients
+
+    Parameters:
+        signature_version(char): e.g s3 or s3v4, None for the service default
+        addressing_style(char): path or virtual, None to leave it unset
+        **overrides: options replacing the configured ones, e.g max_pool_connections
+
+    Returns:
+        botocore.client.Config
+    """
+    options = dict(_client_config)
+    options.update(overrides)
+    kwargs = {
+        "signature_version": signature_version,
+        "max_pool_connections": options["max_pool_connections"],
+    }
+    if addressing_style:
+        kwargs["s3"] = {"addressing_style": addressing_style}
+    retries = {}
+    if options["retry_mode"]:
+        retries["mode"] = options["retry_mode"]
+    if options["max_attempts"]:
+        retries["max_attempts"] = options["max_attempts"]
+    if retries:
+        kwargs["retries"] = retries
+    for name in ("connect_timeout", "read_timeout"):
+        if options[name] is not None:
+            kwargs[name] = options[name]
+    return Config(**kwargs)
+
+
+def _session():
+    # boto3 sessions are not thread safe, one per thread
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = boto3.session.Session()
+    return session
+
+
+def _key(kind, service, access_key, secret_key, session_token, **kwargs):
+    return (kind, service, access_key, secret_key, session_token) + tuple(
+        sorted((name, repr(value)) for name, value in kwargs.items())
+    )
+
+
+def get_client(
+    service,
+    access_key,
+    secret_key,
+    endpoint_url,
+    region_name="default",
+    signature_version=None,
+    session_token=None,
+    addressing_style="path",
+    **options,
+):
+    """
+    This function returns a shared client of a service for the given credentials
+
+    Parameters:
+        service(char): s3, iam, sts, sns
+        region_name(char): zonegroup name in multisite, None for the boto3 default
+        options: use_ssl and client options overriding the configured ones
+
+    Returns:
+        boto3 client, instrumented for tracing
+    """
+    use_ssl = options.pop("use_ssl", None)
+    key = _key(
+        "client",
+        service,
+        access_key,
+        secret_key,
+        session_token,
+        endpoint_url=endpoint_url,
+        region_name=region_name,
+        signature_version=signature_version,
+        addressing_style=addressing_style,
+        use_ssl=use_ssl,
+        **options,
+    )
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            kwargs = {"use_ssl": use_ssl} if use_ssl is not None else {}
+            client = _session().client(
+                service,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                aws_session_token=session_token or None,
+                endpoint_url=endpoint_url,
+                region_name=region_name,
+                verify=False,
+                config=client_config(signature_version, addressing_style, **options),
+                **kwargs,
+            )
+            _clients[key] = instrument_client(client)
+    return client
+
+
+def get_resource(
+    service,
+    access_key,
+    secret_key,
+    endpoint_url,
+    region_name="default",
+    signature_version=None,
+    session_token=None,
+    addressing_style="path",
+    **options,
+):
+    """
+    This function returns a resource of a service for the given credentials, cached per thread
+
+    Parameters:
+        see get_client()
+
+    Returns:
+        boto3 resource, its client instrumented for tracing
+    """
+    use_ssl = options.pop("use_ssl", None)
+    key = _key(
+        "resource",
+        service,
+        access_key,
+        secret_key,
+        session_token,
+        endpoint_url=endpoint_url,
+        region_name=region_name,
+        signature_version=signature_version,
+        addressing_style=addressing_style,
+        use_ssl=use_ssl,
+        **options,
+    )
+    if getattr(_local, "generation", None) != _generation:
+        _local.resources = {}
+        _local.generation = _generation
+    resources = _local.resources
+    resource = resources.get(key)
+    if resource is None:
+        kwargs = {"use_ssl": use_ssl} if use_ssl is not None else {}
+        resource = _session().resource(
+            service,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            aws_session_token=session_token or None,
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            verify=False,
+            config=client_config(signature_version, addressing_style, **options),
+            **kwargs,
+        )
+        instrument_client(resource.meta.client)
+        resources[key] = resource
+    return resource
@@ -0,0 +1,377 @@
+"""
+io_info_store - indexed, append-only backend for the io_info yaml
+
+The default io_info backend re-reads and re-dumps the whole io_info yaml on
+every write, which makes large object count runs quadratic. The journal
+backend keeps the io_info document in memory with indexes on
+(access_key, bucket, key), appends every mutation as a json line to
+'<io_info_fname>.journal' and exports the document to the usual yaml layout
+on demand, so ReadIOInfo and the other yaml readers keep working.
+
+The backend is selected with 'io_info_backend: journal' under 'config' in
+the test yaml, or with IoInfoConfig(io_info_backend="journal").
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import atexit
+import copy
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import yaml
+from v2.utils.io_info_config import IoInfoConfig
+
+log = logging.getLogger()
+
+JOURNAL_BACKEND = "journal"
+# number of journal records buffered before they are flushed to disk
+COMMIT_BATCH_SIZE = 1000
+# maximum seconds a journal record stays buffered before it is flushed
+COMMIT_INTERVAL = 5
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class IoInfoJournalStore(object):
+    """
+    In-memory io_info document with O(1) indexed updates and a json line journal.
+
+    The functions here are
+    1. initialize(): reset the document and the journal
+    2. add_user() / set_user_deleted()
+    3. add_bucket() / set_bucket_deleted() / set_bucket_field() / add_bucket_property()
+    4. add_key() / set_key_deleted() / add_key_property()
+    5. add_version_info() / delete_version_info()
+    6. commit(): flush buffered journal records to disk
+    7. export(): dump the document to the io_info yaml layout
+    """
+
+    def __init__(self, yaml_fname):
+        self.yaml_fname = yaml_fname
+        self.journal_fname = yaml_fname + ".journal"
+        self.lock = threading.RLock()
+        self.pending = 0
+        self.last_commit = time.time()
+        self.batch_depth = 0
+        self.dirty = False
+        self._reset({"users": list()})
+        if os.path.exists(self.journal_fname):
+            self._replay()
+        elif os.path.exists(self.yaml_fname):
+            with open(self.yaml_fname, "r") as fp:
+                data = yaml.safe_load(fp)
+            if data:
+                self._reset(data)
+        self.journal = open(self.journal_fname, "a")
+
+    def _reset(self, data):
+        """
+        replaces the in-memory document and rebuilds the indexes
+        """
+        self.data = data
+        self.users = {}
+        self.buckets = {}
+        self.bucket_owners = {}
+        self.keys = {}
+        for user in self.data.setdefault("users", list()):
+            self._index_user(user)
+            for bucket in user.setdefault("bucket", list()):
+                self._index_bucket(user["access_key"], bucket)
+                for key in bucket.get("keys", list()):
+                    self._index_key(user["access_key"], bucket["name"], key)
+
+    def _index_user(self, user):
+        self.users.setdefault(user["access_key"], user)
+
+    def _index_bucket(self, access_key, bucket):
+        self.buckets.setdefault((access_key, bucket["name"]), bucket)
+        self.bucket_owners.setdefault(bucket["name"], access_key)
+
+    def _index_key(self, access_key, bucket_name, key):
+        self.keys.setdefault((access_key, bucket_name, key["name"]), key)
+
+    def _replay(self):
+        """
+        rebuilds the document from an existing journal
+        """
+        log.info(f"replaying io_info journal: {self.journal_fname}")
+        with open(self.journal_fname, "r") as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a partially written record at the tail of the journal
+                    log.warning(f"skipping corrupt io_info journal record: {line}")
+                    continue
+                getattr(self, "_apply_" + record["op"])(*record["args"])
+
+    def _append(self, op, *args):
+        """
+        applies a mutation to the in-memory document and journals it
+        """
+        with self.lock:
+            getattr(self, "_apply_" + op)(*copy.deepcopy(args))
+            self.journal.write(json.dumps({"op": op, "args": args}) + "\n")
+            self.pending += 1
+            self.dirty = True
+            if self.batch_depth == 0:
+                self.commit(force=False)
+
+    def _get_bucket(self, access_key, bucket_name):
+        bucket = self.buckets.get((access_key, bucket_name))
+        if bucket is None:
+            raise RuntimeError(
+                f"bucket '{bucket_name}' of access_key '{access_key}' not found in io_info"
+            )
+        return bucket
+
+    def _get_key(self, access_key, bucket_name, key_name):
+        key = self.keys.get((access_key, bucket_name, key_name))
+        if key is None:
+            raise RuntimeError(
+                f"key '{key_name}' in bucket '{bucket_name}' not found in io_info"
+            )
+        return key
+
+    def _apply_initialize(self, data):
+        self._reset(data)
+
+    def _apply_add_user(self, user):
+        self.data["users"].append(user)
+        user.setdefault("bucket", list())
+        self._index_user(user)
+
+    def _apply_set_user_deleted(self, access_key):
+        self.users[access_key]["deleted"] = True
+
+    def _apply_add_bucket(self, access_key, bucket_info):
+        user = self.users.get(access_key)
+        if user is None:
+            raise RuntimeError(
+                f"User with access_key '{access_key}' not found in yaml_data['users']"
+            )
+        user["bucket"].append(bucket_info)
+        self._index_bucket(access_key, bucket_info)
+
+    def _apply_set_bucket_deleted(self, bucket_name):
+        access_key = self.bucket_owners[bucket_name]
+        self.buckets[(access_key, bucket_name)]["deleted"] = True
+
+    def _apply_set_bucket_field(self, access_key, bucket_name, field, value):
+        self._get_bucket(access_key, bucket_name)[field] = value
+
+    def _apply_add_bucket_property(self, access_key, bucket_name, properties):
+        self._get_bucket(access_key, bucket_name)["properties"].append(properties)
+
+    def _apply_add_key(self, access_key, bucket_name, key_info):
+        self._get_bucket(access_key, bucket_name)["keys"].append(key_info)
+        self._index_key(access_key, bucket_name, key_info)
+
+    def _apply_set_key_deleted(self, bucket_name, key_name):
+        access_key = self.bucket_owners[bucket_name]
+        key = self.keys.get((access_key, bucket_name, key_name))
+        if key is None:
+            # keys may be recorded with their local path, match on the suffix
+            for each_key in self.buckets[(access_key, bucket_name)]["keys"]:
+                if each_key["name"].endswith(key_name):
+                    key = each_key
+                    break
+        key["deleted"] = True
+
+    def _apply_set_keys_deleted(self, bucket_name, key_names):
+        access_key = self.bucket_owners.get(bucket_name)
+        if access_key is None:
+            return
+        bucket_keys = self.buckets[(access_key, bucket_name)]["keys"]
+        for key_name in key_names:
+            key = self.keys.get((access_key, bucket_name, key_name))
+            if key is None:
+                key = next(
+                    (k for k in bucket_keys if k["name"].endswith(key_name)), None
+                )
+            # keys created outside of the io_info tracked ops are skipped
+            if key is not None:
+                key["deleted"] = True
+
+    def _apply_add_key_property(self, access_key, bucket_name, key_name, properties):
+        self._get_key(access_key, bucket_name, key_name)["properties"].append(
+            properties
+        )
+
+    def _apply_add_version_info(self, access_key, bucket_name, key_name, version_info):
+        self._get_key(access_key, bucket_name, key_name)["versioning_info"].append(
+            version_info
+        )
+
+    def _apply_delete_version_info(self, access_key, bucket_name, key_name, version_id):
+        versions = self._get_key(access_key, bucket_name, key_name)["versioning_info"]
+        for i, each_version in enumerate(versions):
+            if each_version["version_id"] == version_id:
+                versions.pop(i)
+                break
+
+    def initialize(self, data):
+        """
+        resets the document and truncates the journal
+        """
+        with self.lock:
+            self.journal.close()
+            self.journal = open(self.journal_fname, "w")
+            self._append("initialize", data)
+            self.commit()
+            self.export()
+
+    def add_user(self, user):
+        self._append("add_user", user)
+
+    def set_user_deleted(self, access_key):
+        self._append("set_user_deleted", access_key)
+
+    def add_bucket(self, access_key, bucket_info):
+        self._append("add_bucket", access_key, bucket_info)
+
+    def set_bucket_deleted(self, bucket_name):
+        self._append("set_bucket_deleted", bucket_name)
+
+    def set_bucket_field(self, access_key, bucket_name, field, value):
+        self._append("set_bucket_field", access_key, bucket_name, field, value)
+
+    def add_bucket_property(self, access_key, bucket_name, properties):
+        self._append("add_bucket_property", access_key, bucket_name, properties)
+
+    def add_key(self, access_key, bucket_name, key_info):
+        self._append("add_key", access_key, bucket_name, key_info)
+
+    def set_key_deleted(self, bucket_name, key_name):
+        self._append("set_key_deleted", bucket_name, key_name)
+
+    def set_keys_deleted(self, bucket_name, key_names):
+        self._append("set_keys_deleted", bucket_name, list(key_names))
+
+    def add_key_property(self, access_key, bucket_name, key_name, properties):
+        self._append("add_key_property", access_key, bucket_name, key_name, properties)
+
+    def add_version_info(self, access_key, bucket_name, key_name, version_info):
+        self._append(
+            "add_version_info", access_key, bucket_name, key_name, version_info
+        )
+
+    def delete_version_info(self, access_key, bucket_name, key_name, version_id):
+        self._append(
+            "delete_version_info", access_key, bucket_name, key_name, version_id
+        )
+
+    @contextmanager
+    def batch(self):
+        """
+        defers journal commits until the outermost batch exits
+        """
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.commit(force=False)
+
+    def commit(self, force=True):
+        """
+        flushes buffered journal records to disk
+
+        Parameters:
+            force(bool): flush even if the batch size or interval is not reached
+        """
+        with self.lock:
+            if not self.pending:
+                return
+            if (
+                force
+                or self.pending >= COMMIT_BATCH_SIZE
+                or time.time() - self.last_commit >= COMMIT_INTERVAL
+            ):
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+                self.pending = 0
+                self.last_commit = time.time()
+
+    def get_data(self):
+        """
+        returns a copy of the io_info document in the yaml layout
+        """
+        with self.lock:
+            return copy.deepcopy(self.data)
+
+    def export(self, fname=None):
+        """
+        dumps the document to the io_info yaml layout
+
+        Parameters:
+            fname(str): destination, defaults to the io_info yaml file
+        """
+        fname = fname or self.yaml_fname
+        with self.lock:
+            self.commit()
+            with open(fname, "w") as fp:
+                yaml.dump(self.data, fp, default_flow_style=False)
+            self.dirty = False
+        log.info(f"io_info exported to {fname}")
+        return fname
+
+    def close(self):
+        with self.lock:
+            if self.dirty:
+                self.export()
+            self.journal.close()
+
+
+def get_io_info_store(yaml_fname=None):
+    """
+    returns the journal store for yaml_fname if the journal backend is configured
+
+    Parameters:
+        yaml_fname(str): io_info yaml file name
+
+    Returns:
+        IoInfoJournalStore or None when the default yaml backend is in use
+    """
+    io_info_config = IoInfoConfig()
+    if io_info_config.io_info_backend != JOURNAL_BACKEND:
+        return None
+    yaml_fname = yaml_fname or io_info_config.io_info_fname
+    with _stores_lock:
+        store = _stores.get(yaml_fname)
+        if store is None:
+            store = IoInfoJournalStore(yaml_fname)
+            _stores[yaml_fname] = store
+    return store
+
+
+def export_io_info(yaml_fname=None):
+    """
+    exports the live journal store of yaml_fname, if any, to its yaml file
+    """
+    yaml_fname = yaml_fname or IoInfoConfig().io_info_fname
+    store = _stores.get(yaml_fname)
+    if store is not None and store.dirty:
+        store.export()
+
+
+@atexit.register
+def _close_stores():
+    for store in list(_stores.values()):
+        try:
+            store.close()
+        except Exception as e:
+            log.error(f"failed to export io_info journal {store.journal_fname}: {e}")
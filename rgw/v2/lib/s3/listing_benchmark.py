@@ -0,0 +1,243 @@
+"""
+listing_benchmark - bucket listing benchmark
+
+Pages through ListObjects v1, ListObjectsV2 and ListObjectVersions of a
+bucket till the end, ordered and unordered (the RGW allow-unordered
+extension), with and without prefix and delimiter, and records the latency
+of every page, the total time and the entries listed per second.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import logging
+import time
+
+import v2.utils.utils as utils
+from v2.lib.exceptions import TestExecError
+from v2.lib.s3.async_load import LatencyHistogram
+
+log = logging.getLogger()
+
+DEFAULT_PAGE_SIZE = 1000
+LIST_APIS = {
+    "v1": "ListObjects",
+    "v2": "ListObjectsV2",
+    "versions": "ListObjectVersions",
+}
+DEFAULT_SCENARIOS = [
+    {"api": "v1"},
+    {"api": "v2"},
+    {"api": "v2", "unordered": True},
+    {"api": "v2", "delimiter": "/"},
+    {"api": "versions"},
+]
+
+
+def scenario_name(scenario):
+    """
+    This function names a scenario, e.g v2-unordered or v1-delimiter-prefix
+    """
+    parts = [scenario["api"]]
+    if scenario.get("unordered"):
+        parts.append("unordered")
+    if scenario.get("delimiter"):
+        parts.append("delimiter")
+    if scenario.get("prefix"):
+        parts.append("prefix")
+    return "-".join(parts)
+
+
+def _allow_unordered(request, **kwargs):
+    separator = "&" if "?" in request.url else "?"
+    request.url += f"{separator}allow-unordered=true"
+
+
+def list_pages(
+    client,
+    bucket_name,
+    api="v2",
+    unordered=False,
+    prefix=None,
+    delimiter=None,
+    page_size=DEFAULT_PAGE_SIZE,
+):
+    """
+    This function pages through a listing of a bucket till the end
+
+    Parameters:
+        client: boto3 s3 client
+        bucket_name(char): name of the bucket
+        api(char): v1, v2 or versions
+        unordered(bool): add the RGW allow-unordered=true parameter
+        prefix(char): list keys starting with prefix
+        delimiter(char): group keys by delimiter into common prefixes
+
+    Yields:
+        (latency in seconds, entries in the page), entries counting objects,
+        versions, delete markers and common prefixes
+    """
+    if api not in LIST_APIS:
+        raise TestExecError(f"unknown listing api {api}, supported: {list(LIST_APIS)}")
+    operation = LIST_APIS[api]
+    kwargs = {"Bucket": bucket_name, "MaxKeys": page_size}
+    if prefix:
+        kwargs["Prefix"] = prefix
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    event = f"before-sign.s3.{operation}"
+    if unordered:
+        client.meta.events.register(
+            event, _allow_unordered, unique_id="listing-benchmark-unordered"
+        )
+    method = getattr(
+        client,
+        {"v1": "list_objects", "v2": "list_objects_v2"}.get(
+            api, "list_object_versions"
+        ),
+    )
+    try:
+        while True:
+            start = time.perf_counter()
+            page = method(**kwargs)
+            latency = time.perf_counter() - start
+            entries = sum(
+                len(page.get(name, []))
+                for name in ("Contents", "Versions", "DeleteMarkers", "CommonPrefixes")
+            )
+            yield latency, entries
+            if not page.get("IsTruncated"):
+                break
+            if api == "v2":
+                kwargs["ContinuationToken"] = page["NextContinuationToken"]
+            elif api == "versions":
+                kwargs["KeyMarker"] = page["NextKeyMarker"]
+                kwargs["VersionIdMarker"] = page.get("NextVersionIdMarker", "")
+            else:
+                # NextMarker is only returned with a delimiter
+                kwargs["Marker"] = page.get("NextMarker") or page["Contents"][-1]["Key"]
+    finally:
+        if unordered:
+            client.meta.events.unregister(
+                event, unique_id="listing-benchmark-unordered"
+            )
+
+
+def benchmark_listing(client, bucket_name, scenario, page_size=DEFAULT_PAGE_SIZE):
+    """
+    This function lists a bucket fully with one scenario
+
+    Parameters:
+        scenario(dict): api and optional unordered, prefix, delimiter
+
+    Returns:
+        result(dict): scenario, pages, entries, total_secs, entries_per_sec and
+                      page latency min, mean, p50, p90, p99, p99.9, max in ms
+    """
+    histogram = LatencyHistogram()
+    pages = entries = 0
+    start = time.perf_counter()
+    for latency, count in list_pages(
+        client,
+        bucket_name,
+        scenario["api"],
+        scenario.get("unordered", False),
+        scenario.get("prefix"),
+        scenario.get("delimiter"),
+        page_size,
+    ):
+        histogram.record(latency)
+        pages += 1
+        entries += count
+    total = time.perf_counter() - start
+    result = {
+        "scenario": scenario_name(scenario),
+        "pages": pages,
+        "entries": entries,
+        "total_secs": total,
+        "entries_per_sec": entries / total if total else 0.0,
+        "page_latency": histogram.summary(),
+    }
+    log.info(
+        f"{bucket_name} {result['scenario']}: {entries} entries in {pages} pages, "
+        f"{total:.3f}s, {result['entries_per_sec']:.0f} entries/s, "
+        f"page latency: {result['page_latency']}"
+    )
+    return result
+
+
+def run_listing_benchmark(
+    client, bucket_name, scenarios=None, page_size=DEFAULT_PAGE_SIZE, repeat=1
+):
+    """
+    This function runs listing scenarios on a bucket
+
+    Parameters:
+        scenarios(list): scenario dicts, defaults to DEFAULT_SCENARIOS
+        repeat(int): runs of each scenario, the fastest one is kept
+
+    Returns:
+        results(list): benchmark_listing() result of each scenario
+    """
+    results = []
+    for scenario in scenarios or DEFAULT_SCENARIOS:
+        runs = [
+            benchmark_listing(client, bucket_name, scenario, page_size)
+            for _ in range(max(1, repeat))
+        ]
+        results.append(min(runs, key=lambda run: run["total_secs"]))
+    return results
+
+
+def benchmark_across_shard_counts(
+    client,
+    bucket_name,
+    shard_counts,
+    scenarios=None,
+    page_size=DEFAULT_PAGE_SIZE,
+    repeat=1,
+):
+    """
+    This function reshards a bucket to each shard count and runs the listing scenarios
+
+    Parameters:
+        shard_counts(list): shard counts, None to list the bucket as it is
+
+    Returns:
+        results(dict): shard count -> run_listing_benchmark() results
+    """
+    results = {}
+    for num_shards in shard_counts:
+        if num_shards is not None:
+            log.info(f"resharding {bucket_name} to {num_shards} shards")
+            out = utils.exec_shell_cmd(
+                f"radosgw-admin bucket reshard --bucket {bucket_name} --num-shards {num_shards}"
+            )
+            if out is False:
+                raise TestExecError(f"failed to reshard {bucket_name} to {num_shards}")
+        results[num_shards] = run_listing_benchmark(
+            client, bucket_name, scenarios, page_size, repeat
+        )
+    return results
+
+
+def listing_metrics(results):
+    """
+    This function flattens benchmark results to perf baseline metrics
+
+    Returns:
+        (metrics, units)
+    """
+    metrics, units = {}, {}
+    for result in results:
+        name = result["scenario"].replace("-", "_")
+        metrics[f"{name}_total_secs"] = result["total_secs"]
+        units[f"{name}_total_secs"] = "s"
+        metrics[f"{name}_entries_per_sec"] = result["entries_per_sec"]
+        units[f"{name}_entries_per_sec"] = "entries/s"
+        for stat in ("p50_ms", "p99_ms"):
+            if stat in result["page_latency"]:
+                metrics[f"{name}_page_{stat}"] = result["page_latency"][stat]
+                units[f"{name}_page_{stat}"] = "ms"
+    return metrics, units
@@ -0,0 +1,276 @@
+"""
+multipart - parallel multipart upload engine
+
+Parts are uploaded from byte-range views of the source, a local file
+(manage_data.FileRangeView) or a generated payload (manage_data.VirtualPayload),
+so no part files are written. Per-part md5/ETag and the expected composite
+multipart ETag are computed locally and verified against the ETags returned,
+except for encrypted uploads whose ETags are not md5s, and part upload
+latencies are reported.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import binascii
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import v2.lib.manage_data as manage_data
+import v2.lib.resource_op as s3lib
+from v2.lib.exceptions import TestExecError
+from v2.utils.utils import HttpResponseParser
+
+log = logging.getLogger()
+
+DEFAULT_PART_SIZE = 5 * 1024 * 1024
+# bytes at both ends of a virtual part compared against the whole payload
+VIEW_CHECK_SIZE = 4096
+# response fields set for server side encrypted uploads
+SSE_RESPONSE_FIELDS = ("ServerSideEncryption", "SSECustomerAlgorithm", "SSEKMSKeyId")
+
+
+def expected_multipart_etag(part_md5s):
+    """
+    This function computes the ETag S3 returns for a completed multipart upload
+
+    Parameters:
+        part_md5s(list): hex md5 of each part, in part number order
+
+    Returns:
+        etag(char): md5 of the concatenated binary part md5s, suffixed with the part count
+    """
+    digest = hashlib.md5(b"".join(binascii.unhexlify(md5) for md5 in part_md5s))
+    return f'"{digest.hexdigest()}-{len(part_md5s)}"'
+
+
+def latency_summary(latencies):
+    """
+    This function summarizes a list of latencies in seconds
+
+    Returns:
+        summary(dict): count, min, avg, p50, p95, p99 and max
+    """
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return {
+        "count": len(ordered),
+        "min": ordered[0],
+        "avg": sum(ordered) / len(ordered),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": ordered[-1],
+    }
+
+
+class MultipartUploadEngine(object):
+    """
+    Uploads the parts of a multipart upload concurrently
+
+    The functions here are
+    1. plan_parts(): split a size into (part_number, offset, length)
+    2. part_view(): byte-range view of the source for a part
+    3. upload_parts(): upload parts concurrently
+    4. complete(): complete, or race complete against abort
+    """
+
+    def __init__(
+        self, client, part_size=DEFAULT_PART_SIZE, concurrency=1, verify_etag=True
+    ):
+        """
+        Parameters:
+            client: boto3 s3 client, shared by all the workers
+            part_size(int): part size in bytes
+            concurrency(int): number of parts uploaded at the same time
+            verify_etag(bool): verify the part and multipart ETags against the local md5s,
+                               disable for encrypted uploads not reported in the responses
+        """
+        self.client = client
+        self.part_size = int(part_size)
+        self.concurrency = max(1, int(concurrency))
+        self.verify_etag = verify_etag
+
+    @staticmethod
+    def is_encrypted(response):
+        """
+        This function returns True if the response is of a server side encrypted upload
+        """
+        return any(response.get(field) for field in SSE_RESPONSE_FIELDS)
+
+    def plan_parts(self, size):
+        """
+        This function returns the parts of an object of the given size
+
+        Returns:
+            list of (part_number, offset, length)
+        """
+        size = int(size)
+        offsets = range(0, size, self.part_size) if size else [0]
+        return [
+            (part_number, offset, min(self.part_size, size - offset))
+            for part_number, offset in enumerate(offsets, start=1)
+        ]
+
+    def part_view(self, source, offset, length):
+        """
+        This function returns a seekable view of a part of the source
+
+        A view of a virtual payload is checked against the payload at both of its
+        ends, the part boundaries are where the block generation could diverge.
+
+        Parameters:
+            source: path of a local file or a manage_data.VirtualPayload
+        """
+        if isinstance(source, manage_data.VirtualPayload):
+            view = source.view(offset, length)
+            edge = min(VIEW_CHECK_SIZE, view.size)
+            for start in (0, view.size - edge):
+                if view.read_range(start, edge) != source.read_range(
+                    offset + start, edge
+                ):
+                    raise TestExecError(
+                        f"part view at offset {offset + start} does not match the payload"
+                    )
+            return view
+        return manage_data.FileRangeView(source, offset, length)
+
+    def _upload_part(self, bucket_name, key, upload_id, source, part):
+        part_number, offset, length = part
+        body = self.part_view(source, offset, length)
+        try:
+            part_md5 = body.md5()
+            body.seek(0)
+            start = time.time()
+            part_upload_response = s3lib.resource_op(
+                {
+                    "obj": self.client,
+                    "resource": "upload_part",
+                    "kwargs": dict(
+                        Bucket=bucket_name,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=body,
+                    ),
+                }
+            )
+            latency = time.time() - start
+        finally:
+            body.close()
+        if part_upload_response is False:
+            raise TestExecError(f"part {part_number} uploading failed")
+        response = HttpResponseParser(part_upload_response)
+        if response.status_code != 200:
+            raise TestExecError(f"part {part_number} uploading failed")
+        etag = part_upload_response["ETag"]
+        encrypted = self.is_encrypted(part_upload_response)
+        if self.verify_etag and not encrypted and etag.strip('"') != part_md5:
+            raise TestExecError(
+                f"part {part_number} ETag {etag} does not match local md5 {part_md5}"
+            )
+        log.info(f"part {part_number} uploaded in {latency:.3f}s")
+        return {
+            "PartNumber": part_number,
+            "ETag": etag,
+            "Size": length,
+            "md5": part_md5,
+            "encrypted": encrypted,
+            "latency": latency,
+        }
+
+    def upload_parts(self, bucket_name, key, upload_id, source, parts):
+        """
+        This function uploads parts concurrently
+
+        Parameters:
+            bucket_name(char): name of the bucket
+            key(char): name of the object
+            upload_id(char): upload id of the multipart upload
+            source: path of a local file or a manage_data.VirtualPayload
+            parts(list): parts from plan_parts()
+
+        Returns:
+            uploaded parts info, in part number order
+        """
+        log.info(
+            f"uploading {len(parts)} parts of {key} with concurrency {self.concurrency}"
+        )
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            uploaded = list(
+                executor.map(
+                    lambda part: self._upload_part(
+                        bucket_name, key, upload_id, source, part
+                    ),
+                    parts,
+                )
+            )
+        summary = latency_summary([part["latency"] for part in uploaded])
+        log.info(f"part upload latency summary for {key}: {summary}")
+        return uploaded
+
+    def complete(
+        self, bucket_name, key, upload_id, uploaded, complete_abort_race=False
+    ):
+        """
+        This function completes the multipart upload
+
+        Parameters:
+            uploaded(list): parts info from upload_parts()
+            complete_abort_race(bool): trigger complete and abort at the same time
+
+        Returns:
+            response of complete_multipart_upload, None for the race
+        """
+        parts_info = {
+            "Parts": [
+                {"PartNumber": part["PartNumber"], "ETag": part["ETag"]}
+                for part in uploaded
+            ]
+        }
+        if complete_abort_race:
+            log.info("triggering complete and abort multipart upload at the same time")
+            t1 = Thread(
+                target=self.client.complete_multipart_upload,
+                kwargs={
+                    "Bucket": bucket_name,
+                    "Key": key,
+                    "UploadId": upload_id,
+                    "MultipartUpload": parts_info,
+                },
+            )
+            t2 = Thread(
+                target=self.client.abort_multipart_upload,
+                kwargs={"Bucket": bucket_name, "Key": key, "UploadId": upload_id},
+            )
+            t1.start()
+            time.sleep(0.01)
+            t2.start()
+            t1.join()
+            t2.join()
+            return None
+        response = self.client.complete_multipart_upload(
+            Bucket=bucket_name, Key=key, UploadId=upload_id, MultipartUpload=parts_info
+        )
+        if (
+            not self.verify_etag
+            or self.is_encrypted(response)
+            or any(part["encrypted"] for part in uploaded)
+        ):
+            log.info(
+                f"multipart ETag of encrypted {key} not verified: {response['ETag']}"
+            )
+            return response
+        expected_etag = expected_multipart_etag([part["md5"] for part in uploaded])
+        log.info(f"multipart ETag: {response['ETag']}, expected: {expected_etag}")
+        if response["ETag"] != expected_etag:
+            raise TestExecError(
+                f"multipart ETag {response['ETag']} of {key} does not match expected {expected_etag}"
+            )
+        return response
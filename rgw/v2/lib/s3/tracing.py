@@ -0,0 +1,310 @@
+"""
+tracing - per operation S3 spans and latency summary
+
+When enabled (config 'trace: true' or the RGW_TRACE environment variable)
+a span is recorded for
+
+    every resource_op() call: source resource_op, op is the resource name
+    every S3 API call of the clients created by Auth, through botocore
+    event hooks: source api, op is the API name, with the HTTP status,
+    the retries made by botocore and the bytes sent and received
+
+Spans are appended to a JSONL trace file, one object per line:
+
+    {"source": "api", "op": "PutObject", "bucket": "b1", "key": "k1",
+     "bytes_sent": 4096, "bytes_received": 0, "status": 200, "retries": 0,
+     "error": null, "start": 1700000000.123, "duration_ms": 5.2}
+
+and a per operation latency summary (count, p50, p95, p99, max) is logged
+when the test exits.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import atexit
+import functools
+import json
+import logging
+import threading
+import time
+
+# imported first so its atexit flush is registered before ours
+import v2.utils.log
+from botocore.utils import determine_content_length
+from v2.lib.s3.async_load import LatencyHistogram
+
+log = logging.getLogger()
+
+TRACE_ENV = "RGW_TRACE"
+TRACE_DIR = os.path.abspath(os.path.join(__file__, "../../../logs"))
+HOOK_ID = "rgw-tracing"
+_CONTEXT_KEY = "rgw_trace"
+
+
+class Tracer(object):
+    """
+    Records spans to a JSONL file and keeps a latency histogram per operation
+
+    The functions here are
+    1. enable(): start writing spans to a trace file
+    2. record(): record a span
+    3. summary(): per operation count and latency percentiles
+    4. close(): log the summary and close the trace file
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_file = None
+        self.fp = None
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.errors = {}
+        self.retries = {}
+
+    def enable(self, trace_file):
+        """
+        This function starts recording spans
+
+        Parameters:
+            trace_file(char): JSONL file the spans are appended to
+        """
+        with self.lock:
+            if self.enabled:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+            self.trace_file = trace_file
+            self.fp = open(trace_file, "a")
+            self.enabled = True
+        log.info(f"tracing S3 operations to {trace_file}")
+
+    def record(self, source, op, start, duration, **fields):
+        """
+        This function records a span
+
+        Parameters:
+            source(char): resource_op or api
+            op(char): operation name
+            start(float): epoch seconds the operation started at
+            duration(float): seconds the operation took
+            **fields: bucket, key, bytes_sent, bytes_received, status, retries, error
+        """
+        if not self.enabled:
+            return
+        span = {"source": source, "op": op}
+        span.update(fields)
+        span["start"] = round(start, 6)
+        span["duration_ms"] = round(duration * 1000, 3)
+        line = json.dumps(span, default=str)
+        name = (source, op)
+        with self.lock:
+            if self.fp is None:
+                return
+            self.fp.write(line + "\n")
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(duration)
+            if fields.get("error"):
+                self.errors[name] = self.errors.get(name, 0) + 1
+            if fields.get("retries"):
+                self.retries[name] = self.retries.get(name, 0) + fields["retries"]
+
+    def summary(self):
+        """
+        This function summarizes the recorded spans
+
+        Returns:
+            summary(list): per (source, op) count, errors, retries and
+                           p50, p95, p99, max latency in ms, slowest op first
+        """
+        rows = []
+        with self.lock:
+            for (source, op), histogram in self.histograms.items():
+                rows.append(
+                    {
+                        "source": source,
+                        "op": op,
+                        "count": histogram.count,
+                        "errors": self.errors.get((source, op), 0),
+                        "retries": self.retries.get((source, op), 0),
+                        "p50_ms": histogram.percentile(50) / 1000.0,
+                        "p95_ms": histogram.percentile(95) / 1000.0,
+                        "p99_ms": histogram.percentile(99) / 1000.0,
+                        "max_ms": histogram.max / 1000.0,
+                    }
+                )
+        return sorted(rows, key=lambda row: -row["max_ms"])
+
+    def log_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        log.info(f"S3 operation latency, spans in {self.trace_file}:")
+        log.info(
+            f"  {'source':12s} {'op':32s} {'count':>7s} {'errors':>6s} {'retries':>7s} "
+            f"{'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}"
+        )
+        for row in rows:
+            log.info(
+                f"  {row['source']:12s} {row['op']:32s} {row['count']:7d} {row['errors']:6d} "
+                f"{row['retries']:7d} {row['p50_ms']:9.1f} {row['p95_ms']:9.1f} "
+                f"{row['p99_ms']:9.1f} {row['max_ms']:9.1f}"
+            )
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.log_summary()
+        with self.lock:
+            self.enabled = False
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+
+
+tracer = Tracer()
+# log the summary when the test exits, atexit handlers run in reverse order
+# so this runs while the log listener is still up
+atexit.register(tracer.close)
+
+
+def enable_from_config(conf_file, trace=False):
+    """
+    This function enables tracing if the config or the RGW_TRACE environment variable asks for it
+
+    RGW_TRACE may be 1 to trace to logs/<config name>.trace.jsonl or a file name.
+    """
+    env = os.environ.get(TRACE_ENV, "")
+    if not (trace or env):
+        return
+    if env and env not in ("1", "true", "yes"):
+        trace_file = env
+    else:
+        name = os.path.splitext(os.path.basename(conf_file))[0]
+        trace_file = os.path.join(TRACE_DIR, f"{name}.trace.jsonl")
+    tracer.enable(trace_file)
+
+
+def _resource_target(obj):
+    """
+    returns (bucket, key) of a boto3 resource object, from its identifiers
+    only as reading other attributes may load the resource
+    """
+    meta = getattr(obj, "meta", None)
+    names = getattr(meta, "identifiers", None) or []
+    identifiers = {name: getattr(obj, name) for name in names}
+    bucket = identifiers.get("bucket_name")
+    if bucket is None and "name" in identifiers and type(obj).__name__ == "s3.Bucket":
+        bucket = identifiers["name"]
+    return bucket, identifiers.get("key") or identifiers.get("object_key")
+
+
+def trace_resource_op(func):
+    """
+    This function is a decorator recording a span for each resource_op() call
+    """
+
+    @functools.wraps(func)
+    def traced(exec_info):
+        if not tracer.enabled:
+            return func(exec_info)
+        start = time.time()
+        begin = time.perf_counter()
+        result = func(exec_info)
+        duration = time.perf_counter() - begin
+        bucket, key = _resource_target(exec_info.get("obj"))
+        tracer.record(
+            "resource_op",
+            exec_info.get("resource"),
+            start,
+            duration,
+            bucket=bucket,
+            key=key,
+            error="failed" if result is False else None,
+        )
+        return result
+
+    return traced
+
+
+def _before_parameter_build(params, model, context, **kwargs):
+    context[_CONTEXT_KEY] = {
+        "op": model.name,
+        "bucket": params.get("Bucket"),
+        "key": params.get("Key"),
+    }
+
+
+def _before_call(params, context, **kwargs):
+    span = context.setdefault(_CONTEXT_KEY, {})
+    headers = params.get("headers") or {}
+    sent = headers.get("Content-Length")
+    span["bytes_sent"] = (
+        int(sent) if sent else determine_content_length(params.get("body"))
+    )
+    span["start"] = time.time()
+    span["begin"] = time.perf_counter()
+
+
+def _after_call(http_response, parsed, context, **kwargs):
+    span = context.get(_CONTEXT_KEY)
+    if not span or "begin" not in span:
+        return
+    duration = time.perf_counter() - span["begin"]
+    received = http_response.headers.get("Content-Length")
+    tracer.record(
+        "api",
+        span.get("op"),
+        span["start"],
+        duration,
+        bucket=span.get("bucket"),
+        key=span.get("key"),
+        bytes_sent=span.get("bytes_sent"),
+        bytes_received=int(received) if received else 0,
+        status=http_response.status_code,
+        retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+        error=parsed.get("Error", {}).get("Code"),
+    )
+
+
+def _after_call_error(exception, context, **kwargs):
+    # connection errors and the like, raised once botocore gave up retrying
+    span = context.get(_CONTEXT_KEY)
+    if not span or "begin" not in span:
+        return
+    tracer.record(
+        "api",
+        span.get("op"),
+        span["start"],
+        time.perf_counter() - span["begin"],
+        bucket=span.get("bucket"),
+        key=span.get("key"),
+        bytes_sent=span.get("bytes_sent"),
+        bytes_received=0,
+        status=None,
+        retries=None,
+        error=type(exception).__name__,
+    )
+
+
+def instrument_client(client):
+    """
+    This function registers the tracing hooks on a botocore client, if tracing is enabled
+
+    Returns:
+        client
+    """
+    if not tracer.enabled:
+        return client
+    service = client.meta.service_model.service_id.hyphenize()
+    events = client.meta.events
+    for event, handler in (
+        ("before-parameter-build", _before_parameter_build),
+        ("before-call", _before_call),
+        ("after-call", _after_call),
+        ("after-call-error", _after_call_error),
+    ):
+        events.register(f"{event}.{service}", handler, unique_id=f"{HOOK_ID}-{event}")
+    return client
@@ -1,8 +1,12 @@
 import logging
 import os
 import sys
+import threading
+from contextlib import nullcontext
+from functools import wraps
 
 sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+from v2.lib.s3.io_info_store import get_io_info_store
 from v2.utils.io_info_config import IoInfoConfig
 from v2.utils.utils import FileOps
 
@@ -19,6 +23,23 @@ EXEC_INFO_STRUCTURE = {
 }
 
 
+# serializes the read-modify-write cycles of the io_info yaml across threads
+io_info_lock = threading.RLock()
+
+
+def synchronized(function):
+    """
+    Function runs the decorated io_info update under io_info_lock
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with io_info_lock:
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
 class BasicIOInfoStructure(object):
     """
     This class defines the basic IO structure for the yaml.
@@ -93,6 +114,8 @@ class AddIOInfo(object):
             yaml_fname = IoInfoConfig().io_info_fname
         self.yaml_fname = yaml_fname
         self.file_op = FileOps(self.yaml_fname, type="yaml")
+        # None unless the journal backend is configured in IoInfoConfig
+        self.store = get_io_info_store(self.yaml_fname)
 
 
 class IOInfoInitialize(AddIOInfo):
@@ -105,6 +128,7 @@ class IOInfoInitialize(AddIOInfo):
     def __init__(self):
         super(IOInfoInitialize, self).__init__()
 
+    @synchronized
     def initialize(self, data):
         """
         This function is to initialize data
@@ -112,6 +136,9 @@ class IOInfoInitialize(AddIOInfo):
             data
         """
         log.info("initial_data: %s" % (data))
+        if self.store is not None:
+            self.store.initialize(data)
+            return
         self.file_op.add_data(data)
 
 
@@ -125,6 +152,7 @@ class AddUserInfo(AddIOInfo):
     def __init__(self):
         super(AddUserInfo, self).__init__()
 
+    @synchronized
     def add_user_info(self, user):
         """
         This function is to add the user information to the yaml
@@ -132,12 +160,16 @@ class AddUserInfo(AddIOInfo):
             user:
         """
         log.info("got user info structure: %s" % user)
+        if self.store is not None:
+            self.store.add_user(user)
+            return
         yaml_data = self.file_op.get_data()
         log.info("got yaml data %s" % yaml_data)
         yaml_data["users"].append(user)
         log.info("data to add: %s" % yaml_data)
         self.file_op.add_data(yaml_data)
 
+    @synchronized
     def set_user_deleted(self, access_key):
         """
         This function is to add the user information to the yaml
@@ -145,6 +177,9 @@ class AddUserInfo(AddIOInfo):
             access_key:
         """
         log.info("Setting user as deleted")
+        if self.store is not None:
+            self.store.set_user_deleted(access_key)
+            return
         yaml_data = self.file_op.get_data()
         indx = None
         for i, k in enumerate(yaml_data["users"]):
@@ -167,6 +202,7 @@ class BucketIoInfo(AddIOInfo):
     def __init__(self):
         super(BucketIoInfo, self).__init__()
 
+    @synchronized
     def add_bucket_info(self, access_key, bucket_info):
         """
         This function is to add bucket information to the yaml
@@ -174,6 +210,9 @@ class BucketIoInfo(AddIOInfo):
             access_key:
             bucket_info:
         """
+        if self.store is not None:
+            self.store.add_bucket(access_key, bucket_info)
+            return
         yaml_data = self.file_op.get_data()
         log.info(f"Existing users data: {yaml_data.get('users', [])}")
         log.info(f"Searching for access_key: {access_key}")
@@ -193,6 +232,7 @@ class BucketIoInfo(AddIOInfo):
         self.file_op.add_data(yaml_data)
         log.info(f"Bucket info added successfully for access_key: {access_key}")
 
+    @synchronized
     def set_bucket_deleted(self, bucket_name):
         """
         This function is to add bucket information to the yaml
@@ -201,6 +241,9 @@ class BucketIoInfo(AddIOInfo):
             bucket_name:
         """
         log.info(f"marking bucket '{bucket_name}' as deleted")
+        if self.store is not None:
+            self.store.set_bucket_deleted(bucket_name)
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -213,6 +256,7 @@ class BucketIoInfo(AddIOInfo):
         yaml_data["users"][access_key_indx]["bucket"][bucket_indx]["deleted"] = True
         self.file_op.add_data(yaml_data)
 
+    @synchronized
     def add_versioning_status(self, access_key, bucket_name, versioning_status):
         """
         This function is add versioning information to the yaml
@@ -221,6 +265,11 @@ class BucketIoInfo(AddIOInfo):
             bucket_name:
             versioning_status:
         """
+        if self.store is not None:
+            self.store.set_bucket_field(
+                access_key, bucket_name, "curr_versioning_status", versioning_status
+            )
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -237,6 +286,7 @@ class BucketIoInfo(AddIOInfo):
         ] = versioning_status
         self.file_op.add_data(yaml_data)
 
+    @synchronized
     def add_properties(self, access_key, bucket_name, properties):
         """
         This function is to add propertirs to the yaml
@@ -245,6 +295,9 @@ class BucketIoInfo(AddIOInfo):
             bucket_name:
             properties:
         """
+        if self.store is not None:
+            self.store.add_bucket_property(access_key, bucket_name, properties)
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -270,6 +323,7 @@ class KeyIoInfo(AddIOInfo):
     def __init__(self):
         super(KeyIoInfo, self).__init__()
 
+    @synchronized
     def add_keys_info(self, access_key, bucket_name, key_info):
         """
         This function is to add key information to the yaml.
@@ -279,6 +333,9 @@ class KeyIoInfo(AddIOInfo):
             bucket_name: Name of the bucket
             key_info: key information
         """
+        if self.store is not None:
+            self.store.add_key(access_key, bucket_name, key_info)
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -295,6 +352,7 @@ class KeyIoInfo(AddIOInfo):
         )
         self.file_op.add_data(yaml_data)
 
+    @synchronized
     def set_key_deleted(self, bucket_name, key_name):
         """
         This function to add properties to the yaml
@@ -304,6 +362,9 @@ class KeyIoInfo(AddIOInfo):
             key_name: name of the key
         """
         log.info(f"marking key '{key_name}' in bucket '{bucket_name}' as deleted")
+        if self.store is not None:
+            self.store.set_key_deleted(bucket_name, key_name)
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -317,7 +378,7 @@ class KeyIoInfo(AddIOInfo):
         for i, k in enumerate(
             yaml_data["users"][access_key_indx]["bucket"][bucket_indx]["keys"]
         ):
-            if k["name"].ends_with(key_name):
+            if k["name"].endswith(key_name):
                 key_indx = i
                 break
         yaml_data["users"][access_key_indx]["bucket"][bucket_indx]["keys"][key_indx][
@@ -325,6 +386,40 @@ class KeyIoInfo(AddIOInfo):
         ] = True
         self.file_op.add_data(yaml_data)
 
+    @synchronized
+    def set_keys_deleted(self, bucket_name, key_names):
+        """
+        This function marks many keys of a bucket as deleted with a single update
+
+        Parameters:
+            bucket_name: name of the bucket
+            key_names: names of the keys, keys not in the yaml are skipped
+        """
+        key_names = list(key_names)
+        log.info(f"marking {len(key_names)} keys in bucket '{bucket_name}' as deleted")
+        if self.store is not None:
+            self.store.set_keys_deleted(bucket_name, key_names)
+            return
+        yaml_data = self.file_op.get_data()
+        bucket_keys = None
+        for user in yaml_data["users"]:
+            for bucket in user["bucket"]:
+                if bucket["name"] == bucket_name:
+                    bucket_keys = bucket["keys"]
+        if bucket_keys is None:
+            return
+        by_name = {k["name"]: k for k in bucket_keys}
+        for key_name in key_names:
+            key = by_name.get(key_name)
+            if key is None:
+                key = next(
+                    (k for k in bucket_keys if k["name"].endswith(key_name)), None
+                )
+            if key is not None:
+                key["deleted"] = True
+        self.file_op.add_data(yaml_data)
+
+    @synchronized
     def add_properties(self, access_key, bucket_name, key_name, properties):
         """
         This function to add properties to the yaml
@@ -335,6 +430,9 @@ class KeyIoInfo(AddIOInfo):
             key_name: name of the key
             properties: properties
         """
+        if self.store is not None:
+            self.store.add_key_property(access_key, bucket_name, key_name, properties)
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -358,6 +456,7 @@ class KeyIoInfo(AddIOInfo):
         ].append(properties)
         self.file_op.add_data(yaml_data)
 
+    @synchronized
     def add_versioning_info(self, access_key, bucket_name, key_name, versioning_info):
         """
         This function is to add versioning information to the yaml
@@ -368,6 +467,11 @@ class KeyIoInfo(AddIOInfo):
             key_name: name of the key
             versioning_info: versioning information
         """
+        if self.store is not None:
+            self.store.add_version_info(
+                access_key, bucket_name, key_name, versioning_info
+            )
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -391,6 +495,7 @@ class KeyIoInfo(AddIOInfo):
         ].append(versioning_info)
         self.file_op.add_data(yaml_data)
 
+    @synchronized
     def delete_version_info(self, access_key, bucket_name, key_name, version_id):
         """
         This function is remove the versioning information from the yaml
@@ -401,6 +506,11 @@ class KeyIoInfo(AddIOInfo):
             key_name: name of the key
             version_id: version id of the object
         """
+        if self.store is not None:
+            self.store.delete_version_info(
+                access_key, bucket_name, key_name, version_id
+            )
+            return
         yaml_data = self.file_op.get_data()
         access_key_indx = None
         bucket_indx = None
@@ -436,6 +546,95 @@ class KeyIoInfo(AddIOInfo):
         self.file_op.add_data(yaml_data)
 
 
+def _write_resource_io_info(exec_info, write_key_info):
+    """
+    This function adds bucket and object Io information for a resource operation
+
+    Parameters:
+        exec_info
+        write_key_info(KeyIoInfo)
+    """
+    gen_basic_io_info_structure = BasicIOInfoStructure()
+    gen_extra_io_info_structure = ExtraIOInfoStructure()
+    write_bucket_info = BucketIoInfo()
+    obj = exec_info["obj"]
+    resource_name = exec_info["resource"]
+    extra_info = exec_info.get("extra_info", None)
+    log.info("obj_name :%s" % obj)
+    log.info("resource_name: %s" % resource_name)
+    if "s3.Bucket" == type(obj).__name__:
+        log.info("in s3.Bucket logging")
+        resource_names = ["create"]
+        if resource_name in resource_names:
+            access_key = extra_info["access_key"]
+            log.info("adding io info of create bucket")
+            bucket_info = gen_basic_io_info_structure.bucket(**{"name": obj.name})
+            write_bucket_info.add_bucket_info(access_key, bucket_info)
+
+    if "s3.Object" == type(obj).__name__:
+        log.info("in s3.Object logging")
+        resource_names = [
+            "upload_file",
+            "upload_fileobj",
+            "initiate_multipart_upload",
+            "put",
+        ]
+        if resource_name in resource_names:
+            log.info(
+                "writing log for upload_type: %s"
+                % extra_info.get("upload_type", "normal")
+            )
+            access_key = extra_info["access_key"]
+            # setting default versioning status to disabled
+            extra_info["versioning_status"] = extra_info.get(
+                "versioning_status", "disabled"
+            )
+            log.info("versioning_status: %s" % extra_info["versioning_status"])
+            if (
+                extra_info.get("versioning_status") == "disabled"
+                or extra_info.get("versioning_status") == "suspended"
+            ):
+                log.info("adding io info of upload objects")
+                key_upload_info = gen_basic_io_info_structure.key(
+                    **{
+                        "name": extra_info["name"],
+                        "size": extra_info["size"],
+                        "md5_local": extra_info["md5"],
+                        "upload_type": extra_info.get("upload_type", "normal"),
+                    }
+                )
+                if extra_info.get("seed") is not None:
+                    # generated data, the seed is enough to regenerate the object
+                    key_upload_info.update(
+                        {
+                            "seed": extra_info["seed"],
+                            "profile": extra_info.get("profile", "text"),
+                            "compress_ratio": extra_info.get("compress_ratio", 2),
+                        }
+                    )
+                write_key_info.add_keys_info(
+                    access_key, obj.bucket_name, key_upload_info
+                )
+            if (
+                extra_info.get("versioning_status") == "enabled"
+                and extra_info.get("version_count_no") == 0
+            ):
+                log.info(
+                    "adding io info of upload objects, version enabled, so only key name will be added"
+                )
+                key_upload_info = gen_basic_io_info_structure.key(
+                    **{
+                        "name": extra_info["name"],
+                        "size": None,
+                        "md5_local": None,
+                        "upload_type": extra_info.get("upload_type", "normal"),
+                    }
+                )
+                write_key_info.add_keys_info(
+                    access_key, obj.bucket_name, key_upload_info
+                )
+
+
 def logioinfo(func):
     """
     This function is to add IO information
@@ -456,73 +655,12 @@ def logioinfo(func):
         ret_val = func(exec_info)
         if ret_val is False:
             return ret_val
-        gen_basic_io_info_structure = BasicIOInfoStructure()
-        gen_extra_io_info_structure = ExtraIOInfoStructure()
-        write_bucket_info = BucketIoInfo()
         write_key_info = KeyIoInfo()
-        obj = exec_info["obj"]
-        resource_name = exec_info["resource"]
-        extra_info = exec_info.get("extra_info", None)
-        log.info("obj_name :%s" % obj)
-        log.info("resource_name: %s" % resource_name)
-        if "s3.Bucket" == type(obj).__name__:
-            log.info("in s3.Bucket logging")
-            resource_names = ["create"]
-            if resource_name in resource_names:
-                access_key = extra_info["access_key"]
-                log.info("adding io info of create bucket")
-                bucket_info = gen_basic_io_info_structure.bucket(**{"name": obj.name})
-                write_bucket_info.add_bucket_info(access_key, bucket_info)
-
-        if "s3.Object" == type(obj).__name__:
-            log.info("in s3.Object logging")
-            resource_names = ["upload_file", "initiate_multipart_upload", "put"]
-            if resource_name in resource_names:
-                log.info(
-                    "writing log for upload_type: %s"
-                    % extra_info.get("upload_type", "normal")
-                )
-                access_key = extra_info["access_key"]
-                # setting default versioning status to disabled
-                extra_info["versioning_status"] = extra_info.get(
-                    "versioning_status", "disabled"
-                )
-                log.info("versioning_status: %s" % extra_info["versioning_status"])
-                if (
-                    extra_info.get("versioning_status") == "disabled"
-                    or extra_info.get("versioning_status") == "suspended"
-                ):
-                    log.info("adding io info of upload objects")
-                    key_upload_info = gen_basic_io_info_structure.key(
-                        **{
-                            "name": extra_info["name"],
-                            "size": extra_info["size"],
-                            "md5_local": extra_info["md5"],
-                            "upload_type": extra_info.get("upload_type", "normal"),
-                        }
-                    )
-                    write_key_info.add_keys_info(
-                        access_key, obj.bucket_name, key_upload_info
-                    )
-                if (
-                    extra_info.get("versioning_status") == "enabled"
-                    and extra_info.get("version_count_no") == 0
-                ):
-                    log.info(
-                        "adding io info of upload objects, version enabled, so only key name will be added"
-                    )
-                    key_upload_info = gen_basic_io_info_structure.key(
-                        **{
-                            "name": extra_info["name"],
-                            "size": None,
-                            "md5_local": None,
-                            "upload_type": extra_info.get("upload_type", "normal"),
-                        }
-                    )
-                    write_key_info.add_keys_info(
-                        access_key, obj.bucket_name, key_upload_info
-                    )
-        log.debug("writing log for %s" % resource_name)
+        store = write_key_info.store
+        # with the journal backend, records written here are committed in batches
+        with store.batch() if store is not None else nullcontext():
+            _write_resource_io_info(exec_info, write_key_info)
+        log.debug("writing log for %s" % exec_info["resource"])
         return ret_val
 
     return write
@@ -0,0 +1,390 @@
+"""
+zone_consistency - streaming cross-zone object consistency checker
+
+The paginated list_object_versions of a bucket on two zones are streamed
+and merge-joined on (key, version_id), comparing ETag and size, so
+multi-million object buckets are checked in constant memory. The keyspace
+is split into ranges (or caller supplied prefixes) that are checked in
+parallel. Unless given, the range boundaries are derived from the bucket:
+its top level "/" prefixes, or the keys found by probing the source zone
+at the first character position the keys differ at. Object bodies are only
+read, streamed and hashed, when asked for, for all the matched versions or
+for a deterministic sample.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from v2.lib.exceptions import TestExecError
+
+log = logging.getLogger()
+
+LIST_PAGE_SIZE = 1000
+# range boundaries when none can be derived from the bucket, the keyspace
+# is split into the ranges (-inf, "0"], ("0", "A"], ("A", "a"], ("a", +inf)
+DEFAULT_BOUNDARIES = ["0", "A", "a"]
+# characters the keyspace is probed at, in byte order
+PROBE_CHARS = sorted(
+    "!-./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz~"
+)
+MAX_PROBE_DEPTH = 64
+# ranges per worker
+RANGES_PER_WORKER = 4
+# examples kept per kind of difference, all of them go to the report file
+MAX_EXAMPLES = 20
+DATA_CHUNK_SIZE = 1024 * 1024
+VERIFY_DATA_MODES = ["none", "sample", "all"]
+
+
+def key_ranges(boundaries):
+    """
+    This function splits the keyspace at the boundaries
+
+    Returns:
+        list of (after, upto): keys k with after < k <= upto, None meaning unbounded
+    """
+    points = [None] + sorted(set(boundaries)) + [None]
+    return list(zip(points[:-1], points[1:]))
+
+
+def _spread(boundaries, count):
+    """
+    returns count boundaries evenly picked from the sorted boundaries
+    """
+    boundaries = sorted(set(boundaries))
+    if len(boundaries) <= count:
+        return boundaries
+    step = len(boundaries) / float(count)
+    return [boundaries[int(i * step)] for i in range(count)]
+
+
+def _key_after(client, bucket_name, marker):
+    kwargs = {"Bucket": bucket_name, "MaxKeys": 1}
+    if marker:
+        kwargs["KeyMarker"] = marker
+    page = client.list_object_versions(**kwargs)
+    keys = [v["Key"] for v in page.get("Versions", [])] + [
+        m["Key"] for m in page.get("DeleteMarkers", [])
+    ]
+    return min(keys) if keys else None
+
+
+def derive_boundaries(client, bucket_name, ranges, workers=8):
+    """
+    This function derives range boundaries splitting the keys of a bucket into several ranges
+
+    The top level prefixes of a "/" delimited listing are used when there
+    are several, e.g r0/, r1/ of elbencho. Otherwise the first key is
+    taken and the keyspace is probed with one single key listing per
+    PROBE_CHARS character, at the first position the keys differ at.
+
+    Parameters:
+        client: boto3 s3 client
+        bucket_name(char): name of the bucket
+        ranges(int): number of ranges wanted
+        workers(int): probes listed at the same time
+
+    Returns:
+        boundaries(list): None if the bucket has a single key prefix that can not be split
+    """
+    page = client.list_object_versions(
+        Bucket=bucket_name, Delimiter="/", MaxKeys=LIST_PAGE_SIZE
+    )
+    prefixes = [entry["Prefix"] for entry in page.get("CommonPrefixes", [])]
+    if len(prefixes) > 1:
+        # keys of a prefix p are > p, so split just before each prefix but the first
+        return _spread(prefixes[1:], ranges - 1)
+    first = _key_after(client, bucket_name, None)
+    if first is None:
+        return None
+    # the first position the keys differ at: if no key sorts after
+    # first[:depth] followed by the next character, all the keys share first[:depth + 1]
+    depth = 0
+    while depth < min(len(first), MAX_PROBE_DEPTH):
+        next_char = chr(ord(first[depth]) + 1)
+        if _key_after(client, bucket_name, first[:depth] + next_char) is not None:
+            break
+        depth += 1
+    else:
+        return None
+    probes = [first[:depth] + char for char in PROBE_CHARS]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        found = list(
+            executor.map(lambda probe: _key_after(client, bucket_name, probe), probes)
+        )
+    # the last probe before each key found splits the keys <= probe from the ones after
+    boundaries = {}
+    for probe, key in zip(probes, found):
+        if key is not None and key != first:
+            boundaries[key] = probe
+    if not boundaries:
+        return None
+    return _spread(sorted(boundaries.values()), ranges - 1)
+
+
+def iter_versions(client, bucket_name, prefix=None, after=None, upto=None):
+    """
+    This function streams the versions of a bucket in (key, version_id) order
+
+    Versions of a key are grouped and sorted by version id, so the order is
+    the same on every zone whatever the listing order of the versions is.
+
+    Parameters:
+        client: boto3 s3 client of the zone
+        bucket_name(char): name of the bucket
+        prefix(char): only keys starting with prefix
+        after(char): only keys after this key
+        upto(char): only keys up to and including this key
+
+    Yields:
+        (key, version_id, etag, size, is_delete_marker)
+    """
+    kwargs = {"Bucket": bucket_name, "MaxKeys": LIST_PAGE_SIZE}
+    if prefix:
+        kwargs["Prefix"] = prefix
+    if after is not None:
+        kwargs["KeyMarker"] = after
+    current_key, group = None, []
+    while True:
+        page = client.list_object_versions(**kwargs)
+        entries = [
+            (v["Key"], v.get("VersionId") or "null", v["ETag"], v["Size"], False)
+            for v in page.get("Versions", [])
+        ] + [
+            (m["Key"], m.get("VersionId") or "null", None, 0, True)
+            for m in page.get("DeleteMarkers", [])
+        ]
+        # versions and delete markers come in separate lists, restore key order
+        entries.sort(key=lambda entry: entry[0])
+        for entry in entries:
+            if upto is not None and entry[0] > upto:
+                yield from sorted(group, key=lambda e: e[1])
+                return
+            if entry[0] != current_key:
+                yield from sorted(group, key=lambda e: e[1])
+                current_key, group = entry[0], []
+            group.append(entry)
+        if not page.get("IsTruncated"):
+            break
+        kwargs["KeyMarker"] = page["NextKeyMarker"]
+        if page.get("NextVersionIdMarker"):
+            kwargs["VersionIdMarker"] = page["NextVersionIdMarker"]
+        else:
+            kwargs.pop("VersionIdMarker", None)
+    yield from sorted(group, key=lambda e: e[1])
+
+
+def merge_join(source, target):
+    """
+    This function merge-joins two sorted version streams
+
+    Yields:
+        (kind, source_entry, target_entry), kind being 'match', 'mismatch',
+        'missing' (only in source) or 'extra' (only in target)
+    """
+    end = object()
+    src, tgt = next(source, end), next(target, end)
+    while src is not end or tgt is not end:
+        if tgt is end or (src is not end and src[:2] < tgt[:2]):
+            yield "missing", src, None
+            src = next(source, end)
+        elif src is end or tgt[:2] < src[:2]:
+            yield "extra", None, tgt
+            tgt = next(target, end)
+        else:
+            kind = "match" if src[2:] == tgt[2:] else "mismatch"
+            yield kind, src, tgt
+            src, tgt = next(source, end), next(target, end)
+
+
+def object_md5(client, bucket_name, key, version_id):
+    """
+    This function streams an object version and returns its md5
+    """
+    kwargs = {"Bucket": bucket_name, "Key": key}
+    if version_id != "null":
+        kwargs["VersionId"] = version_id
+    body = client.get_object(**kwargs)["Body"]
+    md5 = hashlib.md5()
+    for chunk in body.iter_chunks(DATA_CHUNK_SIZE):
+        md5.update(chunk)
+    return md5.hexdigest()
+
+
+class ZoneConsistencyChecker(object):
+    """
+    Compares the object versions of a bucket on two zones
+
+    The functions here are
+    1. check(): check the whole bucket, returns the report
+    2. check_range(): check one range or prefix of the keyspace
+    """
+
+    def __init__(
+        self,
+        source_client,
+        target_client,
+        workers=8,
+        boundaries=None,
+        prefixes=None,
+        verify_data="none",
+        sample_rate=0.01,
+        report_file=None,
+    ):
+        """
+        Parameters:
+            source_client: boto3 s3 client of the zone taken as reference
+            target_client: boto3 s3 client of the zone being verified
+            workers(int): ranges checked at the same time
+            boundaries(list): keys the keyspace is split at, derived from the bucket by default
+            prefixes(list): disjoint prefixes to check instead of ranges
+            verify_data(char): none, sample or all, versions whose data is compared
+            sample_rate(float): fraction of versions compared with verify_data: sample
+            report_file(char): write every difference as a json line to this file
+        """
+        if verify_data not in VERIFY_DATA_MODES:
+            raise TestExecError(f"verify_data must be one of {VERIFY_DATA_MODES}")
+        self.source_client = source_client
+        self.target_client = target_client
+        self.workers = max(1, int(workers))
+        self.boundaries = boundaries
+        self.prefixes = prefixes
+        self.verify_data = verify_data
+        self.sample_rate = sample_rate
+        self.report_file = report_file
+        self.report_fp = None
+        self.report_lock = threading.Lock()
+
+    def _sampled(self, key, version_id):
+        if self.verify_data == "all":
+            return True
+        if self.verify_data == "sample":
+            # deterministic, so a rerun checks the same versions
+            digest = zlib.crc32(f"{key}\0{version_id}".encode())
+            return digest < self.sample_rate * 0xFFFFFFFF
+        return False
+
+    def check_range(self, bucket_name, prefix=None, after=None, upto=None):
+        """
+        This function checks one range or prefix of the keyspace
+
+        Returns:
+            report(dict): counts and examples of each kind of difference
+        """
+        report = {
+            "match": 0,
+            "missing": 0,
+            "extra": 0,
+            "mismatch": 0,
+            "data_checked": 0,
+            "data_mismatch": 0,
+            "examples": {},
+        }
+        joined = merge_join(
+            iter_versions(self.source_client, bucket_name, prefix, after, upto),
+            iter_versions(self.target_client, bucket_name, prefix, after, upto),
+        )
+        for kind, src, tgt in joined:
+            if kind == "match" and not src[4] and self._sampled(src[0], src[1]):
+                report["data_checked"] += 1
+                source_md5 = object_md5(self.source_client, bucket_name, *src[:2])
+                target_md5 = object_md5(self.target_client, bucket_name, *src[:2])
+                if source_md5 != target_md5:
+                    kind = "data_mismatch"
+            report[kind] += 1
+            if kind == "match":
+                continue
+            record = {
+                "kind": kind,
+                "key": (src or tgt)[0],
+                "version_id": (src or tgt)[1],
+                "source": src and {"etag": src[2], "size": src[3], "dm": src[4]},
+                "target": tgt and {"etag": tgt[2], "size": tgt[3], "dm": tgt[4]},
+            }
+            examples = report["examples"].setdefault(kind, [])
+            if len(examples) < MAX_EXAMPLES:
+                examples.append(record)
+            if self.report_fp:
+                with self.report_lock:
+                    self.report_fp.write(json.dumps(record) + "\n")
+        return report
+
+    def check(self, bucket_name):
+        """
+        This function checks a bucket on the two zones
+
+        Returns:
+            report(dict): entries compared, counts and examples of
+                          missing, extra, mismatch and data_mismatch, elapsed
+        """
+        if self.prefixes:
+            tasks = [(prefix, None, None) for prefix in self.prefixes]
+        else:
+            boundaries = self.boundaries
+            if boundaries is None:
+                boundaries = derive_boundaries(
+                    self.source_client,
+                    bucket_name,
+                    self.workers * RANGES_PER_WORKER,
+                    self.workers,
+                )
+                log.info(f"range boundaries derived from {bucket_name}: {boundaries}")
+            if not boundaries:
+                boundaries = DEFAULT_BOUNDARIES
+            tasks = [(None, after, upto) for after, upto in key_ranges(boundaries)]
+        log.info(
+            f"checking {bucket_name} across zones in {len(tasks)} parts, "
+            f"{self.workers} workers, verify_data: {self.verify_data}"
+        )
+        start = time.time()
+        total = {
+            "match": 0,
+            "missing": 0,
+            "extra": 0,
+            "mismatch": 0,
+            "data_checked": 0,
+            "data_mismatch": 0,
+            "examples": {},
+        }
+        self.report_fp = open(self.report_file, "w") if self.report_file else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for part in executor.map(
+                    lambda task: self.check_range(bucket_name, *task), tasks
+                ):
+                    for kind, examples in part.pop("examples").items():
+                        kept = total["examples"].setdefault(kind, [])
+                        kept.extend(examples[: MAX_EXAMPLES - len(kept)])
+                    for name, count in part.items():
+                        total[name] += count
+        finally:
+            if self.report_fp:
+                self.report_fp.close()
+                self.report_fp = None
+        total["compared"] = (
+            sum(total[kind] for kind in ("match", "missing", "extra", "mismatch"))
+            + total["data_mismatch"]
+        )
+        total["elapsed"] = time.time() - start
+        total["consistent"] = not any(
+            total[kind] for kind in ("missing", "extra", "mismatch", "data_mismatch")
+        )
+        log.info(
+            f"{bucket_name}: compared {total['compared']} versions in {total['elapsed']:.1f}s, "
+            f"missing: {total['missing']}, extra: {total['extra']}, "
+            f"mismatch: {total['mismatch']}, data checked: {total['data_checked']}, "
+            f"data mismatch: {total['data_mismatch']}"
+        )
+        for kind, examples in total["examples"].items():
+            for record in examples:
+                log.info(f"  {kind}: {record}")
+        return total
@@ -1,6 +1,5 @@
 import logging
 import os
-import socket
 import sys
 
 import swiftclient
@@ -24,13 +23,9 @@ class Auth(object):
         Initializes the user_info variables
         """
         self.secret_key = user_info["key"]
-        if ssh_con is not None:
-            stdin, stdout, stderr = ssh_con.exec_command("hostname")
-            self.hostname = stdout.readline().strip()
-            self.port = utils.get_radosgw_port_no(ssh_con)
-        else:
-            self.hostname = socket.gethostname()
-            self.port = utils.get_radosgw_port_no()
+        endpoint = utils.cluster_info.rgw_endpoint(ssh_con)
+        self.hostname = endpoint["hostname"]
+        self.port = endpoint["port"]
         self.is_secure = is_secure
         self.user_id = user_info["user_id"]
 
@@ -4,10 +4,12 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
 import logging
+import re
 import time
 
 import v2.utils.utils as utils
 from v2.lib.exceptions import SyncFailedError
+from v2.utils.ssh_pool import ssh_pool
 
 log = logging.getLogger(__name__)
 
@@ -150,150 +152,356 @@ def restart_rgw_on_node(ssh_con, zone_name):
         raise
 
 
-def sync_status(retry=30, delay=60, ssh_con=None, return_while_sync_inprogress=False):
+class SyncSourceStatus(object):
     """
-    verify multisite sync status
+    Sync state of the metadata sync or of one data sync source in `radosgw-admin sync status`
+    """
+
+    def __init__(self, kind, zone_id=None, zone_name=None):
+        self.kind = kind
+        self.zone_id = zone_id
+        self.zone_name = zone_name
+        self.state = None
+        self.full_sync = None
+        self.incremental_sync = None
+        self.behind_count = 0
+        self.behind_shards = []
+        self.oldest_change = None
+        self.recovering_count = 0
+        self.recovering_shards = []
+        self.caught_up = False
+        self.not_syncing = False
+        self.is_master = False
+
+    @property
+    def lag(self):
+        """
+        number of shards behind or recovering
+        """
+        return max(self.behind_count, len(self.behind_shards)) + max(
+            self.recovering_count, len(self.recovering_shards)
+        )
+
+    @property
+    def in_sync(self):
+        return self.is_master or self.not_syncing or (self.caught_up and not self.lag)
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "zone": self.zone_name,
+            "state": self.state,
+            "full_sync": self.full_sync,
+            "incremental_sync": self.incremental_sync,
+            "behind_shards": self.behind_count,
+            "oldest_change": self.oldest_change,
+            "recovering_shards": self.recovering_count,
+            "in_sync": self.in_sync,
+        }
+
+
+class SyncStatus(object):
+    """
+    Parsed `radosgw-admin sync status`
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.realm = None
+        self.zonegroup = None
+        self.zone = None
+        self.metadata = None
+        self.data_sources = []
+        self.errors = []
+
+    @property
+    def sources(self):
+        return ([self.metadata] if self.metadata else []) + self.data_sources
+
+    @property
+    def lag(self):
+        """
+        total number of shards behind or recovering over all the sources
+        """
+        return sum(source.lag for source in self.sources)
+
+    @property
+    def metadata_lag(self):
+        return self.metadata.lag if self.metadata else 0
+
+    @property
+    def oldest_change(self):
+        changes = [
+            source.oldest_change for source in self.sources if source.oldest_change
+        ]
+        return min(changes) if changes else None
+
+    @property
+    def in_progress(self):
+        return any(not source.in_sync for source in self.sources)
+
+    @property
+    def metadata_in_sync(self):
+        return self.metadata is None or self.metadata.in_sync
+
+    @property
+    def caught_up(self):
+        return not self.errors and not self.in_progress
+
+    def summary(self):
+        return {
+            "zone": self.zone,
+            "lag": self.lag,
+            "oldest_change": self.oldest_change,
+            "errors": len(self.errors),
+            "sources": [source.as_dict() for source in self.sources],
+        }
+
+
+_ZONE_RE = re.compile(r"^(realm|zonegroup|zone)\s+(\S*)\s*\((.*)\)$")
+_SOURCE_RE = re.compile(r"^data sync source:\s*(\S+)\s*\((.*)\)")
+_PROGRESS_RE = re.compile(r"^(full|incremental) sync:\s*(\d+)/(\d+) shards")
+_BEHIND_RE = re.compile(r"is behind on (\d+) shards")
+_RECOVERING_RE = re.compile(r"^(\d+) shards are recovering")
+_SHARD_LIST_RE = re.compile(r"^(behind|recovering) shards:\s*\[(.*)\]")
+_OLDEST_RE = re.compile(r"oldest incremental change not applied:\s*(\S+)")
+
+
+def _shard_list(value):
+    return [int(shard) for shard in re.findall(r"\d+", value)]
+
+
+def parse_sync_status(output):
+    """
+    This function parses the output of `radosgw-admin sync status`
+
+    Parameters:
+        output(char): output of the command
+
+    Returns:
+        SyncStatus
+    """
+    status = SyncStatus(output)
+    current = None
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if "failed" in line or "ERROR" in line:
+            status.errors.append(line)
+        match = _ZONE_RE.match(line)
+        if match:
+            setattr(status, match.group(1), match.group(3))
+            continue
+        if line.startswith("metadata sync"):
+            current = status.metadata = SyncSourceStatus("metadata")
+            current.state = line[len("metadata sync") :].strip()
+            current.is_master = "zone is master" in line
+            continue
+        match = _SOURCE_RE.match(line)
+        if match:
+            current = SyncSourceStatus("data", match.group(1), match.group(2))
+            status.data_sources.append(current)
+            continue
+        if current is None:
+            continue
+        match = _PROGRESS_RE.match(line)
+        if match:
+            setattr(
+                current,
+                match.group(1) + "_sync",
+                (int(match.group(2)), int(match.group(3))),
+            )
+            continue
+        match = _SHARD_LIST_RE.match(line)
+        if match:
+            setattr(current, match.group(1) + "_shards", _shard_list(match.group(2)))
+            continue
+        match = _BEHIND_RE.search(line)
+        if match:
+            current.behind_count = int(match.group(1))
+            continue
+        match = _RECOVERING_RE.match(line)
+        if match:
+            current.recovering_count = int(match.group(1))
+            continue
+        match = _OLDEST_RE.search(line)
+        if match:
+            current.oldest_change = match.group(1)
+            continue
+        if "is caught up with" in line:
+            current.caught_up = True
+        elif "not syncing from zone" in line or "archive" in line:
+            current.not_syncing = True
+        elif current.state is None or current.kind == "data":
+            current.state = line
+    return status
+
+
+def get_sync_status(ssh_con=None):
+    """
+    This function runs `radosgw-admin sync status` locally or on the ssh_con node
+
+    Returns:
+        SyncStatus
     """
-    log.info("check sync status")
     cmd = "sudo radosgw-admin sync status"
     if ssh_con:
-        log.info("Enter ssh-conn")
-        stdin, stdout, stderr = ssh_con.exec_command(cmd)
-        cmd_error = stderr.read().decode()
-        if len(cmd_error) != 0:
-            log.error(f"error: {cmd_error}")
-        check_sync_status = stdout.read().decode()
+        result = ssh_pool.run(None, cmd, ssh=ssh_con)
+        if result["stderr"]:
+            log.error(f"error: {result['stderr']}")
+        out = result["stdout"]
     else:
-        log.info("Enter non-ssh-conn")
-        check_sync_status = utils.exec_shell_cmd(cmd)
-    if not check_sync_status:
+        out = utils.exec_shell_cmd(cmd)
+    if not out:
         raise AssertionError("Sync status output is empty")
-    log.info(f"sync status op is: {check_sync_status}")
+    log.info(f"sync status op is: {out}")
+    return parse_sync_status(out)
 
-    # check for 'failed' or 'ERROR' in sync status.
-    if "failed" in check_sync_status or "ERROR" in check_sync_status:
-        log.info("checking for any sync error")
 
-        # Wait for 70 seconds before rechecking
-        log.info(
-            "Detected 'failed' in sync status. Waiting for 70 seconds before rechecking..."
-        )
-        time.sleep(70)
+class SyncWaiter(object):
+    """
+    Polls sync status with adaptive backoff until a condition is met
 
-        # Recheck sync status after waiting
-        if ssh_con:
-            stdin, stdout, stderr = ssh_con.exec_command(cmd)
-            check_sync_status = stdout.read().decode()
-        else:
-            check_sync_status = utils.exec_shell_cmd(cmd)
+    The poll interval grows by 'backoff' while nothing changes and shrinks
+    towards the estimated time to catch up while the lag is dropping. The
+    wait only fails when no progress is seen for 'stall_timeout' seconds,
+    progress being fewer shards behind/recovering or an advancing oldest
+    incremental change.
+    """
 
-        log.info(f"Rechecked sync status after wait: {check_sync_status}")
+    def __init__(
+        self,
+        ssh_con=None,
+        min_delay=5,
+        max_delay=60,
+        backoff=1.5,
+        stall_timeout=600,
+    ):
+        self.ssh_con = ssh_con
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+        self.backoff = backoff
+        self.stall_timeout = stall_timeout
+
+    def wait(self, done, lag=lambda status: status.lag, status=None):
+        """
+        This function polls until done(status) is True
+
+        Parameters:
+            done: callable taking a SyncStatus, True when the wait is over
+            lag: callable taking a SyncStatus, the amount of work left
+            status: last SyncStatus, if already fetched
+
+        Returns:
+            (status, stalled): last SyncStatus and True if progress stalled
+        """
+        status = status or get_sync_status(self.ssh_con)
+        start = last_progress = time.time()
+        best_lag, best_change = lag(status), status.oldest_change
+        start_lag = best_lag
+        delay = self.min_delay
+        while not done(status):
+            now = time.time()
+            if now - last_progress >= self.stall_timeout:
+                log.error(
+                    f"sync made no progress in {self.stall_timeout}s, lag: {best_lag} shards"
+                )
+                return status, True
+            time.sleep(min(delay, max(1, self.stall_timeout - (now - last_progress))))
+            status = get_sync_status(self.ssh_con)
+            current_lag, change = lag(status), status.oldest_change
+            now = time.time()
+            if current_lag < best_lag or (
+                change and best_change and change > best_change
+            ):
+                last_progress = now
+                best_lag = min(best_lag, current_lag)
+                best_change = change
+                rate = (start_lag - best_lag) / max(now - start, 1e-3)
+                eta = best_lag / rate if rate > 0 else None
+                log.info(
+                    f"sync progressing, lag: {current_lag} shards, "
+                    f"rate: {rate:.2f} shards/s, eta: "
+                    + (f"{eta:.0f}s" if eta is not None else "unknown")
+                )
+                delay = (
+                    min(self.max_delay, max(self.min_delay, eta / 2))
+                    if eta is not None
+                    else self.min_delay
+                )
+            else:
+                delay = min(self.max_delay, delay * self.backoff)
+                log.info(
+                    f"no sync progress for {now - last_progress:.0f}s, lag: {current_lag} shards, "
+                    f"next check in {delay:.0f}s"
+                )
+        log.info(f"sync wait over in {time.time() - start:.0f}s: {status.summary()}")
+        return status, False
 
-        if "failed" in check_sync_status or "ERROR" in check_sync_status:
+
+def sync_status(retry=30, delay=60, ssh_con=None, return_while_sync_inprogress=False):
+    """
+    verify multisite sync status
+
+    The status is polled with adaptive backoff and the wait ends as soon as
+    the zone is caught up. retry * delay is the time sync may go without
+    progress before it is considered stuck, delay is the longest poll interval.
+    """
+    log.info("check sync status")
+    status = get_sync_status(ssh_con)
+
+    # check for 'failed' or 'ERROR' in sync status.
+    if status.errors:
+        log.info("checking for any sync error")
+        log.info(f"Detected errors in sync status: {status.errors}, rechecking")
+        status, _ = SyncWaiter(ssh_con, max_delay=delay, stall_timeout=70).wait(
+            lambda st: not st.errors, lag=lambda st: len(st.errors), status=status
+        )
+        if status.errors:
             cmd = "sudo radosgw-admin sync error list"
             sync_error_list = utils.exec_shell_cmd(cmd)
             raise SyncFailedError("sync status is in failed or errored state!")
-        else:
-            log.info(
-                "Sync status recovered after waiting, proceeding with verification."
-            )
+        log.info("Sync status recovered after waiting, proceeding with verification.")
 
-    log.info(
-        f"check if sync is in progress, if sync is in progress retry {retry} times with {delay} secs of sleep between each retry"
-    )
-    if "behind" in check_sync_status or "recovering" in check_sync_status:
-        log.info("sync is in progress")
+    if status.in_progress:
+        log.info(f"sync is in progress: {status.summary()}")
         if return_while_sync_inprogress:
             return "sync_progress"
-        log.info(f"sleep of {delay} secs for sync to complete")
-        for retry_count in range(retry):
-            time.sleep(delay)
-            if ssh_con:
-                stdin, stdout, stderr = ssh_con.exec_command(cmd)
-                check_sync_status = stdout.read().decode()
-            else:
-                check_sync_status = utils.exec_shell_cmd(cmd)
-            log.info(f"sync status op is: {check_sync_status}")
-            if "behind" in check_sync_status or "recovering" in check_sync_status:
-                log.info(f"sync is still in progress. sleep for {delay}secs and retry")
-            else:
-                log.info("sync completed")
-                break
-
-        if (retry_count > retry) and (
-            "behind" in check_sync_status or "recovering" in check_sync_status
-        ):
-            raise SyncFailedError(
-                f"sync looks slow or stuck. with {retry} retries and sleep of {delay}secs between each retry"
-            )
 
-    # check metadata sync status - wait 5 minutes, then restart, then wait 5 more minutes
-    if "metadata is behind" in check_sync_status:
-        log.warning(
-            "metadata is behind on shards - waiting 5 minutes before attempting RGW restart"
-        )
-
-        # Wait for up to 5 minutes (5 retries × 60 seconds = 300 seconds)
-        metadata_retry = 5
-        metadata_delay = 60
-
-        for metadata_retry_count in range(metadata_retry):
-            log.info(
-                f"Waiting {metadata_delay} seconds for metadata sync to catch up (attempt {metadata_retry_count + 1}/{metadata_retry})"
-            )
-            time.sleep(metadata_delay)
-
-            # Recheck sync status
-            if ssh_con:
-                stdin, stdout, stderr = ssh_con.exec_command(cmd)
-                check_sync_status = stdout.read().decode()
-            else:
-                check_sync_status = utils.exec_shell_cmd(cmd)
-
-            log.info(f"Metadata sync status: {check_sync_status}")
-
-            # Check if metadata caught up
-            if "metadata is behind" not in check_sync_status:
-                log.info("✓ Metadata sync caught up successfully")
-                break
-        else:
-            # After 5 minutes, metadata is still stuck - attempt RGW restart
-            log.warning(
-                "Metadata sync still stuck after 5 minutes - restarting RGW services"
+    # metadata gets 5 minutes without progress, then a RGW restart and 5 more minutes
+    metadata_waiter = SyncWaiter(ssh_con, max_delay=delay, stall_timeout=300)
+    status, stalled = metadata_waiter.wait(
+        lambda st: st.metadata_in_sync, lag=lambda st: st.metadata_lag, status=status
+    )
+    if stalled:
+        log.warning("Metadata sync stuck for 5 minutes - restarting RGW services")
+        try:
+            restart_rgw_services_and_retry(ssh_con)
+            status, stalled = metadata_waiter.wait(
+                lambda st: st.metadata_in_sync, lag=lambda st: st.metadata_lag
             )
-            try:
-                # Attempt to restart RGW services
-                restart_rgw_services_and_retry(ssh_con)
-
-                # Wait for services to restart and stabilize
-                log.info(
-                    "Waiting 5 minutes for RGW services to stabilize and metadata sync to catch up"
-                )
-                time.sleep(300)
-
-                # Recheck sync status after restart
-                if ssh_con:
-                    stdin, stdout, stderr = ssh_con.exec_command(cmd)
-                    check_sync_status = stdout.read().decode()
-                else:
-                    check_sync_status = utils.exec_shell_cmd(cmd)
-
-                log.info(f"Sync status after RGW restart: {check_sync_status}")
-
-                # If still stuck, raise exception
-                if "metadata is behind" in check_sync_status:
-                    raise Exception(
-                        "metadata sync looks slow or stuck even after RGW service restart."
-                    )
-                else:
-                    log.info("✓ Metadata sync recovered after RGW service restart")
-            except Exception as e:
-                log.error(f"Failed to recover from metadata sync stuck: {e}")
+            if stalled:
                 raise Exception(
-                    f"metadata sync looks slow or stuck. Recovery attempt failed: {e}"
+                    "metadata sync looks slow or stuck even after RGW service restart."
                 )
+            log.info("✓ Metadata sync recovered after RGW service restart")
+        except Exception as e:
+            log.error(f"Failed to recover from metadata sync stuck: {e}")
+            raise Exception(
+                f"metadata sync looks slow or stuck. Recovery attempt failed: {e}"
+            )
+
+    status, stalled = SyncWaiter(
+        ssh_con, max_delay=delay, stall_timeout=retry * delay
+    ).wait(lambda st: not st.in_progress, status=status)
+    if stalled:
+        raise SyncFailedError(
+            f"sync looks stuck, no progress in {retry * delay}secs: {status.summary()}"
+        )
 
     # check status for complete sync
+    check_sync_status = status.raw
     if "data is caught up with source" in check_sync_status:
         log.info("sync status complete")
     elif "archive" in check_sync_status or "not syncing from zone" in check_sync_status:
@@ -0,0 +1,619 @@
+"""
+test_scheduler - run test scripts in parallel against one cluster
+
+Each test (a script and its config yaml) is tagged with the shared
+resources it mutates, found in the script with the config applied:
+
+    rgw_restart    RGW service restarts
+    zonegroup      zone, zonegroup and period changes
+    ceph_config    ceph config set / ceph.conf changes
+    gc_lc          GC and LC settings, gc and lc process runs
+
+Calls into the v2 helper modules (reusable, reusables, v2.lib, v2.utils)
+are followed, so a mutation made by a helper the test calls counts as well.
+A mutation site guarded by an if on config values (config.<key> or
+config.test_ops.get(<key>)) that are false for the config does not count,
+any other site does. Tests restarting RGW or changing the period run alone,
+tests sharing any other resource do not run at the same time, and the
+rest, creating only their own users and buckets, run concurrently.
+Pending tests are started longest first, using the durations recorded by
+previous runs. On the releases in SERIAL_RELEASES every test restarts RGW
+through is_cluster_primary(), so the tests run one at a time there.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../")))
+import ast
+import json
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from v2.lib.config_schema import apply_defaults, load_config
+
+log = logging.getLogger()
+
+# root of the v2 package, helper modules are resolved from it
+PACKAGE_ROOT = os.path.abspath(os.path.join(__file__, "../../../"))
+DURATIONS_FILE_ENV = "RGW_TEST_DURATIONS"
+DEFAULT_DURATION = 600
+# resources whose tests run alone, a restart or period commit breaks the
+# requests of every other running test
+EXCLUSIVE_RESOURCES = {"rgw_restart", "zonegroup"}
+
+# calls mutating a resource, matched on the function or method name
+CALL_RESOURCES = {
+    "restart": {"rgw_restart"},
+    "restart_and_wait_until_daemons_up": {"rgw_restart"},
+    "set_to_ceph_conf": {"ceph_config"},
+    "set_dynamic_reshard_ceph_conf": {"ceph_config"},
+    "set_gc_conf": {"ceph_config", "gc_lc"},
+    "configure_rgw_lc_settings": {"ceph_config", "gc_lc"},
+    "prepare_for_bucket_lc_transition": {"ceph_config", "gc_lc"},
+    "set_bi_max_shards": {"zonegroup"},
+    "resharding_disable_in_zone": {"zonegroup"},
+    # reusable helpers, also found by following the calls, listed for
+    # the calls that can not be resolved e.g through another object
+    "delete_objects": {"gc_lc"},
+    "sync_test_0_shards": {"zonegroup"},
+    "resharding_enable_disable_in_zonegroup": {"zonegroup"},
+    "create_storage_class_in_all_zones": {"zonegroup"},
+}
+# commands mutating a resource, matched in the string literals
+COMMAND_RESOURCES = {
+    "systemctl restart": {"rgw_restart"},
+    "ceph orch restart": {"rgw_restart"},
+    "ceph config set": {"ceph_config"},
+    "period update": {"zonegroup"},
+    "zonegroup modify": {"zonegroup"},
+    "zone modify": {"zonegroup"},
+    "zonegroup placement": {"zonegroup"},
+    "zone placement": {"zonegroup"},
+    "gc process": {"gc_lc"},
+    "lc process": {"gc_lc"},
+}
+# helpers not followed: their mutations are recovery paths a healthy run
+# does not take, or the pacific path of is_cluster_primary() that every test
+# takes through create_users(), handled with SERIAL_RELEASES instead
+UNFOLLOWED_FUNCTIONS = {
+    "is_cluster_primary",
+    "sync_status",
+    "restart_rgw_services_and_retry",
+}
+# releases on which is_cluster_primary() sets rgw_sync_lease_period and
+# restarts RGW, called by every test
+SERIAL_RELEASES = {"pacific"}
+# config keys acted on by resource_op.Config.read() when set, a frontend or
+# ssl change restarts RGW
+CONFIG_KEY_RESOURCES = {
+    "frontend": {"rgw_restart"},
+    "ssl": {"rgw_restart"},
+}
+# ceph config options passed to set_to_ceph_conf() that are GC or LC settings
+GC_LC_OPTION_PREFIXES = ("rgw_gc", "rgw_lc", "rgw_lifecycle", "rgw_enable_lc")
+
+_UNKNOWN = object()
+_parsed_scripts = {}
+_modules = {}
+
+
+class _ConfigValues(object):
+    """
+    values of the config attributes and test_ops keys of a test config
+    """
+
+    def __init__(self, doc):
+        config = (doc or {}).get("config") or {}
+        self.attrs = dict(config)
+        self.attrs.update(apply_defaults(config))
+        self.test_ops = self.attrs.get("test_ops") or {}
+
+    def lookup(self, node):
+        """
+        returns the value of a config reference, _UNKNOWN for other expressions
+        """
+        # config.<key> and config.test_ops
+        if (
+            isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Name)
+            and node.value.id == "config"
+        ):
+            if node.attr == "test_ops":
+                return self.test_ops
+            return _UNKNOWN if node.attr == "doc" else self.attrs.get(node.attr)
+        # <reference>[<key>] and <reference>.get(<key>[, default])
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+            return self._item(self.evaluate(node.value), node.slice.value, None)
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "get"
+            and node.args
+            and isinstance(node.args[0], ast.Constant)
+        ):
+            default = None
+            if len(node.args) > 1:
+                if not isinstance(node.args[1], ast.Constant):
+                    return _UNKNOWN
+                default = node.args[1].value
+            return self._item(
+                self.evaluate(node.func.value), node.args[0].value, default
+            )
+        return _UNKNOWN
+
+    @staticmethod
+    def _item(container, key, default):
+        if isinstance(container, dict):
+            return container.get(key, default)
+        # a missing section, the test reads no further
+        return None if container is None else _UNKNOWN
+
+    def evaluate(self, node):
+        """
+        evaluates an if test made of config references and constants, _UNKNOWN otherwise
+        """
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            value = self.evaluate(node.operand)
+            return _UNKNOWN if value is _UNKNOWN else not value
+        if isinstance(node, ast.BoolOp):
+            values = [self.evaluate(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                if any(value is not _UNKNOWN and not value for value in values):
+                    return False
+                return _UNKNOWN if _UNKNOWN in values else values[-1]
+            if any(value is not _UNKNOWN and value for value in values):
+                return True
+            return _UNKNOWN if _UNKNOWN in values else values[-1]
+        if isinstance(node, ast.Compare) and len(node.ops) == 1:
+            left = self.evaluate(node.left)
+            right = self.evaluate(node.comparators[0])
+            if left is _UNKNOWN or right is _UNKNOWN:
+                return _UNKNOWN
+            op = node.ops[0]
+            try:
+                if isinstance(op, (ast.Eq, ast.Is)):
+                    return left == right
+                if isinstance(op, (ast.NotEq, ast.IsNot)):
+                    return left != right
+                if isinstance(op, ast.In):
+                    return left in right
+                if isinstance(op, ast.NotIn):
+                    return left not in right
+            except TypeError:
+                return _UNKNOWN
+            return _UNKNOWN
+        return self.lookup(node)
+
+
+def _call_name(node):
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+
+def _site_resources(node):
+    resources = set()
+    if isinstance(node, ast.Call):
+        resources |= CALL_RESOURCES.get(_call_name(node), set())
+        if _call_name(node) == "set_to_ceph_conf":
+            for arg in node.args:
+                if isinstance(arg, ast.Attribute) and arg.attr.startswith(
+                    GC_LC_OPTION_PREFIXES
+                ):
+                    resources.add("gc_lc")
+    elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+        for command, tags in COMMAND_RESOURCES.items():
+            if command in node.value:
+                resources |= tags
+    return resources
+
+
+def _parse_script(script):
+    key = (os.path.abspath(script), os.stat(script).st_mtime_ns)
+    if key not in _parsed_scripts:
+        with open(script, "r") as f:
+            _parsed_scripts[key] = ast.parse(f.read(), filename=script)
+    return _parsed_scripts[key]
+
+
+def _module_path(module_name):
+    """
+    returns the file of a v2 module, None for other modules
+    """
+    if not module_name or module_name.split(".")[0] != "v2":
+        return None
+    base = os.path.join(PACKAGE_ROOT, *module_name.split("."))
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class _Module(object):
+    """
+    the top level functions of a script or helper module and the v2 names it imports
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tree = _parse_script(path)
+        self.functions = {
+            node.name: node
+            for node in self.tree.body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+        }
+        # alias -> module name, imported name -> (module name, name)
+        self.modules = {}
+        self.names = {}
+        for node in self.tree.body:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname and _module_path(alias.name):
+                        self.modules[alias.asname] = alias.name
+            elif isinstance(node, ast.ImportFrom) and _module_path(node.module):
+                for alias in node.names:
+                    full_name = f"{node.module}.{alias.name}"
+                    if _module_path(full_name):
+                        self.modules[alias.asname or alias.name] = full_name
+                    else:
+                        self.names[alias.asname or alias.name] = (
+                            node.module,
+                            alias.name,
+                        )
+
+    def resolve(self, call):
+        """
+        returns (module, function) of a call to a v2 function, None for other calls
+        """
+        func = call.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            module_name = self.modules.get(func.value.id)
+            if module_name:
+                module = _load_module(_module_path(module_name))
+                function = module.functions.get(func.attr)
+                return (module, function) if function else None
+        elif isinstance(func, ast.Name):
+            if func.id in self.functions:
+                return self, self.functions[func.id]
+            if func.id in self.names:
+                module_name, name = self.names[func.id]
+                module = _load_module(_module_path(module_name))
+                function = module.functions.get(name)
+                return (module, function) if function else None
+        return None
+
+
+def _load_module(path):
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    if key not in _modules:
+        _modules[key] = _Module(path)
+    return _modules[key]
+
+
+class _ResourceFinder(object):
+    """
+    walks a script and the v2 functions it calls, with the values of a config
+    """
+
+    def __init__(self, values):
+        self.values = values
+        # (module path, function name) -> resources
+        self.functions = {}
+
+    def function_resources(self, module, function):
+        key = (module.path, function.name)
+        if key not in self.functions:
+            # recursive calls add nothing
+            self.functions[key] = set()
+            self.functions[key] = self.walk(module, function)
+        return self.functions[key]
+
+    def walk(self, module, root):
+        resources = set()
+
+        def visit(node):
+            resources.update(_site_resources(node))
+            if isinstance(node, ast.Call):
+                target = module.resolve(node)
+                if target is not None and target[1].name not in UNFOLLOWED_FUNCTIONS:
+                    resources.update(self.function_resources(*target))
+            if isinstance(node, ast.If):
+                value = self.values.evaluate(node.test)
+                visit(node.test)
+                if value is _UNKNOWN or value:
+                    for child in node.body:
+                        visit(child)
+                if value is _UNKNOWN or not value:
+                    for child in node.orelse:
+                        visit(child)
+                return
+            for child in ast.iter_child_nodes(node):
+                visit(child)
+
+        visit(root)
+        return resources
+
+
+def find_resources(script, doc):
+    """
+    This function finds the shared resources a test script mutates with a config
+
+    Parameters:
+        script(char): path of the test script
+        doc(dict): parsed config yaml
+
+    Returns:
+        resources(set): rgw_restart, zonegroup, ceph_config and gc_lc
+    """
+    values = _ConfigValues(doc)
+    resources = set()
+    for key, tags in CONFIG_KEY_RESOURCES.items():
+        if values.attrs.get(key) is not None:
+            resources |= tags
+    module = _load_module(script)
+    resources |= _ResourceFinder(values).walk(module, module.tree)
+    return resources
+
+
+class ScheduledTest(object):
+    """
+    A test script with its config, the resources it mutates and its expected duration
+    """
+
+    def __init__(self, script, config, resources=None, duration=None):
+        """
+        Parameters:
+            script(char): path of the test script
+            config(char): path of the config yaml
+            resources(set): mutated resources, found with find_resources() by default
+            duration(float): expected duration in seconds
+        """
+        self.script = script
+        self.config = config
+        self.name = f"{os.path.basename(script)} {os.path.basename(config)}"
+        if resources is None:
+            resources = find_resources(script, load_config(config))
+        self.resources = set(resources)
+        self.duration = duration
+
+    @property
+    def exclusive(self):
+        return bool(self.resources & EXCLUSIVE_RESOURCES)
+
+    def conflicts(self, running):
+        """
+        This function checks if the test can not start while the given tests are running
+        """
+        if not running:
+            return False
+        if self.exclusive or any(test.exclusive for test in running):
+            return True
+        return any(self.resources & test.resources for test in running)
+
+
+def load_test_list(tests_file):
+    """
+    This function reads a test list yaml
+
+    The list holds a tests entry, a list of script, config and optionally
+    resources, overriding the ones found in the script. Paths are relative
+    to the directory of the list.
+
+    Returns:
+        tests(list): ScheduledTest of each entry
+    """
+    base_dir = os.path.dirname(os.path.abspath(tests_file))
+    doc = load_config(tests_file)
+    tests = []
+    for entry in doc.get("tests") or []:
+        tests.append(
+            ScheduledTest(
+                os.path.join(base_dir, entry["script"]),
+                os.path.join(base_dir, entry["config"]),
+                entry.get("resources"),
+            )
+        )
+    return tests
+
+
+def default_durations_file():
+    return os.environ.get(DURATIONS_FILE_ENV) or os.path.join(
+        os.path.expanduser("~"), "rgw_test_durations.json"
+    )
+
+
+def detect_ceph_release():
+    """
+    This function returns the release name of the cluster e.g reef, None if `ceph version` fails
+    """
+    try:
+        proc = subprocess.run(
+            "sudo ceph version",
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            timeout=60,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        log.warning(f"ceph version failed: {e}")
+        return None
+    fields = proc.stdout.split()
+    if proc.returncode != 0 or len(fields) < 5:
+        log.warning("could not find the ceph release")
+        return None
+    return fields[4]
+
+
+class TestScheduler(object):
+    """
+    Runs tests in parallel, longest first, never running conflicting tests together
+
+    The functions here are
+    1. plan(): the tests in the order they are considered
+    2. run(): run all the tests
+    """
+
+    def __init__(
+        self,
+        tests,
+        workers=4,
+        log_dir=None,
+        durations_file=None,
+        extra_args=None,
+        fail_fast=False,
+        timeout=None,
+        ceph_release=None,
+    ):
+        """
+        Parameters:
+            tests(list): ScheduledTest objects
+            workers(int): tests running at the same time
+            log_dir(char): directory of the per test logs and the results
+            durations_file(char): json file of the recorded test durations
+            extra_args(list): arguments added to every test command, e.g --rgw-node
+            fail_fast(bool): start no more tests after a failure
+            timeout(int): seconds after which a test is killed
+            ceph_release(char): release of the cluster, found with `ceph version` if None
+        """
+        self.tests = tests
+        self.workers = max(1, int(workers))
+        if ceph_release is None:
+            ceph_release = detect_ceph_release()
+        self.ceph_release = ceph_release
+        if ceph_release in SERIAL_RELEASES and self.workers > 1:
+            log.warning(
+                f"every test restarts RGW on {ceph_release}, running the tests one at a time"
+            )
+            self.workers = 1
+        self.log_dir = log_dir or os.path.abspath(
+            os.path.join(__file__, "../../logs/run_all")
+        )
+        self.durations_file = durations_file or default_durations_file()
+        self.extra_args = list(extra_args or [])
+        self.fail_fast = fail_fast
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.durations = {}
+        if os.path.exists(self.durations_file):
+            with open(self.durations_file, "r") as f:
+                self.durations = json.load(f)
+        known = sorted(self.durations.values())
+        default = known[len(known) // 2] if known else DEFAULT_DURATION
+        for test in self.tests:
+            if test.duration is None:
+                test.duration = self.durations.get(test.name, default)
+
+    def plan(self):
+        """
+        This function returns the tests longest first
+        """
+        return sorted(self.tests, key=lambda test: -test.duration)
+
+    def _run_test(self, test):
+        log_file = os.path.join(
+            self.log_dir,
+            f"{os.path.splitext(os.path.basename(test.script))[0]}."
+            f"{os.path.splitext(os.path.basename(test.config))[0]}.log",
+        )
+        cmd = [sys.executable, test.script, "-c", test.config] + self.extra_args
+        log.info(f"starting {test.name}, resources: {sorted(test.resources)}")
+        start = time.time()
+        with open(log_file, "w") as f:
+            f.write(f"{' '.join(cmd)}\n")
+            f.flush()
+            proc = subprocess.Popen(
+                cmd,
+                cwd=os.path.dirname(test.script),
+                stdout=f,
+                stderr=subprocess.STDOUT,
+            )
+            try:
+                exit_code = proc.wait(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                exit_code = None
+        elapsed = time.time() - start
+        with self.lock:
+            self.durations[test.name] = round(elapsed, 1)
+        result = {
+            "name": test.name,
+            "script": test.script,
+            "config": test.config,
+            "resources": sorted(test.resources),
+            "exit_code": exit_code,
+            "passed": exit_code == 0,
+            "elapsed": elapsed,
+            "log": log_file,
+        }
+        log.info(
+            f"{'passed' if result['passed'] else 'FAILED'} {test.name} in {elapsed:.0f}s"
+            + ("" if exit_code is not None else f", killed after {self.timeout}s")
+        )
+        return result
+
+    def _save_durations(self):
+        tmp = f"{self.durations_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.durations, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.durations_file)
+
+    def run(self):
+        """
+        This function runs all the tests
+
+        Returns:
+            results(list): per test name, script, config, resources, exit_code,
+                           passed, elapsed and log, in completion order
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        pending = self.plan()
+        running = {}
+        results = []
+        failed = False
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while running or (pending and not (failed and self.fail_fast)):
+                if not (failed and self.fail_fast):
+                    for test in list(pending):
+                        if len(running) >= self.workers:
+                            break
+                        if test.conflicts(running.values()):
+                            continue
+                        pending.remove(test)
+                        running[executor.submit(self._run_test, test)] = test
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    result = future.result()
+                    results.append(result)
+                    failed = failed or not result["passed"]
+                with self.lock:
+                    self._save_durations()
+        elapsed = time.time() - start
+        serial = sum(result["elapsed"] for result in results)
+        log.info(
+            f"ran {len(results)} tests in {elapsed:.0f}s ({serial:.0f}s of test time), "
+            f"failed: {sum(1 for result in results if not result['passed'])}, "
+            f"not run: {len(pending)}"
+        )
+        with open(os.path.join(self.log_dir, "results.json"), "w") as f:
+            json.dump(
+                {
+                    "elapsed": elapsed,
+                    "results": results,
+                    "not_run": [test.name for test in pending],
+                },
+                f,
+                indent=2,
+            )
+        return results
@@ -25,6 +25,7 @@ sys.path.append(os.path.abspath(os.path.join(__file__, "../../../../")))
 import v2.utils.utils as utils
 from v2.lib.exceptions import AWSCommandExecError, TestExecError
 from v2.lib.manage_data import io_generator
+from v2.utils.ssh_pool import ssh_pool
 
 
 def create_bucket(
@@ -607,14 +608,11 @@ def validate_gc():
     """
     log.info("Verify GC Process")
     cmd1 = f"radosgw-admin gc list --include-all"
-    gc_list = utils.exec_shell_cmd(cmd1)
-    gc_list_json = json.loads(gc_list)
-    if len(gc_list_json) == 0:
+    # only emptiness matters, stop reading at the first entry
+    if not any(True for _ in utils.stream_json_array(cmd1)):
         raise AssertionError("GC list not generated for deleted objects")
     utils.exec_shell_cmd("radosgw-admin gc process --include-all")
-    gc_list = utils.exec_shell_cmd(cmd1)
-    gc_list_json = json.loads(gc_list)
-    if len(gc_list_json) != 0:
+    if any(True for _ in utils.stream_json_array(cmd1)):
         raise AssertionError("GC process is not successful!")
 
 
@@ -1225,11 +1223,12 @@ def perform_gc_process_and_list():
     """
     Method to Perform GC process and validate GC list post process
     """
-    utils.exec_shell_cmd("radosgw-admin gc list --include-all")
+    entries = utils.count_json_array("radosgw-admin gc list --include-all")
+    log.info(f"gc list has {entries} entries before gc process")
     utils.exec_shell_cmd("radosgw-admin gc process --include-all")
-    out = utils.exec_shell_cmd("radosgw-admin gc list --include-all")
-    gc_list = json.loads(out)
-    if len(gc_list) != 0:
+    if any(
+        True for _ in utils.stream_json_array("radosgw-admin gc list --include-all")
+    ):
         raise AssertionError("GC process does not emptied the GC list")
 
 
@@ -2021,23 +2020,25 @@ def check_rgw_debug_logs_and_reset(
                 log.info(f"Found {len(rgw_hosts)} RGW host(s): {rgw_hosts}")
                 nodes_checked = 0
                 found_count = 0
-                for host in rgw_hosts:
-                    try:
-                        log.info(f"Checking logs on RGW node: {host}")
-                        node_ssh_con = utils.connect_remote(host)
-                        host_messages = check_logs_on_node(
-                            log_dir,
-                            message_pattern,
-                            node_ssh_con,
-                            host,
-                            since_epoch,
+                # check all the nodes at once over pooled ssh connections
+                host_results = ssh_pool.for_each_host(
+                    rgw_hosts,
+                    lambda host, node_ssh_con: check_logs_on_node(
+                        log_dir,
+                        message_pattern,
+                        node_ssh_con,
+                        host,
+                        since_epoch,
+                    ),
+                )
+                for host, host_messages in host_results.items():
+                    if isinstance(host_messages, Exception):
+                        log.warning(
+                            f"Failed to check logs on RGW node {host}: {host_messages}"
                         )
-                        if host_messages is not None:
-                            nodes_checked += 1
-                            found_count += host_messages
-                        node_ssh_con.close()
-                    except Exception as e:
-                        log.warning(f"Failed to check logs on RGW node {host}: {e}")
+                    elif host_messages is not None:
+                        nodes_checked += 1
+                        found_count += host_messages
                 if nodes_checked == 0:
                     if expected_count is not None:
                         raise TestExecError(
@@ -1,5 +1,6 @@
 import base64
 import glob
+import hashlib
 import json
 import os
 import random
@@ -17,16 +18,20 @@ sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
 import logging
 import math
 import time
-import timeit
 from threading import Thread
 
 import configobj
 import v2.lib.manage_data as manage_data
 import v2.lib.resource_op as s3lib
+import v2.lib.s3.listing_benchmark as listing_benchmark
 import v2.utils.utils as utils
+from v2.lib.bucket_stats_diff import BucketStatsSyncVerifier
 from v2.lib.exceptions import DefaultDatalogBackingError, MFAVersionError, TestExecError
 from v2.lib.rgw_config_opts import CephConfOp, ConfigOpts
+from v2.lib.s3 import client_factory
 from v2.lib.s3.auth import Auth
+from v2.lib.s3.bulk_delete import BulkDeleteEngine
+from v2.lib.s3.multipart import MultipartUploadEngine
 from v2.lib.s3.write_io_info import (
     AddUserInfo,
     BasicIOInfoStructure,
@@ -34,6 +39,7 @@ from v2.lib.s3.write_io_info import (
     IOInfoInitialize,
     KeyIoInfo,
 )
+from v2.lib.s3.zone_consistency import ZoneConsistencyChecker
 from v2.lib.sync_status import sync_status
 from v2.tests.s3_swift.reusables import server_side_encryption_s3 as sse_s3
 from v2.utils.utils import HttpResponseParser, RGWService
@@ -364,6 +370,40 @@ def sync_test_0_shards(config):
     utils.exec_shell_cmd(f"radosgw-admin period get")
 
 
+def generate_object_data(config, s3_object_path, s3_object_size, seed=None):
+    """
+    Generates the data of an object to upload
+
+    With test_ops.virtual_payload set, no file is created under TEST_DATA_PATH,
+    the returned data info carries a seekable generated payload under 'payload'
+    and the seed is recorded in io_info instead. Its md5 is passed on to
+    download_object() as there is no local file to compare a download with.
+    test_ops.data_profile selects the data profile, see manage_data.DATA_PROFILES
+
+    Returns:
+        data_info(dict): name, size, md5, seed and profile of the data
+    """
+    profile = config.test_ops.get("data_profile", "text")
+    compress_ratio = config.test_ops.get("compress_ratio", 2)
+    if config.test_ops.get("virtual_payload", False):
+        log.info(f"generating virtual payload for {s3_object_path}")
+        data_info = manage_data.virtual_io_generator(
+            s3_object_path,
+            s3_object_size,
+            seed=seed,
+            profile=profile,
+            compress_ratio=compress_ratio,
+        )
+        return data_info
+    return manage_data.io_generator(
+        s3_object_path,
+        s3_object_size,
+        seed=seed,
+        profile=profile,
+        compress_ratio=compress_ratio,
+    )
+
+
 def upload_object(
     s3_object_name,
     bucket,
@@ -372,12 +412,25 @@ def upload_object(
     user_info,
     append_data=False,
     append_msg=None,
+    data_info=None,
 ):
+    """
+    Uploads an object, its data is generated unless given
+
+    Parameters:
+        data_info(dict): data of the object generated beforehand, e.g by
+                         manage_data.io_generator_bulk()
+
+    Returns:
+        data_info(dict): name, size and md5 of the uploaded data
+    """
     log.info("s3 object name: %s" % s3_object_name)
     s3_object_path = os.path.join(TEST_DATA_PATH, s3_object_name)
     log.info("s3 object path: %s" % s3_object_path)
     s3_object_size = config.obj_size
-    if append_data is True:
+    if data_info is not None:
+        log.info("using the data generated beforehand")
+    elif append_data is True:
         data_info = manage_data.io_generator(
             s3_object_path,
             s3_object_size,
@@ -385,7 +438,7 @@ def upload_object(
             **{"message": "\n%s" % append_msg},
         )
     else:
-        data_info = manage_data.io_generator(s3_object_path, s3_object_size)
+        data_info = generate_object_data(config, s3_object_path, s3_object_size)
     if data_info is False:
         TestExecError("data creation failed")
     log.info("uploading s3 object: %s" % s3_object_path)
@@ -398,7 +451,12 @@ def upload_object(
         }
     )
 
-    args = [s3_object_path]
+    if data_info.get("payload") is not None:
+        upload_resource = "upload_fileobj"
+        args = [data_info["payload"]]
+    else:
+        upload_resource = "upload_file"
+        args = [s3_object_path]
     if config.test_ops.get("sse_s3_per_object") is True:
         if config.encryption_keys == "s3":
             log.info("SSE S3 AES256 encryption method applied")
@@ -419,7 +477,7 @@ def upload_object(
     object_uploaded_status = s3lib.resource_op(
         {
             "obj": s3_obj,
-            "resource": "upload_file",
+            "resource": upload_resource,
             "args": args,
             "extra_info": upload_info,
         }
@@ -428,6 +486,7 @@ def upload_object(
         raise TestExecError("Resource execution failed: object upload failed")
     if object_uploaded_status is None:
         log.info("object uploaded")
+    return data_info
 
 
 def failed_upload_object(
@@ -483,19 +542,31 @@ def upload_version_object(
     # versioning upload
     log.info("versioning count: %s" % config.version_count)
     s3_object_path = os.path.join(TEST_DATA_PATH, s3_object_name)
-    original_data_info = manage_data.io_generator(s3_object_path, object_size)
+    original_data_info = generate_object_data(config, s3_object_path, object_size)
     if original_data_info is False:
         TestExecError("data creation failed")
+    virtual_payload = original_data_info.get("payload") is not None
+    # data info of the latest version, returned for download_object()
+    latest_data_info = None
     created_versions_count = 0
     for vc in range(config.version_count):
         log.info("version count for %s is %s" % (s3_object_name, str(vc)))
         log.info("modifying data: %s" % s3_object_name)
-        modified_data_info = manage_data.io_generator(
-            s3_object_path,
-            object_size,
-            op="append",
-            **{"message": "\nhello for version: %s\n" % str(vc)},
-        )
+        if virtual_payload:
+            # every version gets its own seed instead of appending to a file
+            modified_data_info = generate_object_data(
+                config,
+                s3_object_path,
+                object_size,
+                seed=original_data_info["seed"] + vc + 1,
+            )
+        else:
+            modified_data_info = manage_data.io_generator(
+                s3_object_path,
+                object_size,
+                op="append",
+                **{"message": "\nhello for version: %s\n" % str(vc)},
+            )
         if modified_data_info is False:
             TestExecError("data modification failed")
         log.info("uploading s3 object: %s" % s3_object_path)
@@ -518,8 +589,12 @@ def upload_version_object(
         object_uploaded_status = s3lib.resource_op(
             {
                 "obj": s3_obj,
-                "resource": "upload_file",
-                "args": [modified_data_info["name"]],
+                "resource": "upload_fileobj" if virtual_payload else "upload_file",
+                "args": [
+                    modified_data_info["payload"]
+                    if virtual_payload
+                    else modified_data_info["name"]
+                ],
                 "extra_info": upload_info,
             }
         )
@@ -527,6 +602,7 @@ def upload_version_object(
             raise TestExecError("Resource execution failed: object upload failed")
         if object_uploaded_status is None:
             log.info("object uploaded")
+            latest_data_info = modified_data_info
             s3_obj = rgw_conn.Object(bucket.name, s3_object_name)
             log.info("current_version_id: %s" % s3_obj.version_id)
             basic_io_structure = BasicIOInfoStructure()
@@ -538,6 +614,10 @@ def upload_version_object(
                     "size": upload_info["size"],
                 }
             )
+            if virtual_payload:
+                key_version_info["seed"] = upload_info["seed"]
+                key_version_info["profile"] = upload_info["profile"]
+                key_version_info["compress_ratio"] = upload_info["compress_ratio"]
             log.info("key_version_info: %s" % key_version_info)
             write_key_io_info = KeyIoInfo()
             write_key_io_info.add_versioning_info(
@@ -566,6 +646,19 @@ def upload_version_object(
                     "version count mismatch, "
                     "possible creation of version on adding metadata"
                 )
+        if virtual_payload:
+            # hash the object as it streams in, nothing is written to disk
+            s3_object_downloaded_md5 = hashlib.md5()
+            body = rgw_conn.Object(bucket.name, s3_object_name).get()["Body"]
+            for chunk in body.iter_chunks(chunk_size=1024 * 1024):
+                s3_object_downloaded_md5.update(chunk)
+            log.info("downloaded_md5: %s" % s3_object_downloaded_md5.hexdigest())
+            log.info("uploaded_md5: %s" % modified_data_info["md5"])
+            if s3_object_downloaded_md5.hexdigest() != modified_data_info["md5"]:
+                raise TestExecError(
+                    f"md5 mismatch for the latest version of {s3_object_name}"
+                )
+            continue
         s3_object_download_path = os.path.join(
             TEST_DATA_PATH, s3_object_name + ".download"
         )
@@ -587,10 +680,38 @@ def upload_version_object(
         log.info("deleting downloaded version file")
         utils.exec_shell_cmd("sudo rm -rf %s" % s3_object_download_path)
     log.info("all versions for the object: %s\n" % s3_object_name)
+    return latest_data_info
 
 
-def download_object(s3_object_name, bucket, TEST_DATA_PATH, s3_object_path, config):
+def download_object(
+    s3_object_name, bucket, TEST_DATA_PATH, s3_object_path, config, uploaded_md5=None
+):
+    """
+    This function downloads an object and compares its md5 with the uploaded data
+
+    Parameters:
+        uploaded_md5(char): md5 of the uploaded data, required for virtual payloads.
+                            the object is hashed as it streams in when given,
+                            else it is compared with the local file at s3_object_path
+    """
     log.info("s3 object name to download: %s" % s3_object_name)
+    s3_object_uploaded_md5 = uploaded_md5
+    if s3_object_uploaded_md5 is None and config.test_ops.get("virtual_payload"):
+        raise TestExecError(
+            f"no uploaded md5 to verify the virtual payload of {s3_object_name}"
+        )
+    if s3_object_uploaded_md5 is not None:
+        # hash the object as it streams in, nothing is written to disk
+        s3_object_downloaded_md5 = hashlib.md5()
+        body = bucket.Object(s3_object_name).get()["Body"]
+        for chunk in body.iter_chunks(chunk_size=1024 * 1024):
+            s3_object_downloaded_md5.update(chunk)
+        log.info("s3_object_downloaded_md5: %s" % s3_object_downloaded_md5.hexdigest())
+        log.info("s3_object_uploaded_md5: %s" % s3_object_uploaded_md5)
+        if s3_object_downloaded_md5.hexdigest() != s3_object_uploaded_md5:
+            raise TestExecError("md5 mismatch")
+        log.info("md5 match")
+        return
     s3_object_download_name = s3_object_name + "." + "download"
     s3_object_download_path = os.path.join(TEST_DATA_PATH, s3_object_download_name)
     object_downloaded_status = s3lib.resource_op(
@@ -688,6 +809,8 @@ def upload_mutipart_object(
     s3_object_size = config.obj_size
     split_size = config.split_size if hasattr(config, "split_size") else 5
     log.info("split size: %s" % split_size)
+    concurrency = config.test_ops.get("multipart_concurrency", 1)
+    log.info("multipart concurrency: %s" % concurrency)
     if append_data is True:
         data_info = manage_data.io_generator(
             s3_object_path,
@@ -696,17 +819,28 @@ def upload_mutipart_object(
             **{"message": "\n%s" % append_msg},
         )
     else:
-        data_info = manage_data.io_generator(s3_object_path, s3_object_size)
+        data_info = generate_object_data(config, s3_object_path, s3_object_size)
     if data_info is False:
         TestExecError("data creation failed")
-    mp_dir = os.path.join(TEST_DATA_PATH, s3_object_name + ".mp.parts")
-    log.info("mp part dir: %s" % mp_dir)
-    log.info("making multipart object part dir")
-    mkdir = utils.exec_shell_cmd("sudo mkdir %s" % mp_dir)
-    if mkdir is False:
-        raise TestExecError("mkdir failed creating mp_dir_name")
-    utils.split_file(s3_object_path, split_size, mp_dir + "/")
-    parts_list = sorted(glob.glob(mp_dir + "/" + "*"))
+    # parts are uploaded from byte-range views of the source, no part files
+    source = data_info.get("payload") or s3_object_path
+    # ETags of encrypted objects are not md5s, the encryption may be a bucket or
+    # cluster default that the responses do not report
+    encrypted = any(
+        config.test_ops.get(option)
+        for option in (
+            "encryption_algorithm",
+            "sse_s3_per_object",
+            "test_ibm_cloud_transition",
+        )
+    )
+    mp_engine = MultipartUploadEngine(
+        bucket.meta.client,
+        int(split_size * 1024 * 1024),
+        concurrency,
+        verify_etag=not encrypted,
+    )
+    parts_list = mp_engine.plan_parts(data_info["size"])
     log.info("parts_list: %s" % parts_list)
     log.info("uploading s3 object: %s" % s3_object_path)
     upload_info = dict(
@@ -730,14 +864,10 @@ def upload_mutipart_object(
         mpu_dict.update({"kwargs": {"Tagging": obj_tag}})
 
     mpu = s3lib.resource_op(mpu_dict)
-    part_number = 1
-    parts_info = {"Parts": []}
-    if config.test_ops.get("test_get_object_attributes"):
-        object_parts_info = {"TotalPartsCount": len(parts_list), "Parts": []}
     log.info("no of parts: %s" % len(parts_list))
     # Handle edge case when there's only 1 part - set abort_part_no to 2 to ensure at least one part uploads before abort
     if len(parts_list) <= 1:
-        abort_part_no = 2  # Will never abort since part_number will be 1
+        abort_part_no = 2  # Will never abort since there is only 1 part
     else:
         abort_part_no = random.randint(1, len(parts_list) - 1)
         """if randomly selected abort-part-no is less than 1 then we will increment it by 1 to make sure atleast one part is uploaded
@@ -745,63 +875,38 @@ def upload_mutipart_object(
         if abort_part_no <= 1:
             abort_part_no = abort_part_no + 1
     log.info(f"abort part no is: {abort_part_no}")
-    for each_part in parts_list:
-        log.info("trying to upload part: %s" % each_part)
-        part = mpu.Part(part_number)
-        # part_upload_response = part.upload(Body=open(each_part))
-        part_upload_response = s3lib.resource_op(
-            {
-                "obj": part,
-                "resource": "upload",
-                "kwargs": dict(Body=open(each_part, mode="rb")),
-            }
+    if abort_multipart and abort_part_no <= len(parts_list):
+        # upload only the parts before abort_part_no and leave the upload incomplete
+        mp_engine.upload_parts(
+            bucket.name, s3_object_name, mpu.id, source, parts_list[: abort_part_no - 1]
         )
-        if part_upload_response is not False:
-            response = HttpResponseParser(part_upload_response)
-            if response.status_code == 200:
-                log.info("part uploaded")
-            else:
-                raise TestExecError("part uploading failed")
-        part_info = {"PartNumber": part_number, "ETag": part_upload_response["ETag"]}
-        parts_info["Parts"].append(part_info)
-        if each_part != parts_list[-1]:
-            # increase the part number only if the current part is not the last part
-            part_number += 1
-        log.info("curr part_number: %s" % part_number)
-
-        if abort_multipart and part_number == abort_part_no:
-            log.info(f"aborting multi part {part_number}")
-            return
-        if config.test_ops.get("test_get_object_attributes"):
-            part_info_get_obj_attr = part_info.copy()
-            part_info_get_obj_attr["Size"] = os.stat(each_part).st_size
-            object_parts_info["Parts"].append(part_info_get_obj_attr)
-
-    if config.local_file_delete is True:
-        log.info("deleting local file part")
-        utils.exec_shell_cmd(f"rm -rf {mp_dir}")
-    # log.info('parts_info so far: %s'% parts_info)
-    if len(parts_list) == part_number:
-        log.info("all parts upload completed")
-        if complete_abort_race:
-            log.info("triggering complete and abort multipart upload at the same time")
-            t1 = Thread(
-                target=mpu.complete,
-                kwargs={"MultipartUpload": parts_info},
-            )
-            t2 = Thread(target=mpu.abort, kwargs={})
-
-            t1.start()
-            time.sleep(0.01)
-            t2.start()
-
-            t1.join()
-            t2.join()
-        else:
-            mpu.complete(MultipartUpload=parts_info)
-        log.info("multipart upload complete for key: %s" % s3_object_name)
+        log.info(f"aborting multi part {abort_part_no}")
+        return
+    uploaded_parts = mp_engine.upload_parts(
+        bucket.name, s3_object_name, mpu.id, source, parts_list
+    )
+    log.info("all parts upload completed")
+    mp_engine.complete(
+        bucket.name,
+        s3_object_name,
+        mpu.id,
+        uploaded_parts,
+        complete_abort_race=complete_abort_race,
+    )
+    log.info("multipart upload complete for key: %s" % s3_object_name)
     if config.test_ops.get("test_get_object_attributes"):
-        return object_parts_info
+        return {
+            "TotalPartsCount": len(parts_list),
+            "Parts": [
+                {
+                    "PartNumber": part["PartNumber"],
+                    "ETag": part["ETag"],
+                    "Size": part["Size"],
+                }
+                for part in uploaded_parts
+            ],
+        }
+    return data_info
 
 
 def upload_multipart_with_break(
@@ -1543,54 +1648,47 @@ def link_chown_nontenant_to_nontenant(new_uid, bucket):
 
 def delete_objects(bucket, gc_verification=True):
     """
-    deletes the objects in a given bucket
+    deletes the objects in a given bucket with parallel DeleteObjects batches
     :param bucket: S3Bucket object
     """
-    log.info("listing all objects in bucket: %s" % bucket.name)
-    objects = s3lib.resource_op({"obj": bucket, "resource": "objects", "args": None})
-    log.info("objects :%s" % objects)
-    all_objects = s3lib.resource_op({"obj": objects, "resource": "all", "args": None})
-    log.info("all objects: %s" % all_objects)
-    for obj in all_objects:
-        log.info("object_name: %s" % obj.key)
-        log.info("object_size: %s" % obj.size)
-        gc_verify_list = []
-        if obj.size < 4194304:
-            gc_verify_list.append("No")
-            if "No" in gc_verify_list:
-                gc_verification = False
-    log.info("deleting all objects in bucket")
-    objects_deleted = s3lib.resource_op(
-        {"obj": objects, "resource": "delete", "args": None}
-    )
-    log.info("objects_deleted: %s" % objects_deleted)
-    if objects_deleted is False:
-        raise TestExecError("Resource execution failed: Object deletion failed")
-    if objects_deleted is not None:
-        response = HttpResponseParser(objects_deleted[0])
-        if response.status_code == 200:
-            log.info("objects deleted ")
-            write_key_info = KeyIoInfo()
-            for obj in all_objects:
-                log.info(f"writing log for delete object {obj.key}")
-                write_key_info.set_key_deleted(obj.bucket_name, obj.key)
-            if gc_verification:
-                log.info("Verify GC Process")
-                cmd1 = f"radosgw-admin gc list --include-all"
-                gc_list = utils.exec_shell_cmd(cmd1)
-                gc_list_json = json.loads(gc_list)
-                if len(gc_list_json) == 0:
-                    raise AssertionError("GC list not generated for deleted objects")
-                utils.exec_shell_cmd("radosgw-admin gc process --include-all")
-                gc_list = utils.exec_shell_cmd(cmd1)
-                gc_list_json = json.loads(gc_list)
-                if len(gc_list_json) != 0:
-                    raise AssertionError("GC process is not successful!")
+    log.info("deleting all objects in bucket: %s" % bucket.name)
+    small_objects = []
 
-        else:
-            raise TestExecError("objects deletion failed")
-    else:
-        raise TestExecError("objects deletion failed")
+    def on_object(obj):
+        # objects smaller than 4M have no tail objects for GC to collect
+        if obj["Size"] < 4194304:
+            small_objects.append(obj["Key"])
+
+    engine = BulkDeleteEngine(bucket.meta.client)
+    stats = engine.delete_keys(bucket.name, on_object=on_object)
+    if stats["errors"]:
+        raise TestExecError(
+            f"objects deletion failed for {stats['errors']} objects, examples: {stats['error_examples']}"
+        )
+    log.info(f"objects deleted: {stats['deleted']}")
+    if small_objects:
+        gc_verification = False
+    if gc_verification and stats["deleted"]:
+        log.info("Verify GC Process")
+        cmd1 = f"radosgw-admin gc list --include-all"
+        # only emptiness matters, stop reading at the first entry
+        if not any(True for _ in utils.stream_json_array(cmd1)):
+            raise AssertionError("GC list not generated for deleted objects")
+        utils.exec_shell_cmd("radosgw-admin gc process --include-all")
+        if any(True for _ in utils.stream_json_array(cmd1)):
+            raise AssertionError("GC process is not successful!")
+
+
+def purge_bucket(bucket, workers=8):
+    """
+    deletes every object, version and delete marker of a bucket with parallel DeleteObjects batches
+    :param bucket: S3Bucket object
+    :param workers: batches deleted at the same time
+    """
+    log.info("purging all objects and versions of bucket: %s" % bucket.name)
+    return BulkDeleteEngine(bucket.meta.client, workers=workers).empty_bucket(
+        bucket.name
+    )
 
 
 def list_objects(bucket):
@@ -1688,6 +1786,14 @@ def delete_versioned_object(
     :param rgw_conn: rgw connection
     :param user_info: user info dict containing access_key, secret_key and user_id
     """
+    if not return_status:
+        log.info("deleting s3_obj keys and its versions")
+        engine = BulkDeleteEngine(rgw_conn.meta.client, update_io_info=False)
+        stats = engine.purge_versions(bucket.name, prefix=s3_object_name)
+        if stats["errors"]:
+            raise TestExecError("version deletion failed")
+        list_versioned_objects(bucket, s3_object_name)
+        return
     versions = bucket.object_versions.filter(Prefix=s3_object_name)
     log.info("deleting s3_obj keys and its versions")
     not_deleted = False
@@ -1733,10 +1839,10 @@ def delete_bucket(bucket):
     """
     for retry_count in range(4):
         log.info("listing objects if any")
-        objs = bucket.objects.all()
-        count = sum(1 for _ in bucket.objects.all())
-        if count > 0:
-            log.info(f"objects not deleted, count is:{count}")
+        # a single page is enough to know if the bucket is empty
+        objs = list(bucket.objects.limit(100))
+        if objs:
+            log.info(f"objects not deleted, at least {len(objs)} left")
             for ob in objs:
                 log.info(f"object: {ob.key}")
         else:
@@ -1909,8 +2015,9 @@ def time_to_list_via_radosgw(bucket_name, listing):
             bucket_name
         )
         listing_start_time = time.time()
-        utils.exec_shell_cmd(cmd)
+        entries = utils.count_json_array(cmd)
         listing_end_time = time.time()
+        log.info(f"listed {entries} entries")
         return listing_end_time - listing_start_time
 
     if listing == "unordered":
@@ -1922,24 +2029,23 @@ def time_to_list_via_radosgw(bucket_name, listing):
             % (bucket_name)
         )
         listing_start_time = time.time()
-        utils.exec_shell_cmd(cmd)
+        entries = utils.count_json_array(cmd)
         listing_end_time = time.time()
+        log.info(f"listed {entries} entries")
         return listing_end_time - listing_start_time
 
 
 def time_to_list_via_boto(bucket_name, rgw):
     """
-    Time taken to list via boto
-    :param bucket: s3Bucket object
+    Time taken to list via boto, paging through all the objects with ListObjects
+    :param bucket_name: name of the bucket
+    :param rgw: s3 resource
     """
-    bucket = s3lib.resource_op(
-        {"obj": rgw, "resource": "Bucket", "args": [bucket_name]}
+    log.info("listing all objects in bucket: %s" % bucket_name)
+    result = listing_benchmark.benchmark_listing(
+        rgw.meta.client, bucket_name, {"api": "v1"}
     )
-
-    log.info("listing all objects in bucket: %s" % bucket)
-    objects = s3lib.resource_op({"obj": bucket, "resource": "objects", "args": None})
-    time_taken = timeit.timeit(lambda: bucket.objects.all(), globals=globals())
-    return time_taken
+    return result["total_secs"]
 
 
 def check_sync_status(retry=30, delay=60, return_while_sync_inprogress=False):
@@ -1983,11 +2089,9 @@ def check_datalog_list():
     check datalog list
     """
     cmd = "radosgw-admin datalog list"
-    datalog_list = utils.exec_shell_cmd(cmd)
-    if "ERROR" in datalog_list or "failed" in datalog_list:
-        return True
-    else:
-        return False
+    return any(
+        "ERROR" in line or "failed" in line for line in utils.stream_shell_cmd(cmd)
+    )
 
 
 def get_datalog_marker():
@@ -2118,11 +2222,13 @@ def get_s3_client(access_key, secret_key, endpoint):
     """
     Returns s3 client
     """
-    s3_conn_client = boto3.client(
+    s3_conn_client = client_factory.get_client(
         "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=endpoint,
+        access_key,
+        secret_key,
+        endpoint,
+        region_name=None,
+        addressing_style=None,
     )
     return s3_conn_client
 
@@ -2460,8 +2566,7 @@ def test_log_trimming(bucket, config):
         for i in range(0, 128):
             shard_id = i
             cmd = f"radosgw-admin datalog list --shard-id {shard_id}"
-            output1 = json.loads(utils.exec_shell_cmd(cmd))
-            if len(output1) > 0:
+            if any(True for _ in utils.stream_json_array(cmd)):
                 break
     else:
         cmd = f"radosgw-admin bilog list --bucket {bucket.name}"
@@ -3016,82 +3121,30 @@ def test_bucket_stats_across_sites(bucket_name_to_create, config):
         if config.remote_zone == "archive":
             zone_name = config.remote_zone
 
-        # Try bucket stats at local site with fallback
-        cmd_bucket_stats = (
-            f"radosgw-admin bucket stats --bucket {bucket_name_to_create}"
-        )
-        log.info(f"Collecting bucket stats for {bucket_name_to_create} at local site")
-        try:
-            local_output = utils.exec_shell_cmd(cmd_bucket_stats)
-            local_bucket_stats = json.loads(local_output)
-        except Exception as e:
-            log.warning(
-                f"Bucket stats failed for {bucket_name_to_create}, trying with tenant0 prefix"
-            )
-            cmd_bucket_stats = (
-                f"radosgw-admin bucket stats --bucket tenant0/{bucket_name_to_create}"
-            )
-            local_output = utils.exec_shell_cmd(cmd_bucket_stats)
-            local_bucket_stats = json.loads(local_output)
-
-        local_num_objects = local_bucket_stats["usage"]["rgw.main"]["num_objects"]
-        local_size = local_bucket_stats["usage"]["rgw.main"]["size"]
-
         log.info(f"Remote zone is {zone_name}")
         remote_ip = utils.get_rgw_ip_zone(zone_name)
         remote_site_ssh_con = utils.connect_remote(remote_ip)
 
-        log.info(
-            f"Collecting bucket stats for {bucket_name_to_create} at remote site {zone_name}"
-        )
         if config.test_ops.get("download_object_at_remote_site", False):
             log.info("We have already waited for the sync lease period")
+            timeout = 0
         else:
-            log.info("We have to wait for sync lease period")
-            time.sleep(1200)
-
-        # Try bucket stats at remote site with fallback
-        stdin, stdout, stderr = remote_site_ssh_con.exec_command(
-            f"radosgw-admin bucket stats --bucket {bucket_name_to_create}"
-        )
-        cmd_output = stdout.read().decode()
-        err_output = stderr.read().decode()
-        if cmd_output.strip():
-            stats_remote = json.loads(cmd_output)
-        elif "failure: (2002) Unknown error 2002:" in err_output:
-            log.warning(
-                f"Bucket stats failed for {bucket_name_to_create} at remote, trying with tenant0 prefix"
-            )
-            stdin, stdout, stderr = remote_site_ssh_con.exec_command(
-                f"radosgw-admin bucket stats --bucket tenant0/{bucket_name_to_create}"
-            )
-            cmd_output = stdout.read().decode()
-            err_output = stderr.read().decode()
-            if cmd_output.strip():
-                stats_remote = json.loads(cmd_output)
-            else:
-                raise TestExecError(
-                    f"Bucket stats failed for {bucket_name_to_create} at remote site {zone_name}: {err_output}"
-                )
-        else:
-            raise TestExecError(
-                f"Bucket stats failed for {bucket_name_to_create} at remote site {zone_name}: {err_output}"
-            )
+            log.info("Polling bucket stats for up to the sync lease period")
+            timeout = 1200
 
-        log.info(
-            f"Bucket stats at remote site {zone_name} for {bucket_name_to_create} is {stats_remote}"
-        )
         log.info(
             "Verify num_objects and size is consistent across local and remote site"
         )
-        remote_num_objects = stats_remote["usage"]["rgw.main"]["num_objects"]
-        remote_size = stats_remote["usage"]["rgw.main"]["size"]
-        if remote_size == local_size and remote_num_objects == local_num_objects:
-            log.info(f"Data is consistent for bucket {bucket_name_to_create}")
-        else:
+        try:
+            BucketStatsSyncVerifier(
+                [bucket_name_to_create], remote_site_ssh_con, timeout=timeout
+            ).verify()
+        except TestExecError as e:
+            log.error(e)
             raise TestExecError(
                 f"Data is inconsistent for {bucket_name_to_create} across sites"
             )
+        log.info(f"Data is consistent for bucket {bucket_name_to_create}")
 
 
 def test_object_download_at_replicated_site(
@@ -3144,6 +3197,39 @@ def test_object_download_at_replicated_site(
                 )
 
 
+def verify_bucket_consistency_across_sites(bucket_name, each_user, config):
+    """
+    compare the object versions of a bucket on the local and the remote site
+
+    the listings of both sites are streamed and merge-joined, object data is
+    compared according to test_ops consistency_verify_data (none, sample or all)
+    """
+    is_primary = utils.is_cluster_primary()
+    zone_name = "secondary" if is_primary else "primary"
+    if config.remote_zone == "archive":
+        zone_name = "archive"
+    log.info(f"Verify object consistency of {bucket_name} with remote site {zone_name}")
+    local_client = get_auth(
+        each_user, None, config.ssl, config.haproxy
+    ).do_auth_using_client()
+    remote_site_ssh_conn = utils.connect_remote(utils.get_rgw_ip_zone(zone_name))
+    remote_client = get_auth(
+        each_user, remote_site_ssh_conn, config.ssl, config.haproxy
+    ).do_auth_using_client()
+    report = ZoneConsistencyChecker(
+        local_client,
+        remote_client,
+        workers=config.test_ops.get("consistency_workers", 8),
+        verify_data=config.test_ops.get("consistency_verify_data", "none"),
+        sample_rate=config.test_ops.get("consistency_sample_rate", 0.01),
+    ).check(bucket_name)
+    if not report["consistent"]:
+        raise TestExecError(
+            f"bucket {bucket_name} is inconsistent across sites: {report['examples']}"
+        )
+    return report
+
+
 def validate_incomplete_multipart(bucket_name, rgw_conn):
     """
     Validating incomplete multipart objects in a bucket
@@ -3291,6 +3377,7 @@ def create_storage_class_in_all_zones(current_zone, rgw_ssh_con, config):
                 f"ceph osd pool application enable {pool_name} rgw"
             )
             rgw_ssh_con.exec_command("radosgw-admin period update --commit")
+            utils.cluster_info.invalidate("sync_status")
 
 
 def validate_default_placement_and_storageclass_for_user(
@@ -1,3 +1,4 @@
+import csv
 import json
 import logging
 import os
@@ -8,6 +9,7 @@ import threading
 import time
 
 import boto3
+import v2.lib.perf_baseline as perf_baseline
 import v2.utils.utils as utils
 from v2.lib.exceptions import SyncFailedError, TestExecError
 from v2.lib.rgw_config_opts import CephConfOp, ConfigOpts
@@ -20,9 +22,13 @@ from v2.lib.s3.write_io_info import (
 )
 from v2.tests.s3_swift import reusable
 from v2.tests.s3_swift.reusables import rgw_accounts as accounts
+from v2.utils.log import LOG_DIR
 
 log = logging.getLogger()
 
+# per run elbencho result files: <zone>-<time>-<id>.txt/.csv/.json
+ELBENCHO_RESULTS_DIR = os.path.join(LOG_DIR, "elbencho_results")
+
 
 def get_rgw_services_by_realm(ssh_con=None, site_name="local", realm_name=None):
     """
@@ -480,27 +486,166 @@ def elbench_install_configure():
 def run_elbencho(
     endpoint, zone_name, num_objects, buckets, each_user, threads, object_size
 ):
-    """Runs Elbencho with specified parameters."""
+    """
+    Runs Elbencho with specified parameters.
+
+    Returns:
+        list of per-phase result records, see parse_elbencho_csv(). None on failure
+    """
     log.info(
         f"[{zone_name}] Running Elbencho workload for {num_objects} objects on buckets {buckets}"
     )
     bucket_prefix = "-".join(buckets[0].split("-")[:-1]) + "-"
     num_buckets = len(buckets)
     bucket_format = f"{bucket_prefix}{{0..{num_buckets-1}}}"
-    elbencho_cmd = (
-        f"time /usr/local/bin/elbencho --s3endpoints {endpoint} --s3key {each_user['access_key']} --s3secret {each_user['secret_key']} "
+    elbencho_args = (
+        f"--s3endpoints {endpoint} --s3key {each_user['access_key']} --s3secret {each_user['secret_key']} "
         f"-w -t {threads} -n0 -N {num_objects} -s {object_size} {bucket_format}"
     )
-    output = utils.exec_shell_cmd(elbencho_cmd)
-    if output is False:
+    records = run_elbencho_with_results(elbencho_args, zone_name)
+    if records is False:
         log.error(f"Elbencho execution failed on {zone_name}")
         return
-    metrics = parse_elbencho_output(output)
-    log.info(f"[{zone_name}] Performance metrics: {metrics}")
+    return records
+
+
+def run_elbencho_with_results(elbencho_args, zone_name, label=None, results_dir=None):
+    """
+    Runs elbencho with machine readable result files and parses them.
+
+    The human readable results (--resfile), the csv results (--csvfile) and
+    the parsed records (json) are kept in results_dir.
+
+    Args:
+        elbencho_args: elbencho arguments, without the binary
+        zone_name: Zone name, for logging and the result file names
+        label: label of the run in the result files
+        results_dir: directory for the result files, defaults to ELBENCHO_RESULTS_DIR
+
+    Returns:
+        list of per-phase result records, False if elbencho failed
+    """
+    results_dir = results_dir or ELBENCHO_RESULTS_DIR
+    os.makedirs(results_dir, exist_ok=True)
+    label = label or zone_name
+    run_id = (
+        f"{zone_name}-{time.strftime('%Y%m%d-%H%M%S')}-{random.randint(0, 0xFFFF):04x}"
+    )
+    base = os.path.join(results_dir, run_id)
+    elbencho_cmd = (
+        f"time /usr/local/bin/elbencho {elbencho_args} --lat --latpercent "
+        f"--label {label} --resfile {base}.txt --csvfile {base}.csv"
+    )
+    output = utils.exec_shell_cmd(elbencho_cmd)
+    if output is False:
+        return False
+    if os.path.exists(f"{base}.csv"):
+        records = parse_elbencho_csv(f"{base}.csv")
+    else:
+        log.warning(f"[{zone_name}] no elbencho csv results, parsing console output")
+        records = [parse_elbencho_output(output)]
+    for record in records:
+        record["zone"] = zone_name
+    with open(f"{base}.json", "w") as fp:
+        json.dump(records, fp, indent=2)
+    for record in records:
+        log.info(
+            f"[{zone_name}] {record.get('phase')}: iops={record.get('iops')} "
+            f"throughput_mib_s={record.get('throughput_mib_s')} total_mib={record.get('total_mib')} "
+            f"latency_us={record.get('latency_us')} errors={record.get('errors')}"
+        )
+    log.info(f"[{zone_name}] elbencho results written to {base}.json")
+    # endpoints, credentials and the bucket names change between runs,
+    # the workload is identified by the remaining arguments
+    workload = re.sub(r"--s3(endpoints|key|secret) \S+", "", elbencho_args).split()[:-1]
+    perf_metrics = {}
+    for record in records:
+        for name in ("iops", "throughput_mib_s", "entries_per_sec", "last_done_ms"):
+            if isinstance(record.get(name), (int, float)):
+                perf_metrics[f"{record.get('phase')}.{name}"] = record[name]
+        for kind, values in (record.get("latency_us") or {}).items():
+            for stat, value in values.items():
+                if isinstance(value, (int, float)):
+                    perf_metrics[f"{record.get('phase')}.{kind}_lat_us.{stat}"] = value
+    perf_baseline.record_metrics(
+        f"elbencho-{label}", perf_metrics, {"workload": workload}
+    )
+    return records
+
+
+def _to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def _elbencho_column(row, name):
+    """
+    returns the numeric value of the first column named like 'name', case insensitive
+    """
+    name = name.lower()
+    for column, value in row.items():
+        if column and column.strip().lower() == name:
+            return _to_number(value)
+    return None
+
+
+def parse_elbencho_csv(csv_file):
+    """
+    Parses the elbencho --csvfile results into one record per phase.
+
+    Each record has the phase (operation), label, iops, throughput_mib_s,
+    entries_per_sec, total_mib, entries, first_done_ms and last_done_ms (the
+    time the first and the last worker finished the phase), errors and
+    latency_us, the entry and io latency min/avg/max and percentiles. The
+    [last] values, i.e once all the workers are done, are reported.
+    """
+    records = []
+    with open(csv_file, newline="") as fp:
+        for row in csv.DictReader(fp):
+            latency = {}
+            for column, value in row.items():
+                match = re.match(
+                    r"^\s*(ent|io)\w*\s+lat\w*\s+us\s*\[(.+)\]\s*$", column or "", re.I
+                )
+                if match and value not in ("", None):
+                    kind = "entry" if match.group(1).lower() == "ent" else "io"
+                    latency.setdefault(kind, {})[match.group(2).strip()] = _to_number(
+                        value
+                    )
+            records.append(
+                {
+                    "phase": row.get("operation") or row.get("phase"),
+                    "label": row.get("label"),
+                    "iops": _elbencho_column(row, "IOPS [last]"),
+                    "throughput_mib_s": _elbencho_column(row, "MiB/s [last]"),
+                    "entries_per_sec": _elbencho_column(row, "entries/s [last]"),
+                    "total_mib": _elbencho_column(row, "MiB [last]"),
+                    "entries": _elbencho_column(row, "entries [last]"),
+                    "first_done_ms": _elbencho_column(row, "time ms [first]"),
+                    "last_done_ms": _elbencho_column(row, "time ms [last]"),
+                    "errors": sum(
+                        _to_number(value) or 0
+                        for column, value in row.items()
+                        if column
+                        and "err" in column.lower()
+                        and isinstance(_to_number(value), (int, float))
+                    ),
+                    "latency_us": latency,
+                }
+            )
+    return records
 
 
 def parse_elbencho_output(output):
-    """Parses Elbencho output and extracts performance metrics."""
+    """
+    Parses Elbencho console output and extracts performance metrics.
+
+    Used when the csv results are not available, the values are numbers and
+    the keys match the records of parse_elbencho_csv().
+    """
     log.info("Parsing Elbencho output")
     if not isinstance(output, str):
         log.error("Invalid output received from Elbencho command.")
@@ -508,12 +653,14 @@ def parse_elbencho_output(output):
     metrics = {}
     lines = output.split("\n")
     for line in lines:
+        if not line.split():
+            continue
         if "Throughput MiB/s" in line:
-            metrics["Throughput"] = line.split()[-1]
+            metrics["throughput_mib_s"] = _to_number(line.split()[-1])
         elif "IOPS" in line:
-            metrics["IOPS"] = line.split()[-1]
+            metrics["iops"] = _to_number(line.split()[-1])
         elif "Total MiB" in line:
-            metrics["Total Data Written (MiB)"] = line.split()[-1]
+            metrics["total_mib"] = _to_number(line.split()[-1])
     return metrics
 
 
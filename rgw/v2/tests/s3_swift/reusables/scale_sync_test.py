@@ -21,7 +21,11 @@ import time
 
 import v2.lib.resource_op as s3lib
 import v2.utils.utils as utils
+from v2.lib.bi_analyzer import BiListAnalyzer, count_bi_entries
+from v2.lib.bucket_stats_diff import BucketStatsSyncVerifier
 from v2.lib.exceptions import TestExecError
+from v2.lib.s3.auth import Auth
+from v2.lib.s3.zone_consistency import ZoneConsistencyChecker
 from v2.tests.s3_swift import reusable
 from v2.tests.s3_swift.reusables import rgw_s3_elbencho as elbencho
 from v2.tests.s3cmd import reusable as s3cmd_reusable
@@ -284,16 +288,16 @@ def verify_sync_using_bucket_stats(
 ):
     """
     Verify sync consistency using radosgw-admin bucket stats on both zones.
-    Compares num_objects on primary and secondary to ensure they match.
+    Compares num_objects and size_actual on primary and secondary to ensure they match.
 
     Args:
         bucket_names: List of bucket names to verify
         remote_ssh_con: SSH connection to secondary site
-        max_retries: Maximum number of retry attempts
-        check_interval: Seconds to wait between retries
+        max_retries: max_retries * check_interval is the time allowed to converge
+        check_interval: Longest wait between polls
 
     Raises:
-        TestExecError: If sync doesn't complete within max_retries
+        TestExecError: If sync doesn't complete in time
     """
     log.info(f"\n{'='*80}")
     log.info("VERIFYING SYNC CONSISTENCY USING BUCKET STATS")
@@ -340,128 +344,58 @@ def verify_sync_using_bucket_stats(
 
     log.info(f"{'='*80}\n")
 
-    for bucket_name in bucket_names:
-        log.info(f"Verifying sync for bucket: {bucket_name}")
-        synced = False
-
-        for attempt in range(1, max_retries + 1):
-            # Get primary bucket stats
-            primary_stats_output = utils.exec_shell_cmd(
-                f"radosgw-admin bucket stats --bucket {bucket_name}"
-            )
-            primary_json_match = re.search(r"\{.*\}", primary_stats_output, re.DOTALL)
-
-            if not primary_json_match:
-                log.warning(
-                    f"  Attempt {attempt}: Failed to parse primary bucket stats"
-                )
-                time.sleep(check_interval)
-                continue
-
-            primary_stats = json.loads(primary_json_match.group(0))
-            primary_num_objects = primary_stats["usage"]["rgw.main"]["num_objects"]
-
-            # Get secondary bucket stats
-            stdin, stdout, stderr = remote_ssh_con.exec_command(
-                f"sudo radosgw-admin bucket stats --bucket {bucket_name}"
-            )
-            secondary_stats_output = (
-                stdout.read().decode("utf-8", errors="replace").strip()
-            )
-            secondary_stderr = stderr.read().decode("utf-8", errors="replace").strip()
-
-            # Log the raw output for debugging
-            if attempt == 1:
-                log.info(f"Secondary bucket stats output (attempt 1):")
-                log.info(
-                    secondary_stats_output[:1000]
-                    if len(secondary_stats_output) > 1000
-                    else secondary_stats_output
-                )
-            if secondary_stderr:
-                log.warning(f"Secondary stderr: {secondary_stderr}")
-
-            # Check if bucket doesn't exist on secondary yet
-            if (
-                "no such bucket" in secondary_stats_output.lower()
-                or "could not get bucket info" in secondary_stats_output.lower()
-                or len(secondary_stats_output) == 0
-            ):
-                log.info(
-                    f"  Attempt {attempt}/{max_retries}: Bucket not yet synced to secondary (Primary={primary_num_objects}, Secondary=bucket not found)"
-                )
-                if attempt < max_retries:
-                    time.sleep(check_interval)
-                    continue
-                else:
-                    raise TestExecError(
-                        f"Bucket {bucket_name} never appeared on secondary after {max_retries} attempts"
-                    )
-
-            # Try to parse JSON - handle case where output might be just JSON or have extra text
-            try:
-                # First try: parse entire output as JSON (if it's pure JSON)
-                secondary_stats = json.loads(secondary_stats_output)
-            except json.JSONDecodeError:
-                # Second try: extract JSON from output that might have extra text
-                secondary_json_match = re.search(
-                    r"\{.*\}", secondary_stats_output, re.DOTALL
-                )
-                if not secondary_json_match:
-                    log.warning(
-                        f"  Attempt {attempt}: Failed to parse secondary bucket stats (not valid JSON)"
-                    )
-                    log.warning(f"  Secondary output: {secondary_stats_output[:500]}")
-                    time.sleep(check_interval)
-                    continue
-                try:
-                    secondary_stats = json.loads(secondary_json_match.group(0))
-                except json.JSONDecodeError as e:
-                    log.warning(
-                        f"  Attempt {attempt}: JSON parsing failed even after regex extraction: {e}"
-                    )
-                    time.sleep(check_interval)
-                    continue
+    # one bucket stats call per site covering all the buckets, re-polling
+    # only the buckets that still differ
+    BucketStatsSyncVerifier(
+        bucket_names,
+        remote_ssh_con,
+        timeout=max_retries * check_interval,
+        max_interval=check_interval,
+    ).verify()
 
-            # Extract num_objects safely
-            try:
-                secondary_num_objects = secondary_stats["usage"]["rgw.main"][
-                    "num_objects"
-                ]
-            except (KeyError, TypeError) as e:
-                log.warning(
-                    f"  Attempt {attempt}: Failed to extract num_objects from secondary stats: {e}"
-                )
-                log.warning(
-                    f"  Available keys in secondary_stats: {list(secondary_stats.keys()) if isinstance(secondary_stats, dict) else 'not a dict'}"
-                )
-                time.sleep(check_interval)
-                continue
+    log.info(f"\n{'='*80}")
+    log.info("✅ ALL BUCKETS SYNCED SUCCESSFULLY")
+    log.info(f"{'='*80}\n")
 
-            log.info(
-                f"  Attempt {attempt}/{max_retries}: Primary={primary_num_objects}, "
-                f"Secondary={secondary_num_objects}"
-            )
 
-            if primary_num_objects == secondary_num_objects:
-                log.info(
-                    f"  ✓ Sync complete for {bucket_name}: {primary_num_objects} objects on both zones"
-                )
-                synced = True
-                break
+def verify_object_consistency(
+    bucket_names, local_client, user_info, remote_ssh_con, config
+):
+    """
+    Verify every object version of the buckets is the same on both zones.
 
-            if attempt < max_retries:
-                time.sleep(check_interval)
+    The version listings of both zones are streamed and merge-joined, so this
+    scales to multi-million object buckets. Object data is compared according
+    to test_ops consistency_verify_data (none, sample or all).
 
-        if not synced:
-            raise TestExecError(
-                f"Sync verification failed for {bucket_name} after {max_retries} attempts. "
-                f"Primary: {primary_num_objects}, Secondary: {secondary_num_objects}"
-            )
+    Args:
+        bucket_names: List of bucket names to verify
+        local_client: boto3 client of the primary zone
+        user_info: User information dict of the bucket owner
+        remote_ssh_con: SSH connection to secondary site
+        config: Test configuration
 
-    log.info(f"\n{'='*80}")
-    log.info("✅ ALL BUCKETS SYNCED SUCCESSFULLY")
-    log.info(f"{'='*80}\n")
+    Raises:
+        TestExecError: If any bucket has missing, extra or mismatched versions
+    """
+    remote_client = Auth(
+        user_info, remote_ssh_con, ssl=config.ssl
+    ).do_auth_using_client(region_name=local_client.meta.region_name)
+    checker = ZoneConsistencyChecker(
+        local_client,
+        remote_client,
+        workers=config.test_ops.get("consistency_workers", 8),
+        verify_data=config.test_ops.get("consistency_verify_data", "none"),
+        sample_rate=config.test_ops.get("consistency_sample_rate", 0.01),
+    )
+    inconsistent = {}
+    for bucket_name in bucket_names:
+        report = checker.check(bucket_name)
+        if not report["consistent"]:
+            inconsistent[bucket_name] = report["examples"]
+    if inconsistent:
+        raise TestExecError(f"Objects inconsistent across zones: {inconsistent}")
+    log.info(f"✓ Objects consistent across zones for {len(bucket_names)} buckets")
 
 
 def run_sanity_check(
@@ -673,6 +607,9 @@ def run_elbencho_with_size_distribution(
         each_user: User credentials dict
         threads: Number of threads
         size_distribution: Dict with size ranges and percentages
+
+    Returns:
+        (total MiB written, elbencho per-phase result records)
     """
     log.info(f"[{zone_name}] Starting elbencho workload with size distribution")
     log.info(f"[{zone_name}] Total objects to create: {num_objects}")
@@ -691,6 +628,7 @@ def run_elbencho_with_size_distribution(
     ]
 
     total_data_written = 0
+    results = []
     special_chars = size_distribution.get("use_special_chars", False)
 
     for size_range, obj_count in size_ranges:
@@ -701,9 +639,9 @@ def run_elbencho_with_size_distribution(
             f"[{zone_name}] Writing {obj_count} objects of size {size_range} bytes"
         )
 
-        # Build elbencho command
-        elbencho_cmd = (
-            f"time /usr/local/bin/elbencho --s3endpoints {endpoint} "
+        # Build elbencho arguments
+        elbencho_args = (
+            f"--s3endpoints {endpoint} "
             f"--s3key {each_user['access_key']} --s3secret {each_user['secret_key']} "
             f"-w -t {threads} -n0 -N {obj_count} -s {size_range} "
             f"{bucket_format}"
@@ -715,23 +653,23 @@ def run_elbencho_with_size_distribution(
                 f"[{zone_name}] Note: Special character object names not supported by elbencho"
             )
 
-        output = utils.exec_shell_cmd(elbencho_cmd)
-        if output is False:
+        records = elbencho.run_elbencho_with_results(
+            elbencho_args, zone_name, label=f"size-{size_range}"
+        )
+        if records is False:
             raise TestExecError(
                 f"Elbencho failed on {zone_name} for size range {size_range}"
             )
+        results.extend(records)
 
-        # Parse metrics
-        metrics = elbencho.parse_elbencho_output(output)
-        log.info(f"[{zone_name}] Metrics for size {size_range}: {metrics}")
-
-        if "Total Data Written (MiB)" in metrics:
-            total_data_written += float(metrics["Total Data Written (MiB)"])
+        for record in records:
+            if isinstance(record.get("total_mib"), (int, float)):
+                total_data_written += record["total_mib"]
 
     log.info(
         f"[{zone_name}] ✓ Completed workload - Total data written: {total_data_written:.2f} MiB"
     )
-    return total_data_written
+    return total_data_written, results
 
 
 def run_versioned_workload(
@@ -1114,31 +1052,19 @@ def process_lc_until_bucket_stats_zero(
         if list_count > 0:
             all_bucket_lists_empty = False
 
-        # Check bi list
-        bi_cmd = f"radosgw-admin bi list --bucket {bucket_name}"
-        log.info(f"[root@{site_name} ~]# {bi_cmd}")
-
-        if ssh_con:
-            stdin, stdout, stderr = ssh_con.exec_command(f"sudo {bi_cmd}")
-            bi_output = stdout.read().decode("utf-8", errors="replace").strip()
-        else:
-            bi_output = utils.exec_shell_cmd(f"sudo {bi_cmd}")
-
-        # Parse bi list and count OLH entries with pending_removal=false
+        # Check bi list, streamed and analyzed without holding the output
+        log.info(f"[root@{site_name} ~]# radosgw-admin bi list --bucket {bucket_name}")
         try:
-            bi_data = json.loads(bi_output)
-            bi_count = len(bi_data) if isinstance(bi_data, list) else 0
-
-            # Count OLH entries with pending_removal=false
-            olh_pending_false_count = 0
-            if isinstance(bi_data, list):
-                for entry in bi_data:
-                    if (
-                        entry.get("type") == "olh"
-                        and entry.get("pending_removal") == False
-                    ):
-                        olh_pending_false_count += 1
-        except:
+            bi_report = BiListAnalyzer(
+                bucket_name, ssh_con=ssh_con, sudo=True
+            ).analyze()
+            bi_count = bi_report["entries"]
+            # OLH entries with pending_removal=false
+            olh_pending_false_count = (
+                bi_report["types"]["olh"] - bi_report["olh"]["pending_removal"]
+            )
+        except Exception as e:
+            log.warning(f"  failed to analyze bi list of {bucket_name}: {e}")
             bi_count = 0
             olh_pending_false_count = 0
 
@@ -1147,10 +1073,6 @@ def process_lc_until_bucket_stats_zero(
             log.info(
                 f"  OLH entries with pending_removal=false: {olh_pending_false_count}"
             )
-            if olh_pending_false_count > 0:
-                log.info(
-                    f"  ⚠ Sample bi list output (first 500 chars):\n{bi_output[:500]}"
-                )
 
         bucket_investigation[bucket_name] = {
             "bucket_stats_objects": bucket_stats_info.get(bucket_name, 0),
@@ -1385,15 +1307,8 @@ def verify_and_cleanup_bucket_list_and_index(
         bi_cmd = f"radosgw-admin bi list --bucket {bucket_name}"
         log.info(f"\n[root@{site_name} ~]# {bi_cmd}")
 
-        if ssh_con:
-            stdin, stdout, stderr = ssh_con.exec_command(f"sudo {bi_cmd}")
-            bi_list_output = stdout.read().decode("utf-8", errors="replace").strip()
-        else:
-            bi_list_output = utils.exec_shell_cmd(f"sudo {bi_cmd}")
-
         try:
-            bi_list = json.loads(bi_list_output)
-            bi_count = len(bi_list) if isinstance(bi_list, list) else 0
+            bi_count = count_bi_entries(bucket_name, ssh_con, sudo=True)
 
             if bi_count == 0:
                 log.info(f"✓ {bucket_name}: Bucket index is EMPTY")
@@ -1405,7 +1320,7 @@ def verify_and_cleanup_bucket_list_and_index(
                     log.warning(
                         f"  → Bucket list is empty but bi list has {bi_count} orphaned entries"
                     )
-        except json.JSONDecodeError:
+        except ValueError:
             log.info(f"✓ {bucket_name}: Bucket index is EMPTY (empty output)")
 
     # STEP 5: Fix orphaned OLH entries if needed
@@ -1481,19 +1396,9 @@ def verify_and_cleanup_bucket_list_and_index(
                 time.sleep(fix_wait_interval)
 
                 # Check bi list again
-                bi_cmd = f"radosgw-admin bi list --bucket {bucket_name}"
-                if ssh_con:
-                    stdin, stdout, stderr = ssh_con.exec_command(f"sudo {bi_cmd}")
-                    bi_list_output = (
-                        stdout.read().decode("utf-8", errors="replace").strip()
-                    )
-                else:
-                    bi_list_output = utils.exec_shell_cmd(f"sudo {bi_cmd}")
-
                 try:
-                    bi_list = json.loads(bi_list_output)
-                    bi_count = len(bi_list) if isinstance(bi_list, list) else 0
-                except json.JSONDecodeError:
+                    bi_count = count_bi_entries(bucket_name, ssh_con, sudo=True)
+                except (TestExecError, ValueError):
                     bi_count = 0
 
                 olh_fix_results[bucket_name]["final_bi_count"] = bi_count
@@ -1,12 +1,12 @@
 import json
 import logging
 import re
-import shlex
 import time
 
 import botocore.exceptions
 import v2.utils.utils as utils
 from v2.lib.exceptions import EventRecordDataError, TestExecError
+from v2.lib.s3 import access_log
 from v2.tests.s3_swift import reusable
 from v2.tests.s3_swift.reusables import bucket_policy_ops
 from v2.tests.s3_swift.reusables import rgw_accounts as accounts
@@ -77,13 +77,13 @@ def parse_log_record(record):
     Returns: (operation_name, request_uri, key)
     """
     try:
-        fields = shlex.split(record)
-        if len(fields) < 10:
+        fields = access_log.tokenize(record)
+        if len(fields) < 9:
             log.warning("Log record has fewer fields than expected: %s", record)
             return None, None, None
-        operation_name = fields[7]
-        key = fields[8]
-        request_uri = fields[9]
+        operation_name = fields[6]
+        key = fields[7]
+        request_uri = fields[8]
         return operation_name, request_uri, key
     except Exception as e:
         log.error("Error parsing log record: %s", e)
@@ -100,38 +100,35 @@ def verify_operation_name_in_logs(log_records, operation_mapping):
     found_operations = {}
     operation_errors = []
     all_operations_in_logs = set()
+    # expected operation name -> first op_desc mapped to it
+    op_desc_by_name = {}
+    for op_desc, expected_op_name in operation_mapping.items():
+        op_desc_by_name.setdefault(expected_op_name, op_desc)
 
-    for record in log_records:
-        if not record.strip():
-            continue
-        operation_name, request_uri, key = parse_log_record(record)
-        if operation_name:
-            all_operations_in_logs.add(operation_name)
-
-    log.info("Unique operation names found in logs: %s", sorted(all_operations_in_logs))
-
+    # one pass, log_records may be a stream
     for record in log_records:
         if not record.strip():
             continue
         operation_name, request_uri, key = parse_log_record(record)
         if operation_name is None:
             continue
-        for op_desc, expected_op_name in operation_mapping.items():
-            if expected_op_name == operation_name:
-                if op_desc not in found_operations:
-                    found_operations[op_desc] = {
-                        "expected": expected_op_name,
-                        "actual": operation_name,
-                        "request_uri": request_uri,
-                        "key": key,
-                    }
-                    log.info(
-                        "✓ Found operation: %s -> %s (matches expected %s)",
-                        op_desc,
-                        operation_name,
-                        expected_op_name,
-                    )
-                break
+        all_operations_in_logs.add(operation_name)
+        op_desc = op_desc_by_name.get(operation_name)
+        if op_desc is not None and op_desc not in found_operations:
+            found_operations[op_desc] = {
+                "expected": operation_name,
+                "actual": operation_name,
+                "request_uri": request_uri,
+                "key": key,
+            }
+            log.info(
+                "✓ Found operation: %s -> %s (matches expected %s)",
+                op_desc,
+                operation_name,
+                operation_name,
+            )
+
+    log.info("Unique operation names found in logs: %s", sorted(all_operations_in_logs))
 
     log.info("%s", "=" * 80)
     log.info("Operation Name Verification Results:")
@@ -321,19 +318,28 @@ def verify_journal_logs(
 ):
     """
     verify log records which are in journal mode format
+
+    log_records may be a stream, e.g from access_log.iter_log_records()
     """
     put_count = mpu_count = copy_count = delete_count = 0
+    analyzer = access_log.AccessLogAnalyzer("Journal")
     for record in log_records:
-        log.info(f"verifying record: {record}")
-        fields = record.split(" ")
-        bucket_owner = fields[0]
-        bucket_name = fields[1]
-        timestamp = f"{fields[2]} {fields[3]}"
-        op = fields[4]
-        key = fields[5]
-        size = fields[6]
-        version_id = fields[7]
-        etag = fields[8]
+        if not record.strip():
+            continue
+        log.debug(f"verifying record: {record}")
+        fields = analyzer.add(record)
+        if fields is None:
+            raise Exception(f"log record has fewer fields than expected: {record}")
+        (
+            bucket_owner,
+            bucket_name,
+            timestamp,
+            op,
+            key,
+            size,
+            version_id,
+            etag,
+        ) = fields[: len(access_log.JOURNAL_FIELDS)]
 
         if op == "REST.PUT.OBJECT":
             put_count = put_count + 1
@@ -360,10 +366,7 @@ def verify_journal_logs(
                 raise Exception("bucket_owner not matched")
             if bucket_name != src_bucket_name:
                 raise Exception("bucket_name not matched")
-        timestamp_regex = re.compile(
-            r"\[\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [-+]\d{4}\]"
-        )
-        if not timestamp_regex.match(timestamp):
+        if not access_log.TIMESTAMP_REGEX.match(timestamp):
             raise Exception(f"timestamp {timestamp} format not matched")
 
         if (size == "-" or int(size) == 0) and op != "REST.POST.UPLOAD":
@@ -374,6 +377,7 @@ def verify_journal_logs(
         if etag == "-" and op != "REST.POST.UPLOAD":
             raise Exception("etag not populated")
 
+    analyzer.log_report()
     objects_count = config.objects_count
     log.info(f"delete_count: {delete_count}")
     log.info(f"put_count: {put_count}")
@@ -402,6 +406,8 @@ def verify_journal_logs(
 def verify_standard_logs(log_records, src_user_name, src_bucket_name, config):
     """
     verify log records which are in standard mode format
+
+    log_records may be a stream, e.g from access_log.iter_log_records()
     """
     put_count = (
         create_mpu_count
@@ -409,38 +415,42 @@ def verify_standard_logs(log_records, src_user_name, src_bucket_name, config):
         complete_mpu_count
     ) = part_upload_count = copy_count = delete_count = other_ops_count = 0
     _, local_ip = utils.get_hostname_ip()
+    analyzer = access_log.AccessLogAnalyzer("Standard")
     for record in log_records:
-        log.info(f"verifying record: {record}")
-        # fields = record.split(" ")
-        # fields = re.split(r'"([^"]*)"', record)
-        fields = shlex.split(record)
-        log.info(f"fields: {fields}")
-        bucket_owner = fields[0]
-        bucket_name = fields[1]
-        timestamp = f"{fields[2]} {fields[3]}"
-        client_ip = fields[4]
-        user_name_or_account = fields[5]
-        request_id = fields[6]
-        op = fields[7]
-        key = fields[8]
-        request_uri = fields[9]
-        http_status = fields[10]
-        error_code = fields[11]
-        bytes_sent = fields[12]
-        size = fields[13]
-        total_time = fields[14]
-        turnaround_time = fields[15]
-        referer = fields[16]
-        user_agent = fields[17]
-        version_id = fields[18]
-        host_id = fields[19]
-        signature_version = fields[20]
-        cipher_suite = fields[21]
-        authentication_type = fields[22]
-        host_header = fields[23]
-        tls_version = fields[24]
-        access_point_arn = fields[25]
-        acl_flag = fields[26]
+        if not record.strip():
+            continue
+        log.debug(f"verifying record: {record}")
+        fields = analyzer.add(record)
+        if fields is None:
+            raise Exception(f"log record has fewer fields than expected: {record}")
+        (
+            bucket_owner,
+            bucket_name,
+            timestamp,
+            client_ip,
+            user_name_or_account,
+            request_id,
+            op,
+            key,
+            request_uri,
+            http_status,
+            error_code,
+            bytes_sent,
+            size,
+            total_time,
+            turnaround_time,
+            referer,
+            user_agent,
+            version_id,
+            host_id,
+            signature_version,
+            cipher_suite,
+            authentication_type,
+            host_header,
+            tls_version,
+            access_point_arn,
+            acl_flag,
+        ) = fields[: len(access_log.STANDARD_FIELDS)]
 
         if bucket_owner != src_user_name:
             raise Exception(
@@ -451,10 +461,7 @@ def verify_standard_logs(log_records, src_user_name, src_bucket_name, config):
                 f"bucket_name not matched. Expected {src_bucket_name}, received {bucket_name}"
             )
 
-        timestamp_regex = re.compile(
-            r"\[\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [-+]\d{4}\]"
-        )
-        if not timestamp_regex.match(timestamp):
+        if not access_log.TIMESTAMP_REGEX.match(timestamp):
             raise Exception("timestamp format not matched")
 
         if client_ip != local_ip:
@@ -566,6 +573,7 @@ def verify_standard_logs(log_records, src_user_name, src_bucket_name, config):
 
         # error_code, bytes_sent, referer, host_id, acl_flag may or may not be populated hence not checking them
 
+    analyzer.log_report()
     objects_count = config.objects_count
     log.info(f"copy_count: {copy_count}")
     log.info(f"delete_count: {delete_count}")
@@ -630,19 +638,22 @@ def verify_log_records(
     time.sleep(5)
     log.info("sleeping for 5 seconds so that log object is flushed")
     objects_list = reusable.list_bucket_objects(rgw_s3_client, dest_bucket_name)
-    total_log_records = []
-    log.info("fetching all log objects content")
     for obj in objects_list:
         key = obj["Key"]
         if key != flushed_log_object_name:
             raise Exception(
                 f"flushed response log object name '{flushed_log_object_name}' not matched with actual log object name '{key}'"
             )
-        response = rgw_s3_client.get_object(Bucket=dest_bucket_name, Key=key)
-        content = response["Body"].read().decode("utf-8").strip()
-        log.info(f"log object {key} content: {content}")
-        obj_records = content.split("\n")
-        total_log_records.extend(obj_records)
+
+    def stream_log_records():
+        # the records are verified as they are read, not loaded in memory
+        for obj in objects_list:
+            log.info(f"streaming log object {obj['Key']} of size {obj.get('Size')}")
+            yield from access_log.iter_log_records(
+                rgw_s3_client, dest_bucket_name, obj["Key"]
+            )
+
+    total_log_records = stream_log_records()
 
     if config.test_ops.get("logging_type") == "Standard":
         verify_standard_logs(total_log_records, src_user_name, src_bucket_name, config)
@@ -0,0 +1,93 @@
+"""
+run_all - Run the s3_swift regression tests in parallel
+Usage: run_all.py [-f <tests_yaml>] [-j <workers>] [--rgw-node <rgw_ip>] [--dry-run]
+<tests_yaml>
+    run_all.yaml
+Operation:
+    tag each test with the shared resources it mutates (RGW restarts, ceph config,
+    zonegroup/period, GC/LC settings)
+    run the tests not mutating the same resources at the same time, longest first
+    write a log per test and results.json to the log dir, exit 1 if any test failed
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
+import argparse
+import logging
+
+from v2.lib.test_scheduler import TestScheduler, load_test_list
+from v2.utils.log import configure_logging
+
+log = logging.getLogger()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RGW S3 regression runner")
+    parser.add_argument(
+        "-f",
+        dest="tests_file",
+        help="test list yaml",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "run_all.yaml"
+        ),
+    )
+    parser.add_argument(
+        "-j", dest="workers", type=int, default=4, help="tests run at the same time"
+    )
+    parser.add_argument("--rgw-node", dest="rgw_node", help="RGW Node")
+    parser.add_argument("--log-dir", dest="log_dir", help="per test logs")
+    parser.add_argument(
+        "--durations-file",
+        dest="durations_file",
+        help="recorded durations, defaults to $RGW_TEST_DURATIONS or ~/rgw_test_durations.json",
+    )
+    parser.add_argument(
+        "--timeout", type=int, help="seconds after which a test is killed"
+    )
+    parser.add_argument(
+        "--fail-fast", action="store_true", help="start no more tests after a failure"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the tests, their resources and expected durations",
+    )
+    parser.add_argument(
+        "-log_level",
+        dest="log_level",
+        help="Set Log Level [DEBUG, INFO, WARNING, ERROR, CRITICAL]",
+        default="info",
+    )
+    args = parser.parse_args(argv)
+    configure_logging(f_name="run_all", set_level=args.log_level.upper())
+
+    scheduler = TestScheduler(
+        load_test_list(args.tests_file),
+        workers=args.workers,
+        log_dir=args.log_dir,
+        durations_file=args.durations_file,
+        extra_args=["--rgw-node", args.rgw_node] if args.rgw_node else None,
+        fail_fast=args.fail_fast,
+        timeout=args.timeout,
+    )
+    if args.dry_run:
+        print(f"workers: {scheduler.workers}, ceph release: {scheduler.ceph_release}")
+        for test in scheduler.plan():
+            print(
+                f"{test.duration:8.0f}s  {'exclusive' if test.exclusive else '':9s}  "
+                f"{test.name}  {sorted(test.resources)}"
+            )
+        return 0
+    results = scheduler.run()
+    failed = [result for result in results if not result["passed"]]
+    for result in failed:
+        log.error(
+            f"failed: {result['name']}, exit code {result['exit_code']}, log {result['log']}"
+        )
+    return 1 if failed or len(results) < len(scheduler.tests) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,7 @@ Usage: test_Mbuckets_with_Nobjects.py -c <input_yaml>
     test_Mbuckets_with_Nobjects_get_object_attributes_multipart.yaml
     test_Mbuckets_with_Nobjects_multipart_upload_complete_abort_race.yaml
     test_Mbuckets_with_Nobjects_unicode_bi_list.yaml
+    test_Mbuckets_with_Nobjects_concurrency.yaml
 
 Operation:
         Creates M bucket and N objects
@@ -40,6 +41,7 @@ Operation:
         Verify bi put on incomplete multipart upload
     Verify bucket instance shards are deleted from index pool post bucket delete
     Verify bucket index listing with unicode characters does not cause backwards iteration
+    Creates M buckets and N objects through worker pools (bucket_concurrency, object_concurrency)
 """
 
 # test basic creation of buckets with objects
@@ -49,14 +51,19 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
 import argparse
+import copy
 import hashlib
 import json
 import logging
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
+import v2.lib.manage_data as manage_data
 import v2.lib.resource_op as s3lib
 import v2.utils.utils as utils
+from v2.lib.bi_analyzer import BiListAnalyzer
 from v2.lib.exceptions import RGWBaseException, TestExecError
 from v2.lib.resource_op import Config
 from v2.lib.rgw_config_opts import CephConfOp, ConfigOpts
@@ -74,6 +81,172 @@ password = "32characterslongpassphraseneeded".encode("utf-8")
 encryption_key = hashlib.md5(password).hexdigest()
 
 
+def fan_out_buckets_and_objects(config, each_user, auth, ip_and_port):
+    """
+    Creates buckets and uploads, downloads and deletes objects through worker pools
+
+    Used when test_ops.bucket_concurrency or test_ops.object_concurrency is set.
+    Every worker thread uses its own boto3 connection, and io_info updates are
+    serialized by write_io_info. With test_ops.data_generation_processes set,
+    the files of the plain uploads are generated beforehand in a process pool.
+
+    Parameters:
+        config: test config
+        each_user(dict): user info
+        auth(Auth): auth of the user
+        ip_and_port(char): rgw endpoint to check before creating buckets
+    """
+    bucket_concurrency = config.test_ops.get("bucket_concurrency", 1)
+    object_concurrency = config.test_ops.get("object_concurrency", 1)
+    log.info(
+        f"fan-out mode: bucket_concurrency: {bucket_concurrency}, "
+        f"object_concurrency: {object_concurrency}"
+    )
+    thread_conns = threading.local()
+    conn_lock = threading.Lock()
+
+    def get_conn():
+        # boto3 sessions are not thread safe, create one connection per thread
+        if not hasattr(thread_conns, "rgw_conn"):
+            with conn_lock:
+                if config.use_aws4 is True:
+                    thread_conns.rgw_conn = auth.do_auth(
+                        **{"signature_version": "s3v4"}
+                    )
+                else:
+                    thread_conns.rgw_conn = auth.do_auth()
+        return thread_conns.rgw_conn
+
+    def create_bucket(bc):
+        bucket_name_to_create = utils.gen_bucket_name_from_userid(
+            each_user["user_id"], rand_no=bc
+        )
+        if config.haproxy:
+            bucket = reusable.create_bucket(
+                bucket_name_to_create, get_conn(), each_user
+            )
+        else:
+            bucket = reusable.create_bucket(
+                bucket_name_to_create, get_conn(), each_user, ip_and_port
+            )
+        return bucket.name
+
+    # s3_object_path -> data info of the files generated beforehand
+    generated = {}
+
+    def generate_objects_data(bucket_names):
+        if (
+            config.test_ops.get("upload_type") == "multipart"
+            or config.test_ops.get("enable_version", False)
+            or config.test_ops.get("virtual_payload", False)
+        ):
+            return
+        files = [
+            (
+                os.path.join(TEST_DATA_PATH, utils.gen_s3_object_name(bucket_name, oc)),
+                size,
+            )
+            for bucket_name in bucket_names
+            for oc, size in list(config.mapped_sizes.items())
+        ]
+        start = time.time()
+        data_infos = manage_data.io_generator_bulk(
+            files,
+            processes=config.test_ops["data_generation_processes"],
+            profile=config.test_ops.get("data_profile", "text"),
+            compress_ratio=config.test_ops.get("compress_ratio", 2),
+        )
+        for data_info in data_infos:
+            if data_info is False:
+                raise TestExecError("data creation failed")
+            generated[data_info["name"]] = data_info
+        log.info(f"generated {len(files)} files in {time.time() - start:.2f}s")
+
+    def upload_object(bucket_name, oc, size):
+        bucket = get_conn().Bucket(bucket_name)
+        # config.obj_size is read by the upload reusables, copy it per object
+        obj_config = copy.copy(config)
+        obj_config.obj_size = size
+        s3_object_name = utils.gen_s3_object_name(bucket_name, oc)
+        s3_object_path = os.path.join(TEST_DATA_PATH, s3_object_name)
+        if config.test_ops.get("upload_type") == "multipart":
+            data_info = reusable.upload_mutipart_object(
+                s3_object_name, bucket, TEST_DATA_PATH, obj_config, each_user
+            )
+        elif config.test_ops.get("enable_version", False):
+            data_info = reusable.upload_version_object(
+                obj_config,
+                each_user,
+                get_conn(),
+                s3_object_name,
+                size,
+                bucket,
+                TEST_DATA_PATH,
+            )
+        else:
+            data_info = reusable.upload_object(
+                s3_object_name,
+                bucket,
+                TEST_DATA_PATH,
+                obj_config,
+                each_user,
+                data_info=generated.pop(s3_object_path, None),
+            )
+        if config.test_ops["download_object"] is True:
+            # a virtual payload has no local file, its md5 is passed instead
+            uploaded_md5 = None
+            if data_info and data_info.get("payload") is not None:
+                uploaded_md5 = data_info["md5"]
+            reusable.download_object(
+                s3_object_name,
+                bucket,
+                TEST_DATA_PATH,
+                s3_object_path,
+                obj_config,
+                uploaded_md5=uploaded_md5,
+            )
+        elif config.local_file_delete is True:
+            utils.exec_shell_cmd("rm -rf %s" % s3_object_path)
+        return size
+
+    def delete_bucket(bucket_name):
+        bucket = get_conn().Bucket(bucket_name)
+        reusable.delete_objects(bucket)
+        reusable.delete_bucket(bucket)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=bucket_concurrency) as executor:
+        bucket_names = list(executor.map(create_bucket, range(config.bucket_count)))
+    log.info(
+        f"created {len(bucket_names)} buckets in {time.time() - start:.2f}s: {bucket_names}"
+    )
+    if config.test_ops["create_object"] is True:
+        if config.test_ops.get("data_generation_processes"):
+            generate_objects_data(bucket_names)
+        upload_start = time.time()
+        with ThreadPoolExecutor(max_workers=object_concurrency) as executor:
+            futures = [
+                executor.submit(upload_object, bucket_name, oc, size)
+                for bucket_name in bucket_names
+                for oc, size in list(config.mapped_sizes.items())
+            ]
+            uploaded_sizes = [future.result() for future in futures]
+        elapsed = time.time() - upload_start
+        log.info(
+            f"uploaded {len(uploaded_sizes)} objects, {sum(uploaded_sizes)} bytes "
+            f"in {elapsed:.2f}s, {len(uploaded_sizes) / elapsed if elapsed else 0:.2f} objects/s"
+        )
+    if config.test_ops["delete_bucket_object"] is True:
+        delete_start = time.time()
+        with ThreadPoolExecutor(max_workers=bucket_concurrency) as executor:
+            list(executor.map(delete_bucket, bucket_names))
+        log.info(
+            f"deleted {len(bucket_names)} buckets with their objects "
+            f"in {time.time() - delete_start:.2f}s"
+        )
+    return bucket_names
+
+
 def test_exec(config, ssh_con):
     io_info_initialize = IOInfoInitialize()
     basic_io_structure = BasicIOInfoStructure()
@@ -245,7 +418,12 @@ def test_exec(config, ssh_con):
             )
 
         # create buckets
-        if config.test_ops["create_bucket"] is True:
+        if config.test_ops["create_bucket"] is True and (
+            config.test_ops.get("bucket_concurrency")
+            or config.test_ops.get("object_concurrency")
+        ):
+            fan_out_buckets_and_objects(config, each_user, auth, ip_and_port)
+        elif config.test_ops["create_bucket"] is True:
             log.info("no of buckets to create: %s" % config.bucket_count)
             for bc in range(config.bucket_count):
                 bucket_name_to_create = utils.gen_bucket_name_from_userid(
@@ -610,42 +788,26 @@ def test_exec(config, ssh_con):
 
                         # Run bi list and check for duplicates/backward listing
                         log.info(f"Running bi list on bucket {bkt}")
-                        bi_list_output = utils.exec_shell_cmd(
-                            f"radosgw-admin bi list --bucket {bkt}"
-                        )
-
-                        # Parse the bi list output
-                        bi_entries = []
                         try:
-                            bi_list_data = json.loads(bi_list_output)
-                            for entry in bi_list_data:
-                                if "entry" in entry and "key" in entry["entry"]:
-                                    key_name = entry["entry"]["key"]["name"]
-                                    bi_entries.append(key_name)
-                        except json.JSONDecodeError:
+                            bi_report = BiListAnalyzer(bkt).analyze()
+                        except ValueError:
                             log.error("Failed to parse bi list output as JSON")
                             raise TestExecError("bi list output is not valid JSON")
-
-                        log.info(f"Total bi list entries: {len(bi_entries)}")
+                        olh_entries = bi_report["types"]["olh"]
+                        log.info(f"Total bi list entries: {olh_entries}")
 
                         # Check for duplicates (backwards listing issue)
-                        seen_entries = set()
-                        duplicate_entries = []
-                        for entry in bi_entries:
-                            if entry in seen_entries:
-                                duplicate_entries.append(entry)
-                            seen_entries.add(entry)
-
-                        if duplicate_entries:
+                        duplicates = bi_report["olh_duplicate_names"]
+                        if duplicates:
                             log.error(
-                                f"Found {len(duplicate_entries)} duplicate entries in bi list"
+                                f"Found {duplicates} duplicate entries in bi list"
                             )
                             log.error(
-                                f"Duplicate entries: {duplicate_entries[:10]}"
+                                f"Duplicate entries: {bi_report['examples']['olh_duplicate_names']}"
                             )  # Show first 10
                             raise TestExecError(
                                 f"bi list shows duplicate entries (backwards listing bug). "
-                                f"Found {len(duplicate_entries)} duplicates"
+                                f"Found {duplicates} duplicates"
                             )
                         else:
                             log.info(
@@ -656,9 +818,9 @@ def test_exec(config, ssh_con):
                         # We created 600 objects (300 ASCII + 300 unicode), each with 1 version
                         # So we should have at least 600 entries in bi list
                         expected_min_entries = 600
-                        if len(bi_entries) < expected_min_entries:
+                        if olh_entries < expected_min_entries:
                             log.warning(
-                                f"Expected at least {expected_min_entries} entries but got {len(bi_entries)}"
+                                f"Expected at least {expected_min_entries} entries but got {olh_entries}"
                             )
 
                     if config.reshard_cancel_cmd:
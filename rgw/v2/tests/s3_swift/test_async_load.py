@@ -0,0 +1,138 @@
+"""
+test_async_load - Generate S3 load with the built-in asyncio load generator
+Usage: test_async_load.py -c <input_yaml>
+<input_yaml>
+    test_async_load_closed_loop.yaml
+    test_async_load_open_loop.yaml
+Operation:
+    Create user and buckets
+    prefill the buckets with objects
+    run the op mix (put, get, head, list, delete) in closed or open loop mode
+    log per op throughput and latency percentiles and record them in the perf baseline store
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
+import argparse
+import logging
+import traceback
+
+import v2.lib.resource_op as s3lib
+import v2.utils.utils as utils
+from v2.lib.exceptions import RGWBaseException, TestExecError
+from v2.lib.perf_baseline import record_metrics
+from v2.lib.resource_op import Config
+from v2.lib.s3.async_load import AsyncS3LoadGenerator
+from v2.lib.s3.write_io_info import BasicIOInfoStructure, IOInfoInitialize
+from v2.tests.s3_swift import reusable
+from v2.utils.log import configure_logging
+from v2.utils.test_desc import AddTestInfo
+
+log = logging.getLogger()
+TEST_DATA_PATH = None
+
+
+def test_exec(config, ssh_con):
+    io_info_initialize = IOInfoInitialize()
+    basic_io_structure = BasicIOInfoStructure()
+    io_info_initialize.initialize(basic_io_structure.initial())
+    load_config = config.test_ops.get("async_load", {})
+
+    # create user
+    all_users_info = s3lib.create_users(config.user_count)
+    for each_user in all_users_info:
+        # authenticate
+        auth = reusable.get_auth(each_user, ssh_con, config.ssl, config.haproxy)
+        rgw_conn = auth.do_auth()
+        buckets = []
+        for bc in range(config.bucket_count):
+            bucket_name = utils.gen_bucket_name_from_userid(
+                each_user["user_id"], rand_no=bc
+            )
+            reusable.create_bucket(bucket_name, rgw_conn, each_user)
+            buckets.append(bucket_name)
+
+        generator = AsyncS3LoadGenerator.from_auth(
+            auth,
+            buckets,
+            op_mix=load_config.get("op_mix"),
+            object_sizes=load_config.get("object_sizes", "4K"),
+            concurrency=load_config.get("concurrency", 32),
+            rate=load_config.get("rate") if load_config.get("mode") == "open" else None,
+            duration=load_config.get("duration", 60),
+            ops=load_config.get("ops"),
+            seed=load_config.get("seed"),
+        )
+        results = generator.run_sync(load_config.get("prefill_objects", 0))
+
+        metrics = {
+            "ops_per_sec": results["ops_per_sec"],
+            "p50_latency_ms": results["latency"].get("p50_ms"),
+            "p99_latency_ms": results["latency"].get("p99_ms"),
+        }
+        for op, op_results in results["ops"].items():
+            metrics[f"{op}_ops_per_sec"] = op_results["ops_per_sec"]
+            metrics[f"{op}_p99_latency_ms"] = op_results["latency"].get("p99_ms")
+        record_metrics("test_async_load", metrics, config)
+
+        max_errors = load_config.get("max_errors", 0)
+        if results["errors"] > max_errors:
+            raise TestExecError(
+                f"{results['errors']} ops failed, more than the {max_errors} allowed"
+            )
+        if results["dropped"]:
+            log.warning(
+                f"{results['dropped']} ops were not issued, the client could not keep up with rate {load_config.get('rate')}"
+            )
+
+    # check for any crashes during the execution
+    crash_info = reusable.check_for_crash()
+    if crash_info:
+        raise TestExecError("ceph daemon crash found!")
+
+
+if __name__ == "__main__":
+    test_info = AddTestInfo("Generate S3 load with the asyncio load generator")
+    test_info.started_info()
+
+    try:
+        project_dir = os.path.abspath(os.path.join(__file__, "../../.."))
+        test_data_dir = "test_data"
+        TEST_DATA_PATH = os.path.join(project_dir, test_data_dir)
+        log.info("TEST_DATA_PATH: %s" % TEST_DATA_PATH)
+        if not os.path.exists(TEST_DATA_PATH):
+            log.info("test data dir not exists, creating.. ")
+            os.makedirs(TEST_DATA_PATH)
+        parser = argparse.ArgumentParser(description="RGW S3 Automation")
+        parser.add_argument("-c", dest="config", help="RGW Test yaml configuration")
+        parser.add_argument(
+            "-log_level",
+            dest="log_level",
+            help="Set Log Level [DEBUG, INFO, WARNING, ERROR, CRITICAL]",
+            default="info",
+        )
+        parser.add_argument(
+            "--rgw-node", dest="rgw_node", help="RGW Node", default="127.0.0.1"
+        )
+        args = parser.parse_args()
+        yaml_file = args.config
+        rgw_node = args.rgw_node
+        ssh_con = None
+        if rgw_node != "127.0.0.1":
+            ssh_con = utils.connect_remote(rgw_node)
+        log_f_name = os.path.basename(os.path.splitext(yaml_file)[0])
+        configure_logging(f_name=log_f_name, set_level=args.log_level.upper())
+        config = Config(yaml_file)
+        config.read(ssh_con)
+
+        test_exec(config, ssh_con)
+        test_info.success_status("test passed")
+        sys.exit(0)
+
+    except (RGWBaseException, Exception) as e:
+        log.error(e)
+        log.error(traceback.format_exc())
+        test_info.failed_status("test failed")
+        sys.exit(1)
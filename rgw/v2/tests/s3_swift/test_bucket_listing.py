@@ -12,10 +12,12 @@ Usage: test_bucket_listing.py -c <input_yaml>
         test_bucket_listing_pseudo_ordered.yaml
     test_bucket_listing_pseudo_ordered_dir_only.yaml
     test_bucket_listing_fake_mp.yaml
+    test_bucket_listing_benchmark.yaml
 Operation:
     Create user
         create objects as per the object structure mentioned in the yaml
         list the objects using boto and radosgw-admin command.
+        optionally benchmark full listings, see listing_benchmark in the yaml
 """
 
 import os
@@ -32,8 +34,10 @@ import traceback
 import botocore
 import v2.lib.manage_data as manage_data
 import v2.lib.resource_op as s3lib
+import v2.lib.s3.listing_benchmark as listing_benchmark
 import v2.utils.utils as utils
 from v2.lib.exceptions import RGWBaseException, TestExecError
+from v2.lib.perf_baseline import record_metrics
 from v2.lib.resource_op import Config
 from v2.lib.rgw_config_opts import CephConfOp, ConfigOpts
 from v2.lib.s3.auth import Auth
@@ -330,6 +334,54 @@ def test_exec(config, ssh_con):
                     else:
                         raise TestExecError("object listing via boto failed")
 
+                    perf_metrics = {"boto_list_secs": boto_time}
+                    if config.test_ops["radosgw_listing_ordered"] is True:
+                        perf_metrics["radosgw_ordered_list_secs"] = rgw_cmd_time
+                    elif config.test_ops["radosgw_listing_ordered"] is False:
+                        perf_metrics["radosgw_unordered_list_secs"] = rgw_time
+                    record_metrics(
+                        "test_bucket_listing",
+                        perf_metrics,
+                        config,
+                        units={name: "s" for name in perf_metrics},
+                    )
+
+                    # full listing benchmark, across bucket shard counts when asked for
+                    benchmark_config = config.test_ops.get("listing_benchmark")
+                    if benchmark_config:
+                        benchmark_config = (
+                            {} if benchmark_config is True else benchmark_config
+                        )
+                        results = listing_benchmark.benchmark_across_shard_counts(
+                            rgw_conn.meta.client,
+                            bucket_name_to_create,
+                            benchmark_config.get("shard_counts") or [None],
+                            benchmark_config.get("scenarios"),
+                            benchmark_config.get("page_size", 1000),
+                            benchmark_config.get("repeat", 1),
+                        )
+                        for num_shards, shard_results in results.items():
+                            metrics, units = listing_benchmark.listing_metrics(
+                                shard_results
+                            )
+                            record_metrics(
+                                "bucket_listing_benchmark",
+                                metrics,
+                                {
+                                    "object_structure": config.test_ops[
+                                        "object_structure"
+                                    ],
+                                    "num_objects": bkt_num_objects,
+                                    "num_shards": num_shards
+                                    or bucket_stats_json.get("num_shards"),
+                                    "versioned": config.test_ops.get(
+                                        "enable_version", False
+                                    ),
+                                    "benchmark": benchmark_config,
+                                },
+                                units=units,
+                            )
+
             if config.test_ops.get("list_bucket_with_uid", None) is True:
                 log.info(f"each user is {each_user}")
                 cmd = f"radosgw-admin bucket list --uid {each_user['user_id']} |wc -l"
@@ -354,10 +406,7 @@ def test_exec(config, ssh_con):
         if config.test_ops.get("delete_bucket_object", False):
             for bkt in bucket_created:
                 if config.test_ops.get("enable_version", False):
-                    for name, path in objects_created_list:
-                        reusable.delete_version_object(
-                            bkt, name, path, rgw_conn, each_user
-                        )
+                    reusable.purge_bucket(bkt)
                 else:
                     reusable.delete_objects(bkt)
                 time.sleep(120)
@@ -614,8 +614,7 @@ def test_exec(config, ssh_con):
 
     if config.test_ops.get("delete_bucket_object", False):
         if config.test_ops.get("enable_version", False):
-            for name, path in objects_created_list:
-                reusable.delete_version_object(bucket, name, path, rgw_conn, user_info)
+            reusable.purge_bucket(bucket)
         else:
             reusable.delete_objects(bucket)
         reusable.delete_bucket(bucket)
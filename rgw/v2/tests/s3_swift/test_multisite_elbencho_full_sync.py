@@ -432,7 +432,7 @@ def test_exec(config, ssh_con):
 
             # Upload objects to primary
             log.info(f"STEP 3: Uploading {scenario1_objects} objects to primary")
-            scale_sync_test.run_elbencho_with_size_distribution(
+            _, elbencho_results = scale_sync_test.run_elbencho_with_size_distribution(
                 local_endpoint,
                 "primary",
                 scenario1_objects,
@@ -441,6 +441,7 @@ def test_exec(config, ssh_con):
                 threads,
                 {"use_special_chars": False},
             )
+            scenario_results["scenario1"]["elbencho"] = elbencho_results
             log.info("✓ Upload complete\n")
 
             # Start RGW services for the specified realm on secondary zone (with retry until running)
@@ -458,6 +459,14 @@ def test_exec(config, ssh_con):
             scale_sync_test.verify_sync_using_bucket_stats(
                 scenario_buckets["scenario1"], secondary_ssh_con
             )
+            if config.test_ops.get("verify_object_consistency", False):
+                scale_sync_test.verify_object_consistency(
+                    scenario_buckets["scenario1"],
+                    auth.do_auth_using_client(region_name=zonegroup_name),
+                    test_user,
+                    secondary_ssh_con,
+                    config,
+                )
             log.info("✅ SCENARIO 1 COMPLETED SUCCESSFULLY\n")
             scenario_results["scenario1"]["status"] = "PASSED"
         except Exception as e:
@@ -517,7 +526,7 @@ def test_exec(config, ssh_con):
             log.info(
                 f"STEP 3: Uploading {scenario2_objects} objects per bucket to primary"
             )
-            scale_sync_test.run_elbencho_with_size_distribution(
+            _, elbencho_results = scale_sync_test.run_elbencho_with_size_distribution(
                 local_endpoint,
                 "primary",
                 scenario2_objects,
@@ -526,6 +535,7 @@ def test_exec(config, ssh_con):
                 threads,
                 {"use_special_chars": False},
             )
+            scenario_results["scenario2"]["elbencho"] = elbencho_results
             log.info("✓ Upload complete\n")
 
             # Start secondary zone (with retry until running)
@@ -543,6 +553,14 @@ def test_exec(config, ssh_con):
             scale_sync_test.verify_sync_using_bucket_stats(
                 scenario_buckets["scenario2"], secondary_ssh_con
             )
+            if config.test_ops.get("verify_object_consistency", False):
+                scale_sync_test.verify_object_consistency(
+                    scenario_buckets["scenario2"],
+                    auth.do_auth_using_client(region_name=zonegroup_name),
+                    test_user,
+                    secondary_ssh_con,
+                    config,
+                )
             log.info("✅ SCENARIO 2 COMPLETED SUCCESSFULLY\n")
             scenario_results["scenario2"]["status"] = "PASSED"
         except Exception as e:
@@ -636,6 +654,14 @@ def test_exec(config, ssh_con):
             scale_sync_test.verify_sync_using_bucket_stats(
                 scenario_buckets["scenario3"], secondary_ssh_con
             )
+            if config.test_ops.get("verify_object_consistency", False):
+                scale_sync_test.verify_object_consistency(
+                    scenario_buckets["scenario3"],
+                    auth.do_auth_using_client(region_name=zonegroup_name),
+                    test_user,
+                    secondary_ssh_con,
+                    config,
+                )
             log.info("✅ SCENARIO 3 COMPLETED SUCCESSFULLY\n")
             scenario_results["scenario3"]["status"] = "PASSED"
         except Exception as e:
@@ -889,6 +915,14 @@ def test_exec(config, ssh_con):
             scale_sync_test.verify_sync_using_bucket_stats(
                 scenario_buckets["scenario5"], secondary_ssh_con
             )
+            if config.test_ops.get("verify_object_consistency", False):
+                scale_sync_test.verify_object_consistency(
+                    scenario_buckets["scenario5"],
+                    auth.do_auth_using_client(region_name=zonegroup_name),
+                    test_user,
+                    secondary_ssh_con,
+                    config,
+                )
             log.info("✅ SCENARIO 5 COMPLETED SUCCESSFULLY\n")
             scenario_results["scenario5"]["status"] = "PASSED"
         except Exception as e:
@@ -919,6 +953,12 @@ def test_exec(config, ssh_con):
         log.info(f"{status_icon} {scenario.upper()}: {result['status']}")
         if result["error"]:
             log.info(f"   Error: {result['error']}")
+        for record in result.get("elbencho", []):
+            log.info(
+                f"   elbencho {record.get('label')} {record.get('phase')}: "
+                f"iops={record.get('iops')} MiB/s={record.get('throughput_mib_s')} "
+                f"latency_us={record.get('latency_us')}"
+            )
 
         if result["status"] == "PASSED":
             passed_count += 1
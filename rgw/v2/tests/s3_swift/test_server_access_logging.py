@@ -40,6 +40,7 @@ from v2.lib.admin import UserMgmt
 from v2.lib.exceptions import EventRecordDataError, RGWBaseException, TestExecError
 from v2.lib.resource_op import Config
 from v2.lib.rgw_config_opts import CephConfOp, ConfigOpts
+from v2.lib.s3 import access_log
 from v2.lib.s3.auth import Auth
 from v2.lib.s3.write_io_info import BasicIOInfoStructure, BucketIoInfo, IOInfoInitialize
 from v2.tests.s3_swift import reusable
@@ -259,12 +260,9 @@ def test_exec(config, ssh_con):
                     for obj in objects_list:
                         key = obj["Key"]
                         if key == flushed_log_object_name:
-                            response = rgw_s3_client.get_object(
-                                Bucket=dest_bucket_name, Key=key
+                            total_log_records = access_log.iter_log_records(
+                                rgw_s3_client, dest_bucket_name, key
                             )
-                            content = response["Body"].read().decode("utf-8").strip()
-                            obj_records = content.split("\n")
-                            total_log_records.extend(obj_records)
                             break
                     bkt_logging.verify_operation_name_in_logs(
                         total_log_records, operations_performed
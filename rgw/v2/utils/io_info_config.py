@@ -1,13 +1,19 @@
 class IoInfoConfig:
     _instance = None
     io_info_fname = "io_info.yaml"
+    # 'yaml' rewrites the whole io_info yaml on every update,
+    # 'journal' uses the indexed append-only store in v2.lib.s3.io_info_store
+    io_info_backend = "yaml"
 
     def __new__(
         cls,
         io_info_fname=None,
+        io_info_backend=None,
     ):
         if not IoInfoConfig._instance:
             IoInfoConfig._instance = cls
         if io_info_fname:
             IoInfoConfig._instance.io_info_fname = io_info_fname
+        if io_info_backend:
+            IoInfoConfig._instance.io_info_backend = io_info_backend
         return IoInfoConfig._instance
@@ -1,21 +1,117 @@
+import atexit
+import glob
+import gzip
+import itertools
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
 
 LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "logs"))
 
+# messages longer than this are truncated, the full message is spilled to a
+# gzip side file
+LOG_PAYLOAD_LIMIT = int(os.environ.get("RGW_LOG_PAYLOAD_LIMIT", 64 * 1024))
+# the verbose log is rotated at this size and the rotated files gzipped
+VERBOSE_LOG_MAX_BYTES = int(os.environ.get("RGW_LOG_MAX_BYTES", 512 * 1024 * 1024))
+VERBOSE_LOG_BACKUPS = int(os.environ.get("RGW_LOG_BACKUPS", 20))
+
+_listener = None
+_queue_handler = None
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class SpillingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener truncating long messages before they are handled
+
+    The full message is written to a gzip file in spill_dir, in the listener
+    thread, and the logged message points to it.
+    """
+
+    def __init__(self, log_queue, *handlers, spill_dir=None, limit=LOG_PAYLOAD_LIMIT):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.spill_dir = spill_dir
+        self.limit = limit
+        self.counter = itertools.count(1)
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if not self.limit or len(message) <= self.limit:
+            return record
+        spill_file = None
+        if self.spill_dir:
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                spill_file = os.path.join(
+                    self.spill_dir,
+                    f"{next(self.counter):06d}.{record.levelname}.log.gz",
+                )
+                with gzip.open(spill_file, "wt", compresslevel=1) as f:
+                    f.write(message)
+            except OSError:
+                spill_file = None
+        record.msg = (
+            f"{message[:self.limit]}\n... truncated {len(message) - self.limit} characters"
+            + (f", full message in {spill_file}" if spill_file else "")
+        )
+        record.args = None
+        return record
+
+
+def stop_logging():
+    """
+    This function flushes the queued log records and stops the listener thread
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
 
 def configure_logging(f_name="rgw_test", set_level="info"):
+    """
+    This function sets up the root logger
+
+    Records are put on a queue by the logging call and written by a listener
+    thread to the console, <f_name>.console.log at set_level and
+    <f_name>.verbose.log at DEBUG. The verbose log is rotated every
+    VERBOSE_LOG_MAX_BYTES and the rotated files are gzipped. Messages over
+    LOG_PAYLOAD_LIMIT characters are truncated and spilled to
+    <f_name>.spill/*.log.gz.
+    """
+    global _listener, _queue_handler
+    stop_logging()
 
     set_level = logging.getLevelName(set_level.upper())
     formatter = logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
 
     c_fnane = os.path.join(LOG_DIR, f_name + ".console.log")
     v_fname = os.path.join(LOG_DIR, f_name + ".verbose.log")
+    spill_dir = os.path.join(LOG_DIR, f_name + ".spill")
 
     if os.path.exists(c_fnane):
         os.unlink(c_fnane)
-    if os.path.exists(v_fname):
-        os.unlink(v_fname)
+    # the verbose log and its rotated files of a previous run
+    for name in glob.glob(v_fname) + glob.glob(f"{v_fname}.*.gz"):
+        os.unlink(name)
+    if os.path.exists(spill_dir):
+        shutil.rmtree(spill_dir, ignore_errors=True)
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
 
@@ -24,7 +120,11 @@ def configure_logging(f_name="rgw_test", set_level="info"):
 
     # file handler settings for verbose_file
     # logging_level is set to DEBUG
-    file_handler = logging.FileHandler(v_fname)
+    file_handler = logging.handlers.RotatingFileHandler(
+        v_fname, maxBytes=VERBOSE_LOG_MAX_BYTES, backupCount=VERBOSE_LOG_BACKUPS
+    )
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
     file_handler.setFormatter(formatter)
 
     # handler settings for simple log file as well as console
@@ -37,6 +137,16 @@ def configure_logging(f_name="rgw_test", set_level="info"):
     stream_handler.setFormatter(formatter)
     stream_handler.setLevel(set_level)
 
-    log.addHandler(stream_handler)
-    log.addHandler(file_handler)
-    log.addHandler(file_handler2)
+    # the logging call only queues the record, the handlers run in the
+    # listener thread
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _listener = SpillingQueueListener(
+        log_queue, stream_handler, file_handler, file_handler2, spill_dir=spill_dir
+    )
+    log.addHandler(_queue_handler)
+    _listener.start()
+
+
+# flush the queue when the test exits
+atexit.register(stop_logging)
@@ -0,0 +1,207 @@
+"""
+ssh_pool - pooled, parallel SSH execution
+
+Connections are kept per (host, user) with transport keepalive and are
+reconnected transparently when the transport drops, so helpers that run
+many commands on the same nodes do not pay a new SSH handshake each time.
+run() returns stdout, stderr, exit code and duration of a command,
+fan_out() runs a command on many hosts at once and stream() yields the
+output of a long running command line by line.
+"""
+
+import atexit
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+log = logging.getLogger()
+
+SSH_PORT = 22
+CONNECT_TIMEOUT = 3
+KEEPALIVE_INTERVAL = 30
+DEFAULT_FAN_OUT_WORKERS = 16
+
+
+class SSHPool(object):
+    """
+    Connection pool keyed by host
+
+    The functions here are
+    1. get(): pooled SSHClient for a host, connected on first use
+    2. ensure_connected(): reconnect a pooled client whose transport dropped
+    3. run(): run a command, returns stdout, stderr, exit_code and duration
+    4. stream(): yield the output of a command line by line
+    5. fan_out(): run a command on several hosts at once
+    6. for_each_host(): run a function with each host's client at once
+    7. close_all(): close every pooled connection
+    """
+
+    def __init__(self, keepalive=KEEPALIVE_INTERVAL, timeout=CONNECT_TIMEOUT):
+        self.keepalive = keepalive
+        self.timeout = timeout
+        # guards clients, params and connect_locks, never held while connecting
+        self.lock = threading.Lock()
+        self.clients = {}
+        # SSHClient -> connect kwargs, used to reconnect a pooled client
+        self.params = weakref.WeakKeyDictionary()
+        # SSHClient -> lock held while connecting it, other hosts do not wait
+        self.connect_locks = weakref.WeakKeyDictionary()
+
+    def _connect(self, ssh, host, user_nm, passw):
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(
+            host, port=SSH_PORT, username=user_nm, password=passw, timeout=self.timeout
+        )
+        ssh.get_transport().set_keepalive(self.keepalive)
+        return ssh
+
+    @staticmethod
+    def is_active(ssh):
+        transport = ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def get(self, host, user_nm="cephuser", passw="cephuser"):
+        """
+        This function returns the pooled connection to a host
+
+        Parameters:
+            host(char): hostname or ip of the node
+            user_nm(char): ssh user
+            passw(char): ssh password
+
+        Returns:
+            ssh: connected paramiko SSHClient, shared by all the callers
+        """
+        with self.lock:
+            ssh = self.clients.get((host, user_nm))
+            if ssh is None:
+                ssh = paramiko.SSHClient()
+                self.clients[(host, user_nm)] = ssh
+                self.params[ssh] = (host, user_nm, passw)
+                self.connect_locks[ssh] = threading.Lock()
+        return self.ensure_connected(ssh)
+
+    def ensure_connected(self, ssh):
+        """
+        This function reconnects a pooled client whose transport is not active
+
+        Clients that are not from the pool are returned as is. Only the callers
+        of the same client wait for its connection.
+        """
+        with self.lock:
+            params = self.params.get(ssh)
+            connect_lock = self.connect_locks.get(ssh)
+        if params is None or self.is_active(ssh):
+            return ssh
+        with connect_lock:
+            if not self.is_active(ssh):
+                log.info(f"connecting to {params[0]} as {params[1]}")
+                self._connect(ssh, *params)
+        return ssh
+
+    def run(self, host, cmd, timeout=None, ssh=None):
+        """
+        This function runs a command on a host
+
+        Parameters:
+            host(char): hostname or ip of the node
+            cmd(char): command to run
+            timeout(int): channel timeout in seconds
+            ssh: client to use instead of the pooled connection of host
+
+        Returns:
+            result(dict): host, stdout, stderr, exit_code and duration
+        """
+        start = time.time()
+        ssh = self.ensure_connected(ssh) if ssh is not None else self.get(host)
+        stdin, stdout, stderr = ssh.exec_command(cmd, timeout=timeout)
+        out = stdout.read().decode()
+        err = stderr.read().decode()
+        exit_code = stdout.channel.recv_exit_status()
+        return {
+            "host": host,
+            "stdout": out,
+            "stderr": err,
+            "exit_code": exit_code,
+            "duration": time.time() - start,
+        }
+
+    def stream(self, host, cmd, ssh=None):
+        """
+        This function yields the output of a command line by line, as it is produced
+
+        stderr is merged into stdout. The exit code is the return value of
+        the generator, i.e StopIteration.value or the result of 'yield from'.
+        """
+        ssh = self.ensure_connected(ssh) if ssh is not None else self.get(host)
+        stdin, stdout, stderr = ssh.exec_command(cmd, get_pty=False)
+        stdout.channel.set_combined_stderr(True)
+        for line in iter(stdout.readline, ""):
+            yield line.rstrip("\n")
+        return stdout.channel.recv_exit_status()
+
+    def for_each_host(self, hosts, func, workers=DEFAULT_FAN_OUT_WORKERS):
+        """
+        This function calls func(host, ssh) for each host at once
+
+        Parameters:
+            hosts(list): hostnames or ips
+            func: callable taking the host and its pooled SSHClient
+            workers(int): maximum number of hosts handled at the same time
+
+        Returns:
+            results(dict): host -> return value of func, or the raised exception
+        """
+        hosts = list(hosts)
+        if not hosts:
+            return {}
+
+        def call(host):
+            try:
+                return func(host, self.get(host))
+            except Exception as e:
+                log.error(f"failed on {host}: {e}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(hosts))) as executor:
+            return dict(zip(hosts, executor.map(call, hosts)))
+
+    def fan_out(self, hosts, cmd, timeout=None, workers=DEFAULT_FAN_OUT_WORKERS):
+        """
+        This function runs a command on several hosts at once
+
+        Returns:
+            results(dict): host -> run() result. exit_code is None and stderr
+                           holds the error when the host could not be reached
+        """
+        hosts = list(hosts)
+        log.info(f"running on {len(hosts)} hosts: {cmd}")
+        results = self.for_each_host(
+            hosts, lambda host, ssh: self.run(host, cmd, timeout, ssh), workers
+        )
+        for host, result in results.items():
+            if isinstance(result, Exception):
+                results[host] = {
+                    "host": host,
+                    "stdout": "",
+                    "stderr": str(result),
+                    "exit_code": None,
+                    "duration": None,
+                }
+        return results
+
+    def close_all(self):
+        with self.lock:
+            for ssh in self.clients.values():
+                ssh.close()
+            self.clients.clear()
+            self.params.clear()
+            self.connect_locks.clear()
+
+
+ssh_pool = SSHPool()
+atexit.register(ssh_pool.close_all)
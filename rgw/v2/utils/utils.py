@@ -1,3 +1,4 @@
+import codecs
 import configparser
 import datetime
 import hashlib
@@ -5,10 +6,13 @@ import json
 import logging
 import os
 import random
+import re
 import shutil
 import socket
 import string
 import subprocess
+import tempfile
+import threading
 import time
 from random import randint
 from re import S
@@ -18,6 +22,7 @@ import botocore
 import paramiko
 import yaml
 from v2.lib.exceptions import SyncFailedError, TestExecError
+from v2.utils.ssh_pool import ssh_pool
 
 BUCKET_NAME_PREFIX = "bucky" + "-" + str(random.randrange(1, 5000))
 S3_OBJECT_NAME_PREFIX = "key"
@@ -55,7 +60,46 @@ def exec_long_running_shell_cmd(cmd):
         return False
 
 
-def exec_shell_cmd(cmd, debug_info=False, return_err=False):
+# command output logged by exec_shell_cmd and the streaming variants, beyond
+# this only the size is logged
+LOG_OUTPUT_LIMIT = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+# commands changing the cached cluster facts, exec_shell_cmd and
+# remote_exec_shell_cmd drop the facts after running them
+FACT_CHANGING_COMMANDS = (
+    (re.compile(r"\bceph config (set|rm)\b"), ("config_dump",)),
+    (
+        re.compile(r"\bceph orch (apply|restart|redeploy)\b"),
+        ("config_dump", "sync_status"),
+    ),
+    (re.compile(r"\bradosgw-admin period update\b.*--commit"), ("sync_status",)),
+    (re.compile(r"\bradosgw-admin (realm|period) pull\b"), ("sync_status",)),
+)
+
+
+def log_output(out, limit=LOG_OUTPUT_LIMIT):
+    """
+    This function logs command output up to limit characters
+    """
+    if limit is None or len(out) <= limit:
+        log.info(out)
+    else:
+        log.info(out[:limit])
+        log.info(f"... output truncated, {len(out) - limit} more characters not logged")
+
+
+def invalidate_changed_facts(cmd):
+    """
+    This function drops the cached cluster facts a command may have changed, see FACT_CHANGING_COMMANDS
+    """
+    for pattern, facts in FACT_CHANGING_COMMANDS:
+        if pattern.search(cmd):
+            cluster_info.invalidate(*facts)
+
+
+def exec_shell_cmd(
+    cmd, debug_info=False, return_err=False, log_limit=LOG_OUTPUT_LIMIT, spill_file=None
+):
     try:
         log.info("executing cmd: %s" % cmd)
         pr = subprocess.Popen(
@@ -66,12 +110,17 @@ def exec_shell_cmd(cmd, debug_info=False, return_err=False):
             shell=True,
         )
         out, err = pr.communicate()
+        invalidate_changed_facts(cmd)
         out = out.decode("utf-8", errors="ignore")
         err = err.decode("utf-8", errors="ignore")
+        if spill_file:
+            with open(spill_file, "w") as fp:
+                fp.write(out)
+            log.info(f"full output of the cmd written to {spill_file}")
         if pr.returncode == 0:
             log.info("cmd executed")
             if out is not None:
-                log.info(out)
+                log_output(out, log_limit)
                 if debug_info == True:
                     log.info(err)
                     return out, err
@@ -90,10 +139,161 @@ def exec_shell_cmd(cmd, debug_info=False, return_err=False):
         return False
 
 
+def stream_shell_cmd_chunks(cmd, log_limit=LOG_OUTPUT_LIMIT, spill_file=None):
+    """
+    This function runs a command and yields its stdout as decoded text chunks
+
+    The output is never held in memory as a whole. Up to log_limit characters
+    are logged and the full output is written to spill_file when given.
+
+    Raises:
+        TestExecError: once the output is consumed, if the command failed
+    """
+    log.info("executing cmd: %s" % cmd)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    logged = total = 0
+    spill = open(spill_file, "w") if spill_file else None
+    with tempfile.TemporaryFile() as err_fp:
+        pr = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err_fp, shell=True)
+        try:
+            while True:
+                data = pr.stdout.read1(STREAM_CHUNK_SIZE)
+                chunk = decoder.decode(data, final=not data)
+                if chunk:
+                    total += len(chunk)
+                    if spill:
+                        spill.write(chunk)
+                    if log_limit is None or logged < log_limit:
+                        part = (
+                            chunk if log_limit is None else chunk[: log_limit - logged]
+                        )
+                        log.info(part)
+                        logged += len(part)
+                    yield chunk
+                if not data:
+                    break
+        finally:
+            pr.stdout.close()
+            returncode = pr.wait()
+            if spill:
+                spill.close()
+        if total > logged:
+            log.info(
+                f"... output truncated, {total - logged} more characters not logged"
+            )
+        if spill_file:
+            log.info(f"full output of the cmd written to {spill_file}")
+        if returncode != 0:
+            err_fp.seek(0)
+            err = err_fp.read().decode("utf-8", errors="ignore")
+            log.error(f"cmd execution failed, returncode: {returncode}, stderr: {err}")
+            get_crash_log()
+            raise TestExecError(f"'{cmd}' failed with returncode {returncode}: {err}")
+    log.info("cmd executed")
+
+
+def stream_shell_cmd(cmd, log_limit=LOG_OUTPUT_LIMIT, spill_file=None):
+    """
+    This function runs a command and yields its stdout line by line, without the line ending
+
+    Raises:
+        TestExecError: once the output is consumed, if the command failed
+    """
+    pending = ""
+    for chunk in stream_shell_cmd_chunks(cmd, log_limit, spill_file):
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_json_array(chunks):
+    """
+    This function incrementally parses a json array from text chunks
+
+    Anything before the opening '[' (e.g warnings printed by the command)
+    is skipped, the elements are yielded as soon as they are complete.
+
+    Raises:
+        ValueError: if the text is not a json array
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer, pos, eof = "", 0, False
+    started = False
+
+    def more():
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+    while True:
+        if not started:
+            start = buffer.find("[", pos)
+            if start == -1:
+                pos = len(buffer)
+                if eof:
+                    raise ValueError("no json array in the output")
+                more()
+                continue
+            pos, started = start + 1, True
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("json array not terminated")
+            more()
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise
+            more()
+            continue
+        if not eof and (end == len(buffer) or buffer[end] not in " \t\r\n,]"):
+            # complete only once followed by a delimiter, the element may go on
+            # in the next chunk e.g a number split into "1." and "5"
+            more()
+            continue
+        yield element
+        pos = end
+
+
+def stream_json_array(cmd, log_limit=LOG_OUTPUT_LIMIT, spill_file=None):
+    """
+    This function runs a command printing a json array and yields its elements one by one
+
+    e.g radosgw-admin gc list, bi list, bucket list, datalog list
+
+    Raises:
+        TestExecError: if the command failed
+        ValueError: if the output is not a json array
+    """
+    yield from iter_json_array(stream_shell_cmd_chunks(cmd, log_limit, spill_file))
+
+
+def count_json_array(cmd, predicate=None, log_limit=LOG_OUTPUT_LIMIT, spill_file=None):
+    """
+    This function counts the elements of the json array a command prints, optionally those matching predicate
+    """
+    return sum(
+        1
+        for element in stream_json_array(cmd, log_limit, spill_file)
+        if predicate is None or predicate(element)
+    )
+
+
 def connect_remote(rgw_host, user_nm="cephuser", passw="cephuser"):
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(rgw_host, port=22, username=user_nm, password=passw, timeout=3)
+    # connections are pooled per host and reconnected when the transport drops
+    ssh = ssh_pool.get(rgw_host, user_nm, passw)
     if ssh is None:
         raise Exception("Connection with remote machine failed")
     else:
@@ -103,9 +303,11 @@ def connect_remote(rgw_host, user_nm="cephuser", passw="cephuser"):
 def remote_exec_shell_cmd(ssh, cmd, return_output=False):
     try:
         log.info("executing cmd on remote node: %s" % cmd)
+        ssh = ssh_pool.ensure_connected(ssh)
         stdin, stdout, stderr = ssh.exec_command(cmd)
         cmd_output = stdout.read().decode()
         cmd_error = stderr.read().decode()
+        invalidate_changed_facts(cmd)
         log.info(cmd_output)
         if len(cmd_error) == 0:
             if return_output:
@@ -295,9 +497,226 @@ def make_copy_of_file(f1, f2):
         return os.path.abspath(f2)
 
 
+class ClusterInfo(object):
+    """
+    Caches cluster facts that do not change while a test runs
+
+    `ceph version`, `ceph config dump` and `radosgw-admin sync status` are
+    run once and served from memory afterwards. Failed lookups are not
+    cached. exec_shell_cmd and remote_exec_shell_cmd drop the facts changed
+    by the commands in FACT_CHANGING_COMMANDS, other operations that change
+    the facts call invalidate().
+
+    The functions here are
+    1. version(): ceph version id and release name
+    2. fsid(): cluster fsid
+    3. config_dump(): parsed `ceph config dump`
+    4. rgw_frontends() / port() / ssl(): RGW frontend facts
+    5. sync_status() / is_multisite() / is_primary(): multisite role
+    6. rgw_endpoint(): hostname, ip and port of the RGW node, per node
+    7. invalidate(): drop cached facts
+    """
+
+    # facts derived from another one, dropped along with it
+    DERIVED_FACTS = {"config_dump": ("rgw_endpoint",)}
+
+    def __init__(self):
+        # guards the facts, never held while a fact is loaded
+        self._lock = threading.RLock()
+        self._facts = {}
+        # fact name -> lock held while loading it, only callers of the same fact wait
+        self._load_locks = {}
+        # bumped by invalidate(), a fact loaded across an invalidation is not cached
+        self._epoch = 0
+
+    def _get(self, name, loader):
+        with self._lock:
+            if name in self._facts:
+                return self._facts[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                if name in self._facts:
+                    return self._facts[name]
+                epoch = self._epoch
+            value = loader()
+            if value is not None and value is not False:
+                with self._lock:
+                    if epoch == self._epoch:
+                        self._facts[name] = value
+            return value
+
+    def invalidate(self, *names):
+        """
+        This function drops cached facts
+
+        Parameters:
+            names(char): facts to drop i.e version, fsid, config_dump, sync_status.
+                         all the facts are dropped when no name is given
+        """
+        with self._lock:
+            self._epoch += 1
+            if not names:
+                log.info("invalidating all cached cluster facts")
+                self._facts.clear()
+                return
+            for name in names:
+                for fact in (name,) + self.DERIVED_FACTS.get(name, ()):
+                    log.info(f"invalidating cached cluster fact: {fact}")
+                    self._facts.pop(fact, None)
+
+    def version(self):
+        """
+        This function returns the ceph version
+
+        Returns:
+            (version_id, version_name) e.g ('18.2.0-1', 'reef')
+        """
+
+        def load():
+            log.info("get ceph version")
+            ceph_version = exec_shell_cmd("sudo ceph version")
+            if ceph_version is False:
+                return False
+            return ceph_version.split()[2], ceph_version.split()[4]
+
+        return self._get("version", load)
+
+    def fsid(self):
+        def load():
+            cluster_fsid = exec_shell_cmd("sudo ceph config get mon fsid")
+            if cluster_fsid is False:
+                return False
+            return cluster_fsid.rstrip("\n")
+
+        return self._get("fsid", load)
+
+    def config_dump(self):
+        """
+        This function returns the parsed `ceph config dump`, None on failure
+        """
+
+        def load():
+            out = exec_shell_cmd("sudo ceph config dump --format json")
+            if out is False:
+                return None
+            return json.loads(out)
+
+        return self._get("config_dump", load)
+
+    def rgw_frontends(self):
+        try:
+            for config in self.config_dump() or []:
+                if config.get("name", "").lower() == "rgw_frontends":
+                    return config.get("value")
+        except BaseException as be:
+            log.debug(be)
+
+    def port(self):
+        """
+        This function returns the RGW port from the configured frontends, None if unknown
+        """
+        frontend_values = self.rgw_frontends()
+        if frontend_values:
+            for config in frontend_values.split():
+                if "port" in config:
+                    return config.split("=")[-1]
+
+    def ssl(self):
+        """
+        This function returns True if the RGW frontends use ssl, None if unknown
+        """
+        frontend_values = self.rgw_frontends()
+        if frontend_values:
+            return any("ssl" in config for config in frontend_values.split())
+
+    @staticmethod
+    def _endpoint_target(ssh_con):
+        if ssh_con is None:
+            return "localhost"
+        params = ssh_pool.params.get(ssh_con)
+        if params is not None:
+            return params[0]
+        transport = ssh_con.get_transport()
+        if transport is not None and transport.is_active():
+            return transport.getpeername()[0]
+        return id(ssh_con)
+
+    def rgw_endpoint(self, ssh_con=None, refresh=False):
+        """
+        This function returns the hostname, ip and RGW port of the local node or the node behind ssh_con
+
+        The endpoint of each node is resolved once, a failed resolution is not cached.
+
+        Parameters:
+            ssh_con: ssh connection to the RGW node, None for the local node
+            refresh(bool): resolve the endpoint again
+
+        Returns:
+            endpoint(dict): hostname, ip and port
+        """
+        target = self._endpoint_target(ssh_con)
+        with self._lock:
+            endpoints = self._facts.setdefault("rgw_endpoint", {})
+            if not refresh and target in endpoints:
+                return dict(endpoints[target])
+            epoch = self._epoch
+        log.info(f"resolving the RGW endpoint of {target}")
+        if ssh_con is not None:
+            # hostname and ip in one round trip
+            ssh_con = ssh_pool.ensure_connected(ssh_con)
+            stdin, stdout, stderr = ssh_con.exec_command(
+                "hostname; hostname -I | awk '{print $1}'"
+            )
+            hostname = stdout.readline().strip()
+            ip = stdout.readline().strip()
+        else:
+            hostname = socket.gethostname()
+            ip = socket.gethostbyname(hostname)
+        endpoint = {
+            "hostname": hostname,
+            "ip": ip,
+            "port": get_radosgw_port_no(ssh_con),
+        }
+        if hostname and ip and endpoint["port"]:
+            with self._lock:
+                if epoch == self._epoch:
+                    self._facts.setdefault("rgw_endpoint", {})[target] = endpoint
+        return dict(endpoint)
+
+    def sync_status(self):
+        return self._get(
+            "sync_status", lambda: exec_shell_cmd("sudo radosgw-admin sync status")
+        )
+
+    def is_multisite(self):
+        """
+        This function returns True for multisite, False for single site and multi realm
+        """
+        out = self.sync_status()
+        if "realm  ()" in out:
+            log.info("the cluster is single site")
+            return False
+        elif "data sync source" in out:
+            log.info("the cluster is multisite")
+            return True
+        else:
+            log.info("the cluster is multi realm")
+            return False
+
+    def is_primary(self):
+        if "zone is master" in self.sync_status():
+            log.info("cluster is primary")
+            return True
+        log.info("cluster is not primary")
+        return False
+
+
+cluster_info = ClusterInfo()
+
+
 def get_cluster_fsid():
-    cluster_fsid = exec_shell_cmd("sudo ceph config get mon fsid")
-    return cluster_fsid.rstrip("\n")
+    return cluster_info.fsid()
 
 
 class CephOrch:
@@ -532,6 +951,7 @@ class RGWService:
                 return False
 
             log.info("RGW service restarted and daemons verified successfully")
+            cluster_info.invalidate("config_dump", "sync_status")
             return True
         except Exception as e:
             log.error(f"Error during RGW restart or status check: {str(e)}")
@@ -573,15 +993,7 @@ class RGWService:
 
 def get_rgw_frontends():
     """Retrieve RGW's frontend configuration."""
-    try:
-        out = exec_shell_cmd("sudo ceph config dump --format json")
-        configs = json.loads(out)
-
-        for config in configs:
-            if config.get("name", "").lower() == "rgw_frontends":
-                return config.get("value")
-    except BaseException as be:
-        log.debug(be)
+    return cluster_info.rgw_frontends()
 
 
 def get_radosgw_port_no(ssh_con=None):
@@ -592,12 +1004,9 @@ def get_radosgw_port_no(ssh_con=None):
         - Using `ceph config dump`. (Supported from 5.0)
         - Using netstat
     """
-    frontend_values = get_rgw_frontends()
-    if frontend_values:
-        configs = frontend_values.split()
-        for config in configs:
-            if "port" in config:
-                return config.split("=")[-1]
+    port = cluster_info.port()
+    if port:
+        return port
     if ssh_con is not None:
         stdin, stdout, stderr = ssh_con.exec_command(
             "sudo netstat -nltp | grep radosgw"
@@ -619,14 +1028,9 @@ def get_radosgw_port_no(ssh_con=None):
 
 def is_rgw_secure():
     """Check if RGW endpoint is secure."""
-    frontend_values = get_rgw_frontends()
-    if frontend_values:
-        configs = frontend_values.split()
-        for config in configs:
-            if "ssl" in config:
-                return True
-
-        return False
+    secure = cluster_info.ssl()
+    if secure is not None:
+        return secure
 
     log.info("Unable to determine the if RGW gateway is secure.")
     return None
@@ -862,9 +1266,7 @@ def get_ceph_version():
     """
     get the current ceph version
     """
-    log.info("get ceph version")
-    ceph_version = exec_shell_cmd("sudo ceph version")
-    version_id, version_name = ceph_version.split()[2], ceph_version.split()[4]
+    version_id, version_name = cluster_info.version()
     return version_id, version_name
 
 
@@ -899,7 +1301,7 @@ def is_cluster_primary():
     # checks if the cluster is primary or not
     # if primary return True or return False if not, assume as secondary
     log.info("verify if cluster is primary or not")
-    ceph_version = exec_shell_cmd("ceph version").split()[4]
+    _, ceph_version = cluster_info.version()
     if ceph_version == "pacific":
         cmd = " ceph orch ps | grep rgw"
         out = exec_shell_cmd(cmd)
@@ -911,14 +1313,9 @@ def is_cluster_primary():
         out = exec_shell_cmd(cmd)
         rgw_name = out.split()[0]
         exec_shell_cmd(f"ceph orch restart {rgw_name}")
+        cluster_info.invalidate("config_dump", "sync_status")
         time.sleep(20)
-    cmd = "sudo radosgw-admin sync status"
-    out = exec_shell_cmd(cmd)
-    if "zone is master" in out:
-        log.info("cluster is primary")
-        return True
-    log.info("cluster is not primary")
-    return False
+    return cluster_info.is_primary()
 
 
 def is_cluster_multisite():
@@ -927,17 +1324,7 @@ def is_cluster_multisite():
     return: True is multisite else False for single site
     """
     log.info("verify if the cluster is singlesite or multisite")
-    cmd = "sudo radosgw-admin sync status"
-    out = exec_shell_cmd(cmd)
-    if "realm  ()" in out:
-        log.info("the cluster is single site")
-        return False
-    elif "data sync source" in out:
-        log.info("the cluster is multisite")
-        return True
-    else:
-        log.info("the cluster is multi realm")
-        return False
+    return cluster_info.is_multisite()
 
 
 def disable_async_data_notifications():
@@ -1061,6 +1448,7 @@ def restart_rgw(restart_all=False, ssh_con=None):
             exec_shell_cmd(restart_cmd)
         if not restart_all:
             break
+    cluster_info.invalidate()
 
 
 def get_rgw_endpoint_url(ssh_con=None):